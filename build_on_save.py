@@ -1,8 +1,22 @@
+import os
+
+from typing import Any, Dict, List
+
+import sublime
 import sublime_plugin
 
+from .scripts import build_cache
+from .scripts import scheduler
 from .scripts import utilities
 
 
+BUILD_CACHE = "builds.json"
+
+# Saves come in bursts, so we wait for them to settle down (by view) and then
+# build once, for the last one.
+SCHEDULER = scheduler.Debouncer(sublime.set_timeout_async)
+
+
 class SimpleContextBuildOnSaveListener(
     utilities.BaseSettings, sublime_plugin.ViewEventListener,
 ):
@@ -10,6 +24,14 @@ def on_post_save_async(self) -> None:
         self.reload_settings()
         if not (self.is_visible_alt() and self.get_setting("builder/auto/on")):
             return
+        delay = self.get_setting("builder/auto/debounce", 500)
+        SCHEDULER.submit(self.view.id(), self.build, delay)
+
+    def build(self) -> None:
+        window = self.view.window()
+        if not (self.view.is_valid() and window):
+            return
+        self.reload_settings()
 
         extra_opts_raw = \
             self.get_setting("builder/auto/extra_opts_for_ConTeXt", {})
@@ -35,6 +57,11 @@ def on_post_save_async(self) -> None:
             },
         ]
 
+        args = {"cmd_seq": cmd_seq}
+        main = self.view.file_name()
+        if main and self.get_setting("builder/auto/skip_unchanged", True):
+            args = self.check_build_cache(main, cmd_seq)
+
         show = self.get_setting(
             "builder/auto/output/show", "when_there_are_errors",
         )
@@ -46,14 +73,54 @@ def on_post_save_async(self) -> None:
             self.get_setting("builder/auto/output/show_errors", False)
         show_errors_inline = \
             self.get_setting("builder/auto/output/show_errors_inline", False)
-        self.view.window().run_command(
+        # Whether a build that is still going when this one comes along
+        # should be cancelled, or allowed to finish first.
+        restart = self.get_setting("builder/auto/restart", True)
+        window.run_command(
             "simple_context_exec_main",
-            {
-                "cmd_seq": cmd_seq,
-                "show": show,
-                "show_ConTeXt_path": show_ConTeXt_path,
-                "show_errors": show_errors,
-                "show_errors_inline": show_errors_inline,
-                "show_full_command": show_full_command,
-            },
+            dict(
+                args,
+                show=show,
+                show_ConTeXt_path=show_ConTeXt_path,
+                show_errors=show_errors,
+                show_errors_inline=show_errors_inline,
+                show_full_command=show_full_command,
+                when_busy="restart" if restart else "queue",
+            ),
         )
+
+    def check_build_cache(
+        self, main: str, cmd_seq: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """
+        Work out the arguments for the build: if the last build of `main`
+        had the same inputs (and its PDF is as it left it) then we just show
+        its outcome again, and otherwise we run the build and record it.
+        The key it is recorded under is worked out afresh when the build
+        runs, as the files might change before then.
+        """
+
+        context = self.expand_variables(cmd_seq[0])
+        try:
+            key = build_cache.key(main, [context["cmd"], context["env"]])
+        except (OSError, ValueError):
+            return {"cmd_seq": cmd_seq}
+        path = os.path.join(
+            sublime.cache_path(), "simple_ConTeXt", BUILD_CACHE,
+        )
+        output = build_cache.output_path(main, context["cmd"])
+        args = {
+            "cmd_seq": cmd_seq,
+            "record_build": {
+                "path": path,
+                "file": main,
+                "command": [context["cmd"], context["env"]],
+                "output": output,
+            },
+        }
+        entry = build_cache.open_cache(path).get(main, key, output)
+        if entry is not None:
+            # We pass on the build as well, for in case one is in progress
+            # (see `SimpleContextExecMainCommand.run`).
+            args["replay"] = entry
+        return args
@@ -12,7 +12,9 @@
 import sublime
 import sublime_plugin
 
+from .scripts import bib_store
 from .scripts import cite
+from .scripts import cursor
 from .scripts import scopes
 from .scripts import utilities
 
@@ -24,6 +26,8 @@
 
 EXTENSIONS = ("bib", "xml", "lua")
 
+BIB_STORE = "bibliographies"
+
 FORMAT = cite.DefaultFormatter(lookup={"year": "????"}, default="??")
 
 
@@ -35,7 +39,7 @@ def is_citation_history(cmd: list) -> bool:
     return cmd[0] not in {"left_delete", "right_delete"} if cmd else True
 
 
-# @utilities.hash_first_arg
+# @deep_dict.hash_first_arg
 # @functools.lru_cache(maxsize=128)
 def get_entries(
     bibliographies: Dict[str, Dict[str, Any]],
@@ -67,8 +71,13 @@ class SimpleContextCiteEventListener(
     extensions = ("",) + tuple(".{}".format(s) for s in EXTENSIONS)
     bibliographies = {}  # type: Dict[str, Optional[dict]]
     bib_per_files = {}  # type: Dict[str, dict]
+    store = None  # type: Optional[bib_store.BibStore]
     lock = threading.Lock()
 
+    def __init__(self, *args) -> None:
+        super().__init__(*args)
+        cursor.register(self.view, self)
+
     def is_visible(self) -> bool:
         return self.is_visible_alt()
 
@@ -90,8 +99,7 @@ def reload_settings(self) -> None:
             "${packages}/simple_ConTeXt/scripts/parse_btx.lua"
         )
 
-    def on_modified_async(self) -> None:
-        self.reload_settings()
+    def on_cursor_modified(self, context: cursor.CursorContext) -> None:
         format_ = self.get_setting("citations/format")
         if isinstance(format_, str):
             format_ = format_.split("<>")
@@ -100,26 +108,16 @@ def on_modified_async(self) -> None:
         ):
             return
 
-        sel = self.view.sel()
-        if not sel:
+        if not context.region:
             return
-        region = sel[0]
-
-        ctrl = scopes.last_block_in_region(
-            self.view,
-            0,
-            scopes.CONTROL_SEQ,
-            end=region.begin(),
-            skip=scopes.SKIP_ARGS_AND_SPACES,
-        )
+
+        ctrl = context.last_control(context.region.begin())
         if not ctrl:
             return
-        last_char = self.view.substr(max(0, region.end() - 1))
-        last_cmd = self.view.command_history(0, modifying_only=True)
 
         if (
-            is_citation_start(last_char) and
-            is_citation_history(last_cmd) and
+            is_citation_start(context.last_char()) and
+            is_citation_history(context.last_command()) and
             self.is_citation_command(*ctrl)
         ):
             threading.Thread(
@@ -164,28 +162,42 @@ def on_done(self, index: int) -> None:
                 )
 
     def try_parse(self, name: str, view_name: str) -> None:
-        self.bib_per_files.setdefault(view_name, {})
-        if name not in self.bib_per_files[view_name]:
-            if view_name:
-                main = self.locate_file_main(name, extensions=self.extensions)
-                if main:
-                    self.bib_per_files[view_name][name] = main
-                    bib = self.try_parse_aux(main)
-                    if bib is None:
-                        msg = "[simple_ConTeXt] failed to parse file: {}"
-                        print(msg.format(os.path.basename(main)))
-                    self.bibliographies[main] = bib
-                    return
-            other = self.locate_file_context(name, extensions=self.extensions)
-            if other:
-                self.bib_per_files[view_name][name] = other
-                bib = self.try_parse_aux(other)
-                if bib is None:
-                    msg = "[simple_ConTeXt] failed to parse file: {}"
-                    print(msg.format(os.path.basename(other)))
-                self.bibliographies[other] = bib
-                return
-            self.bib_per_files[view_name][name] = 0
+        files = self.bib_per_files.setdefault(view_name, {})
+        if name not in files:
+            files[name] = self.locate_bib(name, view_name) or 0
+        path = files[name]
+        if path:
+            self.bibliographies[path] = \
+                self.get_store().get(path, self.try_parse_reporting)
+
+    def try_parse_reporting(self, name: str) -> Optional[Dict[str, str]]:
+        """
+        The store only calls us when it has no parse of this version of the
+        file, failed or otherwise, so we report each failure just the once.
+        """
+
+        bib = self.try_parse_aux(name)
+        if bib is None:
+            msg = "[simple_ConTeXt] failed to parse file: {}"
+            print(msg.format(os.path.basename(name)))
+        return bib
+
+    def locate_bib(self, name: str, view_name: str) -> Optional[str]:
+        if view_name:
+            main = self.locate_file_main(name, extensions=self.extensions)
+            if main:
+                return main
+        return self.locate_file_context(name, extensions=self.extensions)
+
+    @classmethod
+    def get_store(cls) -> bib_store.BibStore:
+        if cls.store is None:
+            cls.store = bib_store.BibStore(
+                os.path.join(
+                    sublime.cache_path(), "simple_ConTeXt", BIB_STORE,
+                )
+            )
+        return cls.store
 
     def try_parse_aux(self, name: str) -> Optional[Dict[str, str]]:
         if name.endswith(".bib"):
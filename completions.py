@@ -5,16 +5,21 @@
 import threading
 import time
 
-from typing import Dict, Iterable, List, Optional, Union  # noqa
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union  # noqa
 
 import sublime
 import sublime_plugin
 
+from .scripts import caching
+from .scripts import chunks
+from .scripts import cursor
 from .scripts import files
 from .scripts import html_css
 from .scripts import load
+from .scripts import prefix_index
 from .scripts import randomize
 from .scripts import scopes
+from .scripts import store
 from .scripts import utilities
 
 
@@ -22,6 +27,17 @@
 
 RUNNING = 1
 
+CSS = "Packages/simple_ConTeXt/css/pop_up.css"
+
+PREFERENCES = "Preferences.sublime-settings"
+
+PREFERENCES_KEY = "simple_ConTeXt.pop_up_styles"
+
+# Saving one of these might change what the pop-ups look like.
+STYLE_EXTENSIONS = (
+    ".css", ".sublime-color-scheme", ".hidden-color-scheme", ".tmTheme",
+)
+
 TEMPLATE = """
 <html>
     <style>
@@ -80,6 +96,30 @@ def extra_style() -> str:
 EXTRA_STYLE = extra_style()
 
 
+def plugin_loaded() -> None:
+    sublime.load_settings(PREFERENCES).add_on_change(
+        PREFERENCES_KEY, clear_styles,
+    )
+
+
+def plugin_unloaded() -> None:
+    sublime.load_settings(PREFERENCES).clear_on_change(PREFERENCES_KEY)
+
+
+def clear_styles() -> None:
+    """
+    Forget the CSS and the styles we took from the color schemes, and so the
+    pages built from them. We call this when the preferences change (for
+    example to another color scheme, or to another variant of the one in
+    use) and when a style sheet or color scheme is saved.
+    """
+
+    listener = SimpleContextMacroSignatureEventListener
+    listener.css.clear()
+    listener.extra_styles.clear()
+    listener.page_cache.clear()
+
+
 def try_jump_to_def(view: sublime.View, command: str) -> None:
     threading.Thread(target=lambda: try_jump_to_def_aux(view, command)).start()
 
@@ -106,35 +146,114 @@ def __init__(
         max_size: int = 100,
         local_size: int = 10,
         cmds: str = "_commands.json",
+        store_name: str = "_commands.store",
+        policy: str = "lru",
+        rendered_name: str = "_rendered.store",
     ) -> None:
         self.dir = dir_
-        self.missing = sorted(f for f in os.listdir(dir_) if f != cmds)
-        with open(os.path.join(dir_, cmds), encoding="utf-8") as f:
-            self.cmds = collections.OrderedDict()
-            for text in sorted(json.load(f), key=lambda s: s.split(":", 1)[1]):
-                parity, ctrl = text.split(":", 1)
-                self.cmds[ctrl] = int(parity)
+        store_path = os.path.join(dir_, store_name)
+        self.store = (
+            store.Store(store_path) if os.path.exists(store_path) else None
+        )
+        rendered_path = os.path.join(dir_, rendered_name)
+        self.rendered = (
+            store.Store(rendered_path) if os.path.exists(rendered_path)
+            else None
+        )
+        self.path = os.path.join(dir_, cmds)
+        self.version = store.identity(os.stat(self.path))
+        commands, self.chunks = chunks.load_index(dir_, cmds)
+        self.lasts = [last for last, _ in self.chunks]
+        self.cmds = collections.OrderedDict()
+        for text in sorted(commands, key=lambda s: s.split(":", 1)[1]):
+            parity, ctrl = text.split(":", 1)
+            self.cmds[ctrl] = int(parity)
         self.local_size = local_size
-        self.cache = utilities.FuzzyOrderedDict(max_size=max_size)
+        self.cache = caching.new_cache(policy, max_size=max_size)
+        self.completion_list = None  # type: Optional[List[List[str]]]
+        self.completion_entries = {}  # type: Dict[str, List[str]]
+        self.index = prefix_index.PrefixIndex(self.cmds.items())
+
+    def prerendered(
+        self, name: str, key: Tuple[Tuple[str, Any], ...],
+    ) -> Optional[List[str]]:
+        """
+        Return the pop-up for `name` as it was rendered when the interface
+        was generated, provided that it was rendered with the same options
+        `key` (see `load.options_key`).
+        """
+
+        if self.rendered is None:
+            return None
+        options = self.rendered.meta.get("options", [])
+        if key != tuple(tuple(item) for item in options):
+            return None
+        return self.rendered.get(name)
+
+    def is_stale(self) -> bool:
+        """
+        Whether the interface files have been regenerated since. The command
+        list is always the last file to be written, so we go by that.
+        """
+
+        try:
+            return store.identity(os.stat(self.path)) != self.version
+        except OSError:
+            return True
+
+    def completions(self, prefix: str = "") -> List[List[str]]:
+        """
+        Return the completions that fuzzy-match `prefix`, best first. Sublime
+        Text only ever offers completions that start with the same letter as
+        the prefix (ignoring case), and so does the index.
+        """
+
+        if self.completion_list is None:
+            self.build_completions()
+        prefix = prefix.lstrip("\\")
+        if prefix:
+            return [
+                self.completion_entries[name]
+                for name in self.index.fuzzy(prefix)
+            ]
+        return self.completion_list
+
+    def build_completions(self) -> None:
+        self.completion_list = []
+        self.completion_entries = {}
+        for ctrl, parity in self.cmds.items():
+            if parity > 0:
+                entry = ["\\{}\t({}) command".format(ctrl, parity)]
+            else:
+                entry = ["\\{}\tcommand".format(ctrl)]
+            entry.append("\\{}$0".format(ctrl))
+            self.completion_list.append(entry)
+            self.completion_entries[ctrl] = entry
 
     def __setitem__(self, key, value) -> None:
-        self.cache.add_left(key, value)
+        self.cache[key] = value
 
     def __getitem__(self, key) -> None:
         if key in self:
-            if key in self.cache:
+            try:
                 return self.cache[key]
-            name = min(f for f in self.missing if key <= f)
+            except KeyError:
+                pass
+            if self.store is not None:
+                result = self.store[key]
+                self[key] = result
+                return result
+            i = chunks.locate(self.lasts, key)
+            if i is None:
+                raise KeyError(key)
+            name = self.chunks[i][1]
             with open(os.path.join(self.dir, name), encoding="utf-8") as f:
                 data = json.load(f)
 
-            sample = [
-                (k, data[k])
-                for k in randomize.safe_random_sample(
-                    list(data), self.local_size,
-                )
-            ]
-            self.cache.fuzzy_add_right(sample)
+            for k in randomize.safe_random_sample(
+                [k for k in data if k != key], self.local_size,
+            ):
+                self.cache.prefetch(k, data[k])
 
             result = data[key]
             self[key] = result
@@ -153,37 +272,46 @@ def strip_prefix(text: str) -> str:
     return "".join(text.split()[-1:])
 
 
+class SimpleContextPopUpStyleEventListener(sublime_plugin.EventListener):
+    def on_post_save_async(self, view: sublime.View) -> None:
+        name = view.file_name()
+        if name and name.endswith(STYLE_EXTENSIONS):
+            clear_styles()
+
+
 class SimpleContextMacroSignatureEventListener(
     utilities.BaseSettings, sublime_plugin.ViewEventListener,
 ):
     cache = {}
-    html_cache = {}
+    # Rendered pop-ups are keyed on the interface (its slug and when it was
+    # generated), the command and the pop-up settings. Whole pages are keyed
+    # on the color scheme as well, which is all that the styling depends on.
+    # The styles are kept until `clear_styles` throws them away.
+    render_cache = caching.LRUCache(max_size=500)
+    page_cache = caching.LRUCache(max_size=100)
+    css = {}  # type: Dict[str, str]
+    extra_styles = {}  # type: Dict[Optional[str], str]
     lock = threading.Lock()
     loader = load.InterfaceLoader()
     state = IDLE
     file_min = 20000
+    cache_policy = "arc"
     param_char = string.ascii_letters  # + string.whitespace
     extensions = (".mkix", ".mkxi", ".mkiv", ".mkvi", ".tex", ".mkii")
     auto_complete_cmd_key = None
     attempts = 0
 
+    def __init__(self, *args) -> None:
+        super().__init__(*args)
+        cursor.register(self.view, self)
+
     def is_visible(self) -> bool:
         return self.is_visible_alt()
 
     def reload_settings(self) -> None:
         super().reload_settings()
-        self.pop_ups = {
-            k.split("/")[-1]: self.get_setting("pop_ups/{}".format(k))
-            for k in {
-                "line_break",
-                "match_indentation",
-                "hang_indentation",
-                "methods/on_hover",
-                "methods/on_modified",
-                "show_copy_pop_up",
-                "show_source_files",
-            }
-        }
+        self.pop_ups = self.get_pop_up_options()
+        self.pop_up_key = load.options_key(self.pop_ups)
         self.name = files.file_as_slug(self.context_path)
         self.size = self.view.size()
         if (
@@ -212,31 +340,45 @@ def reload_settings_aux(self) -> None:
     def try_load_commands(self) -> None:
         self.attempts += 1
         if self.attempts < 10:
-            self.load_commands(
-                os.path.join(
-                    sublime.packages_path(),
-                    "simple_ConTeXt",
-                    "interface",
-                    self.name,
-                )
-            )
+            self.load_commands(self.interface_path())
+
+    def interface_path(self) -> str:
+        return os.path.join(
+            sublime.packages_path(), "simple_ConTeXt", "interface", self.name,
+        )
 
     def load_css(self) -> None:
-        self.style = html_css.strip_css_comments(
-            sublime.load_resource(
-                "Packages/simple_ConTeXt/css/pop_up.css"
+        style = self.css.get(CSS)
+        if style is None:
+            style = self.css[CSS] = html_css.strip_css_comments(
+                sublime.load_resource(CSS)
             )
-        )
+        self.style = style
 
     def load_commands(self, path: str) -> None:
         try:
             self.cache[self.name] = \
-                VirtualCommandDict(path, max_size=500, local_size=25)
-            self.html_cache[self.name] = \
-                utilities.LeastRecentlyUsedCache(max_size=500)
-        except OSError:
+                VirtualCommandDict(
+                    path,
+                    max_size=500,
+                    local_size=25,
+                    policy=self.cache_policy,
+                )
+        except (OSError, ValueError):
             pass
 
+    def current_commands(self) -> Optional[VirtualCommandDict]:
+        """
+        The commands of the current interface (if loaded), loaded again
+        first if the interface has been regenerated since.
+        """
+
+        cmds = self.cache.get(self.name)
+        if cmds is not None and cmds.is_stale():
+            self.load_commands(self.interface_path())
+            cmds = self.cache.get(self.name)
+        return cmds
+
     def on_query_completions(
         self, prefix: str, locations: List[int],
     ) -> Optional[List[List[str]]]:
@@ -249,13 +391,14 @@ def on_query_completions(
             self.auto_complete_cmd_key = None
             return self.complete_key(cmd)
 
-        if self.name in self.cache:
-            return self.complete_command(self.cache[self.name], locations)
+        cmds = self.current_commands()
+        if cmds is not None:
+            return self.complete_command(cmds, prefix, locations)
 
         return None
 
     def complete_command(
-        self, cache: VirtualCommandDict, locations: List[int],
+        self, cache: VirtualCommandDict, prefix: str, locations: List[int],
     ) -> Optional[List[List[str]]]:
         for location in locations:
             if scopes.enclosing_block(
@@ -264,15 +407,7 @@ def complete_command(
                 scopes.FULL_CONTROL_SEQ,
                 end=self.size,
             ):
-                result = []
-                for ctrl, parity in cache.cmds.items():
-                    if parity > 0:
-                        entry = ["\\{}\t({}) command".format(ctrl, parity)]
-                    else:
-                        entry = ["\\{}\tcommand".format(ctrl)]
-                    entry.append("\\{}$0".format(ctrl))
-                    result.append(entry)
-                return result
+                return cache.completions(prefix)
         return None
 
     # Crude, does a decent job though.
@@ -344,7 +479,7 @@ def on_hover(self, point: int, hover_zone: int) -> None:
         if not ctrl:
             return
         name = self.view.substr(sublime.Region(*ctrl))
-        if name in self.cache.get(self.name, {}):
+        if name in (self.current_commands() or {}):
             self.view.show_popup(
                 self.get_popup_text(name),
                 location=ctrl[0] - 1,
@@ -355,26 +490,22 @@ def on_hover(self, point: int, hover_zone: int) -> None:
         else:
             self.view.hide_popup()
 
-    def on_modified_async(self) -> None:
-        self.reload_settings()
+    def on_cursor_modified(self, context: cursor.CursorContext) -> None:
         if self.state != IDLE or not self.is_visible():
             self.view.hide_popup()
             return
 
-        selection = self.view.sel()
-        if not selection:
+        if not context.region:
             return
-        sel = selection[0]
-        end = sel.end()
-        end_ = end - 1 if end < self.size else end
+        self.size = context.size
+        end = context.region.end()
+        end_ = context.point
 
         if self.get_setting("pop_ups/methods/on_modified"):
-            ctrl = scopes.left_enclosing_block(
-                self.view, end_, scopes.CONTROL_SEQ, end=self.size
-            )
+            ctrl = context.left_control(end_)
             if ctrl:
                 name = self.view.substr(sublime.Region(*ctrl))
-                if name in self.cache.get(self.name, {}):
+                if name in (self.current_commands() or {}):
                     self.view.show_popup(
                         self.get_popup_text(name),
                         location=ctrl[0] - 1,
@@ -385,21 +516,16 @@ def on_modified_async(self) -> None:
                     return
 
         if self.get_setting("option_completions/on"):
-            ctrl = scopes.last_block_in_region(
-                self.view,
-                0,
-                scopes.CONTROL_SEQ,
-                end=end_,
-                skip=scopes.SKIP_ARGS_AND_SPACES,
-            )
+            ctrl = context.last_control(end_)
             if (
                 ctrl and
-                self.view.substr(end - 1) in string.ascii_letters and
-                self.view.match_selector(end - 1, scopes.BRACKETS_NOT_VALUE)
+                context.last_char() in string.ascii_letters and
+                context.matches(end - 1, scopes.BRACKETS_NOT_VALUE)
             ):
                 name = self.view.substr(sublime.Region(*ctrl))
-                if name in self.cache.get(self.name, {}):
-                    self.auto_complete_cmd_key = self.cache[self.name][name]
+                cmds = self.current_commands()
+                if cmds is not None and name in cmds:
+                    self.auto_complete_cmd_key = cmds[name]
                     self.view.run_command(
                         "auto_complete",
                         {
@@ -412,27 +538,33 @@ def on_modified_async(self) -> None:
         self.view.hide_popup()
 
     def get_popup_text(self, name: str) -> str:
-        new_pop_up_state = json.dumps(self.pop_ups, sort_keys=True)
-        if not hasattr(self, "prev_pop_up_state"):
-            self.prev_pop_up_state = None
-        if new_pop_up_state != self.prev_pop_up_state:
-            self.html_cache[self.name].clear()
-        if name not in self.html_cache[self.name]:
-            cmd = self.cache[self.name][name]
-            self.html_cache[self.name][name] = self.loader.load(
-                name, cmd, protect_space=True, **self.pop_ups
+        cmds = self.current_commands()
+        key = (self.name, cmds.version, name, self.pop_up_key)
+        parts = self.render_cache.get(key)
+        if parts is None:
+            parts = cmds.prerendered(name, self.pop_up_key)
+            if parts is None:
+                parts = self.loader.load(
+                    name, cmds[name], protect_space=True, **self.pop_ups
+                )
+            self.render_cache[key] = parts
+        self.popup_parts = parts
+
+        scheme = self.view.settings().get("color_scheme")
+        page_key = key + (scheme,)
+        page = self.page_cache.get(page_key)
+        if page is None:
+            self.load_css()
+            extra = self.extra_styles.get(scheme)
+            if extra is None:
+                extra = self.extra_styles[scheme] = self.get_extra_style()
+            page = TEMPLATE.format(
+                body="<br><br>".join(s for s in parts if s),
+                style=self.style,
+                extra_style=extra,
             )
-        self.prev_pop_up_state = new_pop_up_state
-        self.popup_name = name
-
-        self.load_css()
-        return TEMPLATE.format(
-            body="<br><br>".join(
-                s for s in self.html_cache[self.name][name] if s
-            ),
-            style=self.style,
-            extra_style=self.get_extra_style(),
-        )
+            self.page_cache[page_key] = page
+        return page
 
     def get_extra_style(self) -> str:
         con, sco = self.styles_for_scope("support.function")
@@ -480,10 +612,7 @@ def on_navigate(self, href: str, name: str) -> None:
         if type_ == "file":
             self.on_navigate_file(content, name)
         elif type_ == "copy":
-            text = "<br><br>".join(
-                s for s in self.html_cache[self.name][self.popup_name][:-1]
-                if s
-            )
+            text = "<br><br>".join(s for s in self.popup_parts[:-1] if s)
             self.copy(html_css.raw_print(text))
             # if content == "html":
             #     self.copy(html_css.pretty_print(text))
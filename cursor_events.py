@@ -0,0 +1,17 @@
+import sublime_plugin
+
+from .scripts import cursor
+
+
+class SimpleContextCursorEventListener(sublime_plugin.ViewEventListener):
+    """
+    The one listener for modifications on behalf of the citations, the
+    references and the pop-ups, which register with `cursor` (see
+    `cursor.dispatch`).
+    """
+
+    def on_modified_async(self) -> None:
+        cursor.dispatch(self.view)
+
+    def on_close(self) -> None:
+        cursor.forget(self.view)
@@ -3,14 +3,17 @@
 import threading
 import time
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import sublime
 import sublime_plugin
 
+from .scripts import build_cache
 from .scripts import files
 from .scripts import html_css
 from .scripts import log
+from .scripts import log_stream
+from .scripts import scheduler
 from .scripts import utilities
 
 
@@ -36,6 +39,10 @@ class SimpleContextExecMainCommand(
     proc = None
     output_panel_cache = ""
 
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.queued = scheduler.Pending(sublime.set_timeout)
+
     def reload_settings(self) -> None:
         super().reload_settings()
         self.window.run_command("simple_context_unpack_lua_scripts")
@@ -83,6 +90,9 @@ def run(
         working_dir: Optional[str] = None,
         file_regex: str = "",
         line_regex: str = "",
+        replay: Optional[Dict[str, Any]] = None,
+        record_build: Optional[Dict[str, Any]] = None,
+        when_busy: str = "ignore",
         **kwargs
     ):
         cmd_seq = [] if cmd_seq is None else cmd_seq
@@ -120,15 +130,44 @@ def run(
             self.kill_proc()
             return
 
-        # We make it so that building again whilst a build is already in
-        # progress does nothing. If you wish to cancel it, you can use the
-        # proper Sublime Text way of doing that: `Ctrl+Shift+C` is bound to
-        # 'cancel build' by default.
+        # By default, building again whilst a build is already in progress
+        # does nothing. If you wish to cancel it, you can use the proper
+        # Sublime Text way of doing that: `Ctrl+Shift+C` is bound to 'cancel
+        # build' by default.
         #
-        # TODO: add an option to opt-in to this behaviour, as it can be nice
-        # and would be easy for us to do.
+        # Otherwise, with `when_busy` set to `"restart"` we cancel the build
+        # in progress and start this one in its place, and with `"queue"` we
+        # start this one once the build in progress is over (see
+        # `scheduler.when_busy_action`).
         if self.proc is not None:
-            return
+            action = scheduler.when_busy_action(when_busy, replay is not None)
+            if action == "restart":
+                self.kill_proc()
+            else:
+                if action == "queue":
+                    args = {
+                        "cmd_seq": cmd_seq,
+                        "show": show,
+                        "show_ConTeXt_path": show_ConTeXt_path,
+                        "show_errors": show_errors,
+                        "show_errors_inline": show_errors_inline,
+                        "show_full_command": show_full_command,
+                        "encoding": encoding,
+                        "quiet": quiet,
+                        "syntax": syntax,
+                        "word_wrap": word_wrap,
+                        "working_dir": working_dir,
+                        "file_regex": file_regex,
+                        "line_regex": line_regex,
+                        "record_build": record_build,
+                        "when_busy": when_busy,
+                    }
+                    self.queued.put(
+                        lambda: self.window.run_command(
+                            "simple_context_exec_main", args,
+                        )
+                    )
+                return
 
         self.proc = None
         self.encoding = encoding
@@ -162,6 +201,10 @@ def run(
         if working_dir:
             os.chdir(working_dir)
 
+        if replay is not None:
+            self.replay_build(replay, show_errors, show_errors_inline)
+            return
+
         if cmd_seq:
             sequence = self.expand_variables(cmd_seq)
             try:
@@ -173,6 +216,7 @@ def run(
                     show_errors=show_errors,
                     show_errors_inline=show_errors_inline,
                     show_full_command=show_full_command,
+                    record_build=record_build,
                 )
                 self.proc.start()
             except Exception as e:
@@ -181,7 +225,40 @@ def run(
                     text = "- encountered error of type {}\n- finished\n"
                     self.add_to_output(text.format(type(e)))
 
+    def replay_build(
+        self,
+        entry: Dict[str, Any],
+        show_errors: Optional[bool],
+        show_errors_inline: Optional[bool],
+    ) -> None:
+        """
+        Show the outcome of the last build again, in place of a build whose
+        inputs are the same (see `build_cache`).
+        """
+
+        if not self.quiet:
+            sublime.status_message("Build skipped: nothing changed")
+        self.add_to_output("- nothing changed since the last build\n")
+        errors = entry.get("errors", [])
+        if errors:
+            if show_errors:
+                self.add_to_output(log.compile_errors(errors))
+            self.add_to_output(
+                "  - completed un-successfully\n",
+                scroll_to_end=True,
+                force=True,
+            )
+            if self.global_show_errors_inline and show_errors_inline:
+                self.do_phantoms(errors)
+            if self.show_output_on_errors:
+                self.show_output()
+        else:
+            self.add_to_output(
+                "  - completed successfully\n", scroll_to_end=True, force=True,
+            )
+
     def kill_proc(self) -> None:
+        self.queued.clear()
         if self.proc:
             self.proc.kill()
         self.proc = None
@@ -286,7 +363,6 @@ class ExecMainSubprocess:
     shell = True if platform == "windows" else False
     proc = None
     killed = False
-    lock = threading.Lock()
 
     def __init__(
         self,
@@ -297,6 +373,7 @@ def __init__(
         show_full_command: Optional[bool] = None,
         show_errors: Optional[bool] = None,
         show_errors_inline: Optional[bool] = None,
+        record_build: Optional[Dict[str, Any]] = None,
     ) -> None:
         self.sequence = sequence[::-1]
         self.root = root
@@ -308,10 +385,11 @@ def __init__(
             False if show_full_command is None else show_full_command
         self.show_errors_inline = \
             False if show_errors_inline is None else show_errors_inline
+        self.record_build = record_build
+        self.lock = threading.Lock()
 
     def start(self) -> None:
         with self.lock:
-            self.killed = False
             self.start_time = time.time()
             if self.working_dir:
                 os.chdir(self.working_dir)
@@ -319,6 +397,9 @@ def start(self) -> None:
 
     def proceed(self) -> None:
         self.lock.acquire()
+        if self.killed:
+            self.lock.release()
+            return
         if not self.sequence:
             self.lock.release()
             self.quit()
@@ -367,10 +448,31 @@ def proceed(self) -> None:
         self.lock.release()
         thread.start()
 
+    def build_key(self) -> Optional[str]:
+        """
+        The key to record the build under, as the files stand now (see
+        `build_cache.key`), or `None` if we are not to record it.
+        """
+
+        if not self.record_build:
+            return None
+        try:
+            return build_cache.key(
+                self.record_build["file"], self.record_build["command"],
+            )
+        except (OSError, ValueError):
+            return None
+
     def run_command(
         self, cmd: List[str], opts: Dict[str, Any], output: Optional[str],
     ) -> None:
+        key = self.build_key() if output == "context" else None
         self.proc = subprocess.Popen(cmd, **opts)
+        # If we were cancelled whilst starting it up, then `kill` might have
+        # missed it.
+        if self.killed:
+            self.terminate()
+            return
         if output == "context":
             self.root.add_to_output("- running ConTeXt\n")
             if self.show_ConTeXt_path:
@@ -383,16 +485,17 @@ def run_command(
                 self.root.add_to_output(
                     "  - full command: {}\n".format(" ".join(cmd))
                 )
-            result = self.proc.communicate()
-            code = self.proc.returncode
+            data, code = self.stream_context()
         elif output == "pdf":
             code = 0
         else:
             code = 0
 
         with self.lock:
+            if self.killed:
+                return
             if output == "context":
-                self.output_context(result[0] if result else None, code)
+                self.output_context(data, code, key)
             elif output == "pdf":
                 self.output_context_pdf(cmd[0] if cmd else None)
 
@@ -401,14 +504,77 @@ def run_command(
         else:
             self.proceed()
 
-    def output_context(self, data: str, code: int) -> None:
+    def stream_context(self) -> Tuple[bytes, int]:
+        """
+        Read the output of ConTeXt line by line as it runs, reporting each new
+        pass and, as soon as we spot them, any errors. Returns the whole of
+        the output together with the exit code.
+        """
+
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.detector = log_stream.ErrorDetector()
+        chunks = []  # type: List[bytes]
+        for line in iter(self.proc.stdout.readline, b""):
+            chunks.append(line)
+            passes = self.detector.passes
+            found = self.detector.feed(files.decode_bytes(line))
+            root = self.root
+            if root and not self.killed and self.detector.passes != passes:
+                text = "  - pass {}\n".format(self.detector.passes)
+                root.add_to_output(text)
+            if found:
+                self.output_early_errors(found)
+        found = self.detector.finish()
+        if found:
+            self.output_early_errors(found)
+        self.proc.wait()
+        return b"".join(chunks), self.proc.returncode
+
+    def output_early_errors(self, errors: List[List[str]]) -> None:
+        with self.lock:
+            if self.killed or not self.root:
+                return
+            if self.show_errors:
+                self.root.add_to_output(log.compile_errors(errors))
+            if self.root.global_show_errors_inline and self.show_errors_inline:
+                self.root.do_phantoms(self.detector.errors)
+
+    def output_context(
+        self, data: bytes, code: int, key: Optional[str] = None,
+    ) -> None:
         if not self.root:
             return
         result = self.root.parse_log(data)
+        # Parsing the log takes a while, during which we might be cancelled.
+        if self.killed:
+            return
         errors = [] if result is None else result.get("errors", [])
+        # If the files changed whilst ConTeXt was running then we cannot tell
+        # which version it saw, so we leave such a build unrecorded.
+        if (
+            key is not None and
+            result is not None and
+            (errors or not code) and
+            self.build_key() == key
+        ):
+            build_cache.open_cache(self.record_build["path"]).put(
+                self.record_build["file"],
+                key,
+                self.record_build["output"],
+                code,
+                errors,
+            )
         if errors:
             if self.show_errors:
-                self.root.add_to_output(log.compile_errors(errors))
+                # Leave out the ones we already reported on the fly.
+                self.root.add_to_output(
+                    log.compile_errors(
+                        log_stream.unreported(errors, self.detector.errors)
+                    )
+                )
             self.root.add_to_output(
                 "  - completed un-successfully\n",
                 scroll_to_end=True,
@@ -437,30 +603,43 @@ def output_context_pdf(self, cmd) -> None:
         self.root.add_to_output(text, scroll_to_end=True, force=True)
 
     def kill(self) -> None:
-        # Hmm. This doesn't seem to work as I would expect.
-        with self.lock:
-            if self.killed:
-                return
-
-            if self.proc:
-                if self.platform == "windows":
-                    subprocess.Popen(
-                        ["taskkill", "/t", "/f", "/pid", str(self.proc.pid)],
-                        creationflags=self.flags,
-                        shell=self.shell,
-                    )
-                else:
-                    self.proc.kill()
+        """
+        We are called on the UI thread, so we do not wait on `self.lock`
+        (which the build holds whilst it parses the log). Instead we raise
+        the `killed` flag, which the build checks before it does anything
+        more, and kill the process. If the process is only now starting up
+        then `run_command` kills it once it is there.
+        """
+
+        if self.killed:
+            return
+        self.killed = True
+        self.terminate()
+        root = self.root
+        if not root:
+            return
+        root.add_to_output(
+            "- cancelled in {:.1f}s\n".format(time.time() - self.start_time)
+        )
+        if root.proc is self:
+            root.proc = None
 
-            self.killed = True
-            self.sequence = []
-            self.root.add_to_output(
-                "- cancelled in {:.1f}s\n".format(
-                    time.time() - self.start_time
+    def terminate(self) -> None:
+        # Hmm. This doesn't seem to work as I would expect.
+        proc = self.proc
+        if proc is None or proc.poll() is not None:
+            return
+        try:
+            if self.platform == "windows":
+                subprocess.Popen(
+                    ["taskkill", "/t", "/f", "/pid", str(proc.pid)],
+                    creationflags=self.flags,
+                    shell=self.shell,
                 )
-            )
-            self.root.proc = None
-            self.root = None
+            else:
+                proc.kill()
+        except OSError:
+            pass
 
     def poll(self) -> Optional[bool]:
         if self.proc:
@@ -473,9 +652,12 @@ def exit_code(self) -> Optional[int]:
         return None
 
     def quit(self) -> None:
-        if not self.root:
+        if self.killed or not self.root:
             return
-        self.root.add_to_output(
+        root = self.root
+        root.add_to_output(
             "- finished in {:.1f}s\n".format(time.time() - self.start_time)
         )
-        self.root.proc = None
+        if root.proc is self:
+            root.proc = None
+        root.queued.release()
@@ -3,13 +3,17 @@
 import threading
 import time
 
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 import sublime
 import sublime_plugin
 
+from .scripts import chunks
 from .scripts import files
+from .scripts import load
+from .scripts import manifest
 from .scripts import save
+from .scripts import store
 from .scripts import utilities
 
 
@@ -17,6 +21,16 @@
 
 RUNNING = 1
 
+COMMANDS = "_commands.json"
+
+MANIFEST = "_manifest.json"
+
+STORE = "_commands.store"
+
+RENDERED = "_rendered.store"
+
+MANIFEST_VERSION = 2
+
 
 def arg_count(cmd) -> int:
     """Return the maximum number of arguments the given command takes."""
@@ -76,11 +90,33 @@ def run(
         indent: int = 2,
         overwrite: bool = False,
         file_min: int = 20000,
+        workers: int = 1,
+        store_format: str = "json",
+        prerender: bool = False,
     ) -> None:
+        """
+        The generated interface is written either as many JSON files, each
+        holding a chunk of about `file_min` characters worth of commands, or
+        (if `store_format` is `"binary"`) as one indexed store file.
+
+        If `prerender` is set, then we also render the pop-up for every
+        command (with the current pop-up settings) while regenerating from
+        scratch, so that the pop-ups need not be rendered on first hover.
+        Once there, the pre-rendered pop-ups are kept up to date by the
+        incremental updates.
+
+        Inside Sublime Text the command files are always parsed in this one
+        process, whatever `workers` says (see `save.in_plugin_host`).
+        """
+
         paths = [] if paths is None else paths
         self.reload_settings()
         self.file_min = file_min
         self.indent = indent
+        self.workers = workers
+        self.store_format = store_format
+        self.prerender = prerender
+        self.pop_ups = self.get_pop_up_options()
         if self.state == IDLE:
             self.state = RUNNING
 
@@ -125,41 +161,85 @@ def run_aux_iii(self, path: str, dir_: str, slug: str) -> None:
         if not os.path.exists(dir_):
             os.makedirs(dir_)
 
-        commands = os.path.join(dir_, "_commands.json")
-        if not os.path.exists(commands):
-            try:
+        try:
+            if not os.path.exists(os.path.join(dir_, COMMANDS)):
                 self.run_aux_iv(path, dir_, slug)
-            except OSError as e:
-                if self.first_error:
-                    self.first_error = False
-                    text = (
-                        '[simple_ConTeXt] failed to load interface, '
-                        'encountered error: "{}"'
-                    )
-                    print(text.format(e))
+            elif os.path.exists(os.path.join(dir_, MANIFEST)):
+                self.update_incrementally(path, dir_, slug)
+        except OSError as e:
+            if self.first_error:
+                self.first_error = False
+                text = (
+                    '[simple_ConTeXt] failed to load interface, '
+                    'encountered error: "{}"'
+                )
+                print(text.format(e))
+
+    def new_saver(self) -> save.InterfaceSaver:
+        return save.InterfaceSaver(flags=self.flags, shell=self.shell)
+
+    def save_kwargs(self) -> Dict[str, Any]:
+        return {
+            "modules": True,
+            "tolerant": True,
+            "quiet": True,
+            "prefix": "[simple_ConTeXt] ",
+            "start_stop": False,
+            "workers": self.workers,
+        }
 
     def run_aux_iv(self, path: str, dir_: str, slug: str) -> None:
-        saver = save.InterfaceSaver(flags=self.flags, shell=self.shell)
+        saver = self.new_saver()
         start_msg = (
             '[simple_ConTeXt] generating interface files (in folder "{}") '
             'for "{}"'
         )
         print(start_msg.format(slug, path))
         start_time = time.time()
-        saver.save(
-            path,
-            modules=True,
-            tolerant=True,
-            quiet=True,
-            prefix="[simple_ConTeXt] ",
-            start_stop=False,
-        )
+        saver.save(path, **self.save_kwargs())
         stop_msg = (
             '[simple_ConTeXt] finished generating interface files (for "{}") '
             'in {:.1f}s'
         )
         print(stop_msg.format(slug, time.time() - start_time))
         cmds = saver.encode()
+        index = []  # type: chunks.Chunks
+        if self.store_format == "binary":
+            store.write(
+                os.path.join(dir_, STORE),
+                ((name, cmds[name]) for name in sorted(cmds)),
+            )
+        else:
+            index = self.write_chunks(dir_, cmds)
+        if self.prerender:
+            self.write_rendered(dir_, cmds)
+        self.run_aux_v(
+            chunks.encode_index(
+                sorted(
+                    [
+                        "{}:{}".format(arg_count(desc), name)
+                        for name, desc in cmds.items()
+                    ],
+                    key=lambda s: s.split(":", 1)[1],
+                ),
+                index,
+            ),
+            os.path.join(dir_, COMMANDS),
+        )
+        self.save_manifest(
+            path,
+            dir_,
+            saver,
+            {f: manifest.signature(f) for f in saver.to_load},
+            {f: manifest.signature(f) for f in saver.def_files},
+            {},
+            saver.command_defs,
+        )
+
+    def write_chunks(
+        self, dir_: str, cmds: Dict[str, Any],
+    ) -> chunks.Chunks:
+        index = []  # type: chunks.Chunks
         cache, key, size = {}, None, 0
         for name in sorted(cmds):
             key = name
@@ -167,22 +247,29 @@ def run_aux_iv(self, path: str, dir_: str, slug: str) -> None:
             size += len(str(val))
             cache[key] = val
             if size > self.file_min:
-                self.run_aux_v(
-                    cache, os.path.join(dir_, "{}.json".format(key)),
-                )
+                index.append([key, chunks.chunk_file(key)])
+                self.run_aux_v(cache, os.path.join(dir_, index[-1][1]))
                 cache.clear()
                 size = 0
         if cache:
-            self.run_aux_v(cache, os.path.join(dir_, "{}.json".format(key)))
-        self.run_aux_v(
-            sorted(
-                [
-                    "{}:{}".format(arg_count(desc), name)
-                    for name, desc in cmds.items()
-                ],
-                key=lambda s: s.split(":", 1)[1],
+            index.append([key, chunks.chunk_file(key)])
+            self.run_aux_v(cache, os.path.join(dir_, index[-1][1]))
+        return index
+
+    def write_rendered(self, dir_: str, cmds: Dict[str, Any]) -> None:
+        loader = load.InterfaceLoader()
+        store.write(
+            os.path.join(dir_, RENDERED),
+            (
+                (
+                    name,
+                    loader.load(
+                        name, cmds[name], protect_space=True, **self.pop_ups
+                    ),
+                )
+                for name in sorted(cmds)
             ),
-            os.path.join(dir_, "_commands.json"),
+            {"options": load.options_key(self.pop_ups)},
         )
 
     def run_aux_v(self, data, file_: str) -> None:
@@ -194,3 +281,242 @@ def run_aux_v(self, data, file_: str) -> None:
                 sort_keys=True,
                 ensure_ascii=True,
             )
+
+    def save_manifest(
+        self,
+        path: str,
+        dir_: str,
+        saver: save.InterfaceSaver,
+        signatures: Dict[str, manifest.Signature],
+        definitions: Dict[str, manifest.Signature],
+        old: Dict[str, Any],
+        defines: Dict[str, Any],
+    ) -> None:
+        """
+        Record where the interface came from: the definition files, the
+        folders we took the command files from, and for each command file its
+        signature along with what `InterfaceSaver.update` needs to know about
+        it. We also keep the settled `defines` of the command files, so that
+        next time we can tell which of them moved.
+        """
+
+        files_ = {}
+        for f, sig in signatures.items():
+            if f in saver.to_load:
+                record = saver.file_record(f)
+            else:
+                record = old.get(f, {})
+            files_[f] = dict(record, **sig)
+        manifest.save(
+            {
+                "version": MANIFEST_VERSION,
+                "path": path,
+                "dirs": saver.dirs,
+                "definitions": definitions,
+                "defines": defines,
+                "files": files_,
+            },
+            os.path.join(dir_, MANIFEST),
+        )
+
+    def update_incrementally(self, path: str, dir_: str, slug: str) -> None:
+        """
+        Compare the source files against the manifest, and re-parse only the
+        command files that changed. A command can be described in more than
+        one file, and a command file can look up definitions made in another,
+        so we also re-parse the unchanged files that contribute to any of the
+        affected commands or that look up a definition that moved (see
+        `InterfaceSaver.update`). Any change to the definition files, which
+        every command might depend on, means starting again from scratch.
+        """
+
+        data = manifest.load(os.path.join(dir_, MANIFEST))
+        if (
+            not data or
+            data.get("version") != MANIFEST_VERSION or
+            data.get("path") != path or
+            any(
+                manifest.is_changed(f, sig)
+                for f, sig in data.get("definitions", {}).items()
+            )
+        ):
+            self.run_aux_ii(path, dir_, slug)
+            return
+        definitions = {
+            f: manifest.signature(f, old=sig)
+            for f, sig in data["definitions"].items()
+        }
+
+        saver = self.new_saver()
+        old = data.get("files", {})
+        try:
+            current = [f for d in data["dirs"] for f in saver.command_files(d)]
+        except (KeyError, OSError):
+            self.run_aux_ii(path, dir_, slug)
+            return
+        signatures, changed, removed = manifest.diff(old, current)
+        if not changed and not removed:
+            if (
+                any(
+                    sig != {k: old[f].get(k) for k in sig}
+                    for f, sig in signatures.items()
+                ) or
+                definitions != data["definitions"]
+            ):
+                saver.dirs = data["dirs"]
+                self.save_manifest(
+                    path,
+                    dir_,
+                    saver,
+                    signatures,
+                    definitions,
+                    old,
+                    data.get("defines", {}),
+                )
+            return
+
+        msg = (
+            '[simple_ConTeXt] updating interface files (in folder "{}") for '
+            '"{}": {} changed, {} removed'
+        )
+        print(msg.format(slug, path, len(changed), len(removed)))
+        start_time = time.time()
+
+        affected = saver.update(
+            path,
+            old,
+            current,
+            changed,
+            removed,
+            data.get("defines", {}),
+            **self.save_kwargs()
+        )
+        saver.dirs = data["dirs"]
+        cmds = saver.encode()
+        updates = {name: cmds.get(name) for name in affected}
+        commands, index = chunks.load_index(dir_, COMMANDS)
+        if os.path.exists(os.path.join(dir_, STORE)):
+            self.update_store(os.path.join(dir_, STORE), updates)
+        else:
+            index = self.update_chunks(dir_, updates, index)
+        if os.path.exists(os.path.join(dir_, RENDERED)):
+            self.update_rendered(os.path.join(dir_, RENDERED), updates)
+        self.update_command_list(dir_, updates, commands, index)
+        self.save_manifest(
+            path,
+            dir_,
+            saver,
+            signatures,
+            definitions,
+            old,
+            saver.command_defs,
+        )
+
+        msg = '[simple_ConTeXt] finished updating interface files in {:.1f}s'
+        print(msg.format(time.time() - start_time))
+
+    def update_chunks(
+        self,
+        dir_: str,
+        updates: Dict[str, Optional[list]],
+        index: chunks.Chunks,
+    ) -> chunks.Chunks:
+        """
+        Rewrite only the chunk files holding the commands in `updates`, where
+        a value of `None` means that the command is gone, and return the new
+        chunk index. We place each command the same way that
+        `VirtualCommandDict` looks it up, by bisecting on the last command of
+        each chunk. Commands past the last chunk are added to it, and it is
+        renamed to match.
+        """
+
+        lasts = [last for last, _ in index]
+        groups = {}  # type: Dict[Optional[int], List[str]]
+        for name in sorted(updates):
+            i = chunks.locate(lasts, name)
+            if i is None and index:
+                i = len(index) - 1
+            groups.setdefault(i, []).append(name)
+
+        new_index = {i: entry for i, entry in enumerate(index)}
+        for i, names in groups.items():
+            data = {}  # type: Dict[str, Any]
+            chunk = None if i is None else index[i][1]
+            if chunk is not None:
+                with open(os.path.join(dir_, chunk), encoding="utf-8") as f:
+                    data = json.load(f)
+            for name in names:
+                if updates[name] is None:
+                    data.pop(name, None)
+                else:
+                    data[name] = updates[name]
+
+            target = chunk
+            if data and (i is None or max(data) > index[i][0]):
+                new_index[i] = [max(data), chunks.chunk_file(max(data))]
+                target = new_index[i][1]
+            elif not data:
+                new_index.pop(i, None)
+            if data:
+                self.run_aux_v(data, os.path.join(dir_, target))
+            if chunk is not None and (not data or target != chunk):
+                os.remove(os.path.join(dir_, chunk))
+        return sorted(new_index.values())
+
+    def update_rendered(
+        self, file_: str, updates: Dict[str, Optional[list]],
+    ) -> None:
+        """
+        Re-render the pop-ups for the commands in `updates`, with the same
+        options as the rest of them.
+        """
+
+        options = dict(store.Store(file_).meta.get("options", []))
+        loader = load.InterfaceLoader()
+        self.update_store(
+            file_,
+            {
+                name: None if desc is None else loader.load(
+                    name, desc, protect_space=True, **options
+                )
+                for name, desc in updates.items()
+            },
+        )
+
+    def update_store(
+        self, file_: str, updates: Dict[str, Optional[list]],
+    ) -> None:
+        """
+        The store is a single file, so here we have no choice but to write
+        it out again in full; at least we need not re-parse anything.
+        """
+
+        old = store.Store(file_)
+        data = dict(old.items())
+        for name, desc in updates.items():
+            if desc is None:
+                data.pop(name, None)
+            else:
+                data[name] = desc
+        store.write(file_, ((k, data[k]) for k in sorted(data)), old.meta)
+
+    def update_command_list(
+        self,
+        dir_: str,
+        updates: Dict[str, Optional[list]],
+        commands: List[str],
+        index: chunks.Chunks,
+    ) -> None:
+        entries = {text.split(":", 1)[1]: text for text in commands}
+        for name, desc in updates.items():
+            if desc is None:
+                entries.pop(name, None)
+            else:
+                entries[name] = "{}:{}".format(arg_count(desc), name)
+        self.run_aux_v(
+            chunks.encode_index(
+                sorted(entries.values(), key=lambda s: s.split(":", 1)[1]),
+                index,
+            ),
+            os.path.join(dir_, COMMANDS),
+        )
@@ -3,6 +3,7 @@
 import sublime
 import sublime_plugin
 
+from .scripts import lua_worker
 from .scripts import utilities
 
 
@@ -10,11 +11,15 @@
 
 LUA_SCRIPTS = (
     "{}.lua".format(name) for name in {
-        "parse_btx", "parse_log", "parse_lua", "table_to_dict",
+        "parse_btx", "parse_log", "parse_lua", "table_to_dict", "worker",
     }
 )
 
 
+def plugin_unloaded() -> None:
+    lua_worker.shutdown()
+
+
 class SimpleContextUnpackLuaScriptsCommand(sublime_plugin.WindowCommand):
     first = True
 
@@ -54,3 +59,5 @@ def run(self) -> None:
                 os.path.join(location, script), encoding="utf-8", mode="w",
             ) as f:
                 f.write(content)
+        # Any running worker has the old scripts loaded.
+        lua_worker.shutdown()
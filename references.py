@@ -3,6 +3,7 @@
 import sublime
 import sublime_plugin
 
+from .scripts import cursor
 from .scripts import scopes
 from .scripts import utilities
 
@@ -37,32 +38,26 @@ def is_reference_history(cmd: list) -> bool:
 class SimpleContextReferenceEventListener(
     utilities.BaseSettings, sublime_plugin.ViewEventListener,
 ):
+    def __init__(self, *args) -> None:
+        super().__init__(*args)
+        cursor.register(self.view, self)
+
     def is_visible(self) -> bool:
         return self.is_visible_alt()
 
-    def on_modified_async(self) -> None:
-        self.reload_settings()
+    def on_cursor_modified(self, context: cursor.CursorContext) -> None:
         if not self.is_visible():
             return
 
-        sel = self.view.sel()
-        if not sel:
+        if not context.region:
             return
-        region = sel[0]
-
-        ctrl = scopes.last_block_in_region(
-            self.view,
-            0,
-            scopes.CONTROL_SEQ,
-            end=region.begin(),
-            skip=scopes.SKIP_ARGS_AND_SPACES,
-        )
+
+        ctrl = context.last_control(context.region.begin())
         if not ctrl:
             return
-        last_char = self.view.substr(max(0, region.end() - 1))
-        last_cmd = self.view.command_history(0, modifying_only=True)
         if not (
-            is_reference_start(last_char) and is_reference_history(last_cmd)
+            is_reference_start(context.last_char()) and
+            is_reference_history(context.last_command())
         ):
             return
 
@@ -0,0 +1,28 @@
+import sublime_plugin
+
+from .scripts import scope_runs
+from .scripts import scopes
+
+
+# Only Sublime Text 4 tells us where a buffer was edited. Without it, the
+# scope indexes (see `scope_runs`) start over whenever the view changes.
+if hasattr(sublime_plugin, "TextChangeListener"):
+    class SimpleContextScopeChangeListener(
+        sublime_plugin.TextChangeListener,
+    ):
+        # A buffer that only becomes ConTeXt later on goes without, which is
+        # fine: the scope indexes just start over on every change.
+        @classmethod
+        def is_applicable(cls, buffer) -> bool:
+            view = buffer.primary_view()
+            return view is not None and scopes.is_context(view)
+
+        def on_text_changed(self, changes) -> None:
+            view = self.buffer.primary_view()
+            if not changes or view is None:
+                return
+            # From the start of the line of the first edit on.
+            dirty = min(change.a.pt - change.a.col for change in changes)
+            scope_runs.note_edit(
+                self.buffer.id(), view.change_count(), max(dirty, 0),
+            )
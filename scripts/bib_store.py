@@ -0,0 +1,155 @@
+"""
+A persistent cache of parsed bibliographies. Parsing a bibliography means
+spawning LuaTeX, which for a large `.bib` file is slow, so we keep the results
+on disk, keyed on the absolute path of the file together with its signature
+(see `manifest.signature`). Every lookup re-checks the signature, so an edited
+file is parsed afresh, while an unchanged one is never parsed twice, not even
+across restarts.
+
+On disk the cache is a directory with one file per bibliography (named after
+a hash of its path), so that a change to one bibliography only rewrites its
+own entry. Each file is a short header followed by the zlib-compressed pickle
+of a triple (path, signature, bibliography).
+
+If only the modification time of a bibliography moves on, we keep the new
+signature in memory but do not write it out: next time round we just hash
+the file once more. Failed parses are remembered in memory only, by the
+signature of the file, so that we try again once the file changes or on the
+next start.
+"""
+
+
+import hashlib
+import os
+import pickle
+import threading
+import zlib
+
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from . import manifest
+
+
+MAGIC = b"SCTXBIB2"
+
+# Fixed, rather than `pickle.HIGHEST_PROTOCOL`, so that the file stays
+# readable by every version of Python that Sublime Text might run us with.
+PROTOCOL = 3
+
+EXTENSION = ".bib-store"
+
+Bibliography = Dict[str, Any]
+
+# A bibliography of `None` stands for a failed parse.
+Entry = Tuple[manifest.Signature, Optional[Bibliography]]
+
+
+def entry_name(path: str) -> str:
+    return hashlib.sha1(path.encode("utf-8")).hexdigest() + EXTENSION
+
+
+def read(file_: str, path: str) -> Optional[Entry]:
+    """
+    Load the entry for `path` from `file_`. Anything we cannot read (a
+    missing file, a truncated one, one written by some other version, or
+    one for some other path) counts as missing.
+    """
+
+    try:
+        with open(file_, mode="rb") as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            return None
+        result = pickle.loads(zlib.decompress(data[len(MAGIC):]))
+    except (OSError, EOFError, ValueError, zlib.error, pickle.PickleError):
+        return None
+    if (
+        isinstance(result, tuple) and
+        len(result) == 3 and
+        result[0] == path and
+        isinstance(result[1], dict) and
+        isinstance(result[2], dict)
+    ):
+        return result[1], result[2]
+    return None
+
+
+def write(file_: str, path: str, entry: Entry) -> None:
+    temp = file_ + ".tmp"
+    data = zlib.compress(
+        pickle.dumps((path, entry[0], entry[1]), protocol=PROTOCOL)
+    )
+    with open(temp, mode="wb") as f:
+        f.write(MAGIC)
+        f.write(data)
+    os.replace(temp, file_)
+
+
+class BibStore:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # The entries we have looked at so far.
+        self.entries = {}  # type: Dict[str, Optional[Entry]]
+        self.lock = threading.Lock()
+
+    def file_for(self, path: str) -> str:
+        return os.path.join(self.path, entry_name(path))
+
+    def load(self, path: str) -> Optional[Entry]:
+        if path not in self.entries:
+            self.entries[path] = read(self.file_for(path), path)
+        return self.entries[path]
+
+    def get(
+        self, path: str, parse: Callable[[str], Optional[Bibliography]],
+    ) -> Optional[Bibliography]:
+        """
+        Return the bibliography in the file `path`, calling `parse` on it only
+        if we do not already have an up-to-date copy (or know that parsing
+        this version of it fails, when `parse` returns `None`).
+        """
+
+        path = os.path.abspath(path)
+        with self.lock:
+            old = self.load(path)
+            try:
+                sig = manifest.signature(
+                    path, old=old[0] if old else None,
+                )
+            except OSError:
+                return None
+            if old and old[0]["hash"] == sig["hash"]:
+                if old[0] != sig:
+                    self.entries[path] = (sig, old[1])
+                return old[1]
+
+        bib = parse(path)
+        with self.lock:
+            self.entries[path] = (sig, bib)
+            if bib is not None:
+                self.save(path)
+        return bib
+
+    def discard(self, path: str) -> None:
+        path = os.path.abspath(path)
+        with self.lock:
+            self.entries[path] = None
+            try:
+                os.remove(self.file_for(path))
+            except OSError:
+                pass
+
+    def save(self, path: str) -> None:
+        """
+        This is only a cache, so if we cannot write it out then we carry on
+        without it.
+        """
+
+        entry = self.entries.get(path)
+        if entry is None:
+            return
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            write(self.file_for(path), path, entry)
+        except OSError:
+            pass
@@ -0,0 +1,419 @@
+"""
+A BibTeX parser in pure Python, so that reading a `.bib` file does not have to
+go through a LuaTeX process. It accepts the same language as `parse_btx.lua`,
+and produces the same result: a dictionary mapping each tag to its entry,
+with the entry type under the key `category`, ready for `cite.normalize_dict`.
+
+In brief, outside of entries a line is ignored unless its first non-blank
+character is `@`, in which case it has to start an entry (or a `@string`,
+`@comment` or `@preamble`) that runs up to the end of some line. A field value
+is one or more parts joined by `#`, where a part is `{braced}` (with nested
+braces), `"quoted"`, a number, or the name of an `@string` abbreviation.
+
+Abbreviations are expanded as they are in BibTeX: names are not case
+sensitive, and the value of an abbreviation may refer to earlier ones (this
+is where we differ from `parse_btx.lua`, which drops such references).
+Anything we cannot make sense of raises a `BibtexError`, and then it is up to
+the caller to fall back on LuaTeX.
+
+A `Bibliography` remembers where in the text each of its items (entries,
+abbreviations and ignored blocks) lies, so that after an edit it only has to
+re-parse the items that the edit touched. Items start at the start of a line
+and run up to the end of one, which makes it easy to find a stretch of lines
+around the edit that we can parse on its own.
+"""
+
+
+import re
+
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import caching
+
+
+Entry = Dict[str, str]
+
+IDENTIFIER = re.compile(r"[A-Za-z0-9_:-]+")
+
+INTEGER = re.compile(r"[0-9]+")
+
+SPACES = re.compile(r"[ \t]*")
+
+ALL_SPACES = re.compile(r"\s*")
+
+QUOTED = re.compile(r'"([^"]*)"')
+
+LINE_END = re.compile(r"[\r\n\f\v]")
+
+# Matches the next brace of either kind.
+BRACE = re.compile(r"[{}]")
+
+IGNORED = {"comment", "preamble"}
+
+
+class BibtexError(ValueError):
+    pass
+
+
+class Part:
+    __slots__ = ("text", "abbreviation")
+
+    def __init__(self, text: str, abbreviation: bool = False) -> None:
+        self.text = text
+        self.abbreviation = abbreviation
+
+
+Fields = List[Tuple[str, List[Part]]]
+
+
+class Item:
+    """
+    One `@...` block, spanning `start` (the start of its first line) to `end`
+    (just past the end of its last line). The `kind` is one of `"entry"`,
+    `"string"` or `"ignored"`; for an entry there is also its `tag` and
+    `category`.
+    """
+
+    __slots__ = ("start", "end", "kind", "tag", "category", "fields")
+
+    def __init__(
+        self,
+        start: int,
+        end: int,
+        kind: str,
+        fields: Fields,
+        tag: Optional[str] = None,
+        category: Optional[str] = None,
+    ) -> None:
+        self.start = start
+        self.end = end
+        self.kind = kind
+        self.fields = fields
+        self.tag = tag
+        self.category = category
+
+    def abbreviations(self) -> Set[str]:
+        return {
+            part.text.lower()
+            for _, parts in self.fields
+            for part in parts
+            if part.abbreviation
+        }
+
+
+class Parser:
+    def __init__(self, text: str, pos: int = 0) -> None:
+        self.text = text
+        self.pos = pos
+
+    def error(self, message: str) -> BibtexError:
+        line = self.text.count("\n", 0, self.pos) + 1
+        return BibtexError("line {}: {}".format(line, message))
+
+    def skip(self, pattern=ALL_SPACES) -> None:
+        self.pos = pattern.match(self.text, self.pos).end()
+
+    def expect(self, char: str) -> None:
+        if not self.text.startswith(char, self.pos):
+            raise self.error("expected '{}'".format(char))
+        self.pos += 1
+
+    def identifier(self) -> str:
+        match = IDENTIFIER.match(self.text, self.pos)
+        if not match:
+            raise self.error("expected an identifier")
+        self.pos = match.end()
+        return match.group()
+
+    def braced(self) -> str:
+        """
+        Read a balanced `{...}` group starting at the current position, and
+        return its content without the outer braces.
+        """
+
+        start = self.pos
+        self.expect("{")
+        depth = 1
+        while depth:
+            match = BRACE.search(self.text, self.pos)
+            if not match:
+                raise self.error("unbalanced braces")
+            depth += 1 if match.group() == "{" else -1
+            self.pos = match.end()
+        return self.text[start + 1:self.pos - 1]
+
+    def part(self) -> Part:
+        char = self.text[self.pos:self.pos + 1]
+        if char == "{":
+            return Part(self.braced())
+        if char == '"':
+            match = QUOTED.match(self.text, self.pos)
+            if not match:
+                raise self.error("unterminated quote")
+            self.pos = match.end()
+            return Part(match.group(1))
+        match = INTEGER.match(self.text, self.pos)
+        if match and not IDENTIFIER.match(self.text, match.end()):
+            self.pos = match.end()
+            return Part(match.group())
+        return Part(self.identifier(), abbreviation=True)
+
+    def value(self) -> List[Part]:
+        parts = [self.part()]
+        while True:
+            save = self.pos
+            self.skip()
+            if not self.text.startswith("#", self.pos):
+                self.pos = save
+                return parts
+            self.pos += 1
+            self.skip()
+            parts.append(self.part())
+
+    def fields(self) -> Fields:
+        """Read `name = value` pairs, up to and including the `}`."""
+
+        result = []
+        self.skip()
+        while not self.text.startswith("}", self.pos):
+            name = self.identifier()
+            self.skip()
+            self.expect("=")
+            self.skip()
+            result.append((name, self.value()))
+            self.skip()
+            if self.text.startswith(",", self.pos):
+                self.pos += 1
+                self.skip()
+        self.pos += 1
+        return result
+
+    def item(self, start: int) -> Item:
+        self.expect("@")
+        category = self.identifier()
+        kind = category.lower()
+        self.skip()
+        if kind in IGNORED:
+            self.braced()
+            return Item(start, 0, "ignored", [])
+        self.expect("{")
+        self.skip()
+        if kind == "string":
+            return Item(start, 0, "string", self.fields())
+        tag = self.identifier()
+        self.skip()
+        self.expect(",")
+        return Item(
+            start, 0, "entry", self.fields(), tag=tag, category=category,
+        )
+
+    def items(self, stop: Optional[int] = None) -> List[Item]:
+        """
+        Read the items from the current position, which should be the start
+        of a line, up to the position `stop` (by default the end of the
+        text), which should also be the start of a line.
+        """
+
+        text = self.text
+        stop = len(text) if stop is None else stop
+        result = []
+        while self.pos < stop:
+            start = self.pos
+            self.skip(SPACES)
+            item = None
+            if text.startswith("@", self.pos):
+                item = self.item(start)
+                self.skip(SPACES)
+                if self.pos < len(text) and not LINE_END.match(text, self.pos):
+                    raise self.error("expected the end of the line")
+            match = LINE_END.search(text, self.pos)
+            self.pos = match.end() if match else len(text)
+            if item:
+                item.end = self.pos
+                result.append(item)
+        return result
+
+
+def expand(parts: List[Part], strings: Dict[str, str]) -> str:
+    return "".join(
+        strings.get(part.text.lower(), "") if part.abbreviation else part.text
+        for part in parts
+    )
+
+
+def expand_strings(items: List[Item]) -> Dict[str, str]:
+    """
+    Each abbreviation can refer to those that come before it. (On the other
+    hand, entries can refer to any abbreviation in the file, as in
+    `parse_btx.lua`.)
+    """
+
+    strings = {}  # type: Dict[str, str]
+    for item in items:
+        if item.kind == "string":
+            for name, parts in item.fields:
+                strings[name.lower()] = expand(parts, strings)
+    return strings
+
+
+def expand_entry(item: Item, strings: Dict[str, str]) -> Entry:
+    entry = {name: expand(parts, strings) for name, parts in item.fields}
+    entry["category"] = item.category
+    return entry
+
+
+def common_prefix(a: str, b: str, block: int = 4096) -> int:
+    """
+    The length of the longest common prefix of `a` and `b`. We compare a
+    block at a time, so that this is quick on long, mostly equal, texts.
+    """
+
+    n = min(len(a), len(b))
+    i = 0
+    while i + block <= n and a[i:i + block] == b[i:i + block]:
+        i += block
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def common_suffix(a: str, b: str, limit: int, block: int = 4096) -> int:
+    """
+    The length of the longest common suffix of `a` and `b`, but at most
+    `limit`.
+    """
+
+    n = min(len(a), len(b), limit)
+    i = 0
+    while (
+        i + block <= n and
+        a[len(a) - i - block:len(a) - i] == b[len(b) - i - block:len(b) - i]
+    ):
+        i += block
+    while i < n and a[len(a) - i - 1] == b[len(b) - i - 1]:
+        i += 1
+    return i
+
+
+def line_start(text: str, pos: int) -> int:
+    return max(text.rfind(char, 0, pos) for char in "\r\n\f\v") + 1
+
+
+def line_end(text: str, pos: int) -> int:
+    match = LINE_END.search(text, pos)
+    return match.end() if match else len(text)
+
+
+class Bibliography:
+    def __init__(self, text: str) -> None:
+        self.reparse(text)
+
+    def reparse(self, text: str) -> None:
+        items = Parser(text).items()
+        strings = expand_strings(items)
+        self.entries = {
+            item.tag: expand_entry(item, strings)
+            for item in items if item.kind == "entry"
+        }  # type: Dict[str, Entry]
+        self.text, self.items, self.strings = text, items, strings
+
+    def update(self, text: str) -> Tuple[int, int]:
+        """
+        Bring us up to date with the new `text`, re-parsing as little as we
+        can. Return the number of items re-parsed and the number of entries
+        re-expanded (for abbreviations that changed), which is mostly of
+        interest to the tests.
+
+        We find the stretch of lines that differ between the old and new
+        text, widened so that it does not cut through any old item, and
+        parse just that stretch of the new text. The items before it stay as
+        they are, and those after it only move.
+        """
+
+        old = self.text
+        prefix = common_prefix(old, text)
+        if prefix == len(old) == len(text):
+            return 0, 0
+        suffix = common_suffix(old, text, min(len(old), len(text)) - prefix)
+        delta = len(text) - len(old)
+
+        lo = line_start(old, prefix)
+        hi = line_end(old, len(old) - suffix)
+        first = 0
+        while first < len(self.items) and self.items[first].end <= lo:
+            first += 1
+        last = first
+        while last < len(self.items) and self.items[last].start < hi:
+            last += 1
+        if first < last:
+            lo = min(lo, self.items[first].start)
+            hi = max(hi, self.items[last - 1].end)
+
+        parser = Parser(text, lo)
+        middle = parser.items(hi + delta)
+        if parser.pos != hi + delta:
+            # The new text runs on past the stretch, for example because
+            # of an unbalanced brace, so it is not safe to splice.
+            self.reparse(text)
+            return len(self.items), len(self.entries)
+
+        removed = self.items[first:last]
+        for item in self.items[last:]:
+            item.start += delta
+            item.end += delta
+        self.items[first:last] = middle
+        self.text = text
+
+        strings = self.strings
+        if any(item.kind == "string" for item in removed + middle):
+            strings = expand_strings(self.items)
+        changed = {
+            name for name in set(strings) | set(self.strings)
+            if strings.get(name) != self.strings.get(name)
+        }
+        self.strings = strings
+
+        entries = [item for item in self.items if item.kind == "entry"]
+        tags = {item.tag for item in removed + middle if item.kind == "entry"}
+        if changed:
+            tags.update(
+                item.tag for item in entries
+                if not changed.isdisjoint(item.abbreviations())
+            )
+        # When a tag occurs more than once, the last one wins.
+        latest = {item.tag: item for item in entries if item.tag in tags}
+        for tag in tags:
+            self.entries.pop(tag, None)
+        for tag, item in latest.items():
+            self.entries[tag] = expand_entry(item, strings)
+        return len(middle), len(latest)
+
+
+# The bibliographies we have parsed lately, by path, so that when a file
+# changes we can update rather than start over.
+PARSED = caching.LRUCache(max_size=8)
+
+
+def parse(text: str) -> Dict[str, Entry]:
+    return Bibliography(text).entries
+
+
+def parse_file(path: str) -> Dict[str, Entry]:
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    bib = PARSED.get(path)
+    if bib is None:
+        bib = Bibliography(text)
+        PARSED[path] = bib
+    else:
+        # If this fails then `bib` is left as it was, so that next time we
+        # compare against the last text that we could parse.
+        bib.update(text)
+    return dict(bib.entries)
+
+
+def try_parse_file(path: str) -> Optional[Dict[str, Entry]]:
+    try:
+        return parse_file(path)
+    except (OSError, UnicodeDecodeError, BibtexError):
+        return None
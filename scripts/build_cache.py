@@ -0,0 +1,257 @@
+"""
+Remember the outcome of the last build of each file, so that saving a file
+whose build inputs have not changed need not run ConTeXt again.
+
+The inputs of a build are the main file, together with the files that it
+pulls in (by way of `\\input`, `\\component`, `\\environment`, `\\product`,
+`\\project` and `\\usemodule`), followed transitively, and the command that
+runs ConTeXt (which takes in the options). We boil them down to a single
+key. For the contents of each file we first normalize line endings and drop
+trailing whitespace, as TeX discards those anyway when it reads a line: so
+saving a file unchanged, or with only such changes, gives the same key.
+
+This is a best effort: we do not know about every way a document can read
+other files (for example images, or files that are only found by way of the
+TeX directory structure), and the only ones we follow are those that we can
+find next to the file that asks for them.
+"""
+
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import manifest
+
+
+COMMENT = re.compile(r"(?<!\\)%.*")
+
+INCLUDE = re.compile(
+    r"\\(?P<command>input|component|environment|product|project|usemodule)"
+    r"(?![A-Za-z@])\s*"
+    r"(?P<brackets>(?:\[[^\]]*\]\s*)*)"
+    r"(?:\{(?P<braces>[^{}]*)\}|(?P<bare>[^\s\[\]{}%\\]+))?"
+)
+
+BRACKETS = re.compile(r"\[([^\]]*)\]")
+
+EXTENSIONS = ["", ".tex", ".mkiv", ".mkvi", ".mkxl", ".mklx"]
+
+# Modules by the name `foo` live in files like `t-foo.mkiv`.
+MODULE_PREFIXES = ["", "t-", "m-", "p-", "x-", "s-"]
+
+# How many files we follow at most, as a safeguard.
+MAX_FILES = 500
+
+# How many files we keep the last build of.
+MAX_ENTRIES = 64
+
+
+def normalize(data: bytes) -> bytes:
+    lines = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n").split(b"\n")
+    return b"\n".join(line.rstrip(b" \t") for line in lines).rstrip(b"\n")
+
+
+def includes(text: str) -> List[Tuple[str, List[str]]]:
+    """
+    Return the files that `text` asks for, in order, as pairs of the command
+    and the names that it is given.
+    """
+
+    text = COMMENT.sub("", text)
+    result = []
+    for match in INCLUDE.finditer(text):
+        command = match.group("command")
+        name = match.group("braces") or match.group("bare")
+        if name is not None and command != "usemodule":
+            result.append((command, [name.strip()]))
+            continue
+        names = []
+        for group in BRACKETS.findall(match.group("brackets")):
+            # Groups like `[key=value]` hold options, not names.
+            if "=" not in group:
+                names += [n.strip() for n in group.split(",") if n.strip()]
+        if name is not None:
+            names.append(name.strip())
+        if names:
+            result.append((command, names))
+    return result
+
+
+def resolve(
+    command: str, name: str, dirs: List[str],
+) -> Optional[str]:
+    prefixes = MODULE_PREFIXES if command == "usemodule" else [""]
+    for dir_ in dirs:
+        for prefix in prefixes:
+            for ext in EXTENSIONS:
+                path = os.path.join(dir_, prefix + name + ext)
+                if os.path.isfile(path):
+                    return os.path.normpath(path)
+    return None
+
+
+def inputs(main: str) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Follow the files that `main` pulls in. Returns the (normalized) content
+    hash of each file that we found, by path, and the names that we could
+    not find, sorted. Those matter too: if one of them turns up later, then
+    the build might well turn out differently.
+    """
+
+    main = os.path.normpath(os.path.abspath(main))
+    base_dir = os.path.dirname(main)
+    hashes = {}  # type: Dict[str, str]
+    missing = set()
+    queue = [main]
+    while queue and len(hashes) < MAX_FILES:
+        path = queue.pop()
+        if path in hashes:
+            continue
+        try:
+            with open(path, mode="rb") as f:
+                data = normalize(f.read())
+        except OSError:
+            missing.add(path)
+            continue
+        hashes[path] = hashlib.sha1(data).hexdigest()
+        text = data.decode("utf-8", errors="replace")
+        dirs = [os.path.dirname(path), base_dir]
+        for command, names in includes(text):
+            for name in names:
+                found = resolve(command, name, dirs)
+                if found is None:
+                    missing.add("{}:{}".format(command, name))
+                elif found not in hashes:
+                    queue.append(found)
+    return hashes, sorted(missing)
+
+
+def key(main: str, command: Any) -> str:
+    """
+    The key for a build of `main` by way of `command` (any JSON-friendly
+    value, so it can hold the environment too).
+    """
+
+    hashes, missing = inputs(main)
+    data = json.dumps(
+        {"files": hashes, "missing": missing, "command": command},
+        sort_keys=True,
+    )
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def output_path(main: str, options: List[str]) -> str:
+    """The PDF that a build of `main` with `options` writes to."""
+
+    result = None
+    for opt in options:
+        if opt.startswith("--result="):
+            result = opt[len("--result="):]
+    dir_ = os.path.dirname(main)
+    if not result:
+        return os.path.splitext(main)[0] + ".pdf"
+    if not os.path.splitext(result)[1]:
+        result += ".pdf"
+    return os.path.join(dir_, result)
+
+
+def modification_time(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class BuildCache:
+    """
+    The last build of each file, by path, as a dict with the `key`, the
+    exit `code` of ConTeXt, the `errors` it ran into and the modification
+    time of the PDF it wrote. Saved as JSON at `path`.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries = None  # type: Optional[Dict[str, Dict[str, Any]]]
+        self.lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        if self.entries is None:
+            self.entries = manifest.load(self.path) or {}
+        return self.entries
+
+    def get(
+        self, main: str, key: str, output: str,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        The last build of `main`, if it was for the same `key` and its
+        `output` has not been touched since (say by a build with other
+        options, or by deleting it).
+        """
+
+        with self.lock:
+            entry = self.load().get(main)
+        if (
+            entry and
+            entry.get("key") == key and
+            entry.get("output_mtime") is not None and
+            entry.get("output_mtime") == modification_time(output)
+        ):
+            return entry
+        return None
+
+    def put(
+        self,
+        main: str,
+        key: str,
+        output: str,
+        code: int,
+        errors: List[List[str]],
+    ) -> None:
+        with self.lock:
+            entries = self.load()
+            entries[main] = {
+                "key": key,
+                "code": code,
+                "errors": errors,
+                "output_mtime": modification_time(output),
+                "time": time.time(),
+            }
+            if len(entries) > MAX_ENTRIES:
+                oldest = sorted(
+                    entries, key=lambda k: entries[k].get("time", 0),
+                )
+                for k in oldest[:len(entries) - MAX_ENTRIES]:
+                    del entries[k]
+            self.save()
+
+    def discard(self, main: str) -> None:
+        with self.lock:
+            if self.load().pop(main, None) is not None:
+                self.save()
+
+    def save(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            manifest.save(self.entries or {}, self.path)
+        except OSError:
+            pass
+
+
+CACHES = {}  # type: Dict[str, BuildCache]
+
+CACHES_LOCK = threading.Lock()
+
+
+def open_cache(path: str) -> BuildCache:
+    """The one `BuildCache` that is saved at `path`."""
+
+    with CACHES_LOCK:
+        if path not in CACHES:
+            CACHES[path] = BuildCache(path)
+        return CACHES[path]
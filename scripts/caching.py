@@ -0,0 +1,296 @@
+"""
+Bounded caches with a choice of eviction policy. All of them are hash-indexed,
+so that lookups, membership tests and insertions take constant time.
+
+- `LRUCache` evicts the least recently used entry.
+- `ARCCache` is the adaptive replacement cache of Megiddo and Modha. It keeps
+  apart the entries seen once from those seen more than once, and remembers
+  the keys it recently evicted from each group, so as to adapt how much room
+  it gives to each.
+- `TwoQueueCache` is the (full) 2Q cache of Johnson and Shasha. New entries
+  wait in a small FIFO queue, and only get promoted to the main LRU queue if
+  they are asked for again after they have been pushed out of it.
+
+Besides the usual mapping operations, each cache has a `prefetch` method for
+adding entries speculatively. These go in cold, that is where they are the
+next to be evicted unless somebody asks for them in the meantime, so that a
+burst of prefetching can not push out the entries that are actually in use.
+
+Checking membership with `in` does not count as a use of the entry.
+"""
+
+
+import collections
+
+from typing import Any, Dict, Hashable
+
+
+class Cache:
+    def __init__(self, max_size: int = 100) -> None:
+        if max_size < 1:
+            raise ValueError("cache size must be positive")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getitem__(self, key: Hashable) -> Any:
+        try:
+            value = self.lookup(key)
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self),
+        }
+
+    def lookup(self, key: Hashable) -> Any:
+        raise NotImplementedError
+
+    def prefetch(self, key: Hashable, value: Any) -> None:
+        raise NotImplementedError
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        raise NotImplementedError
+
+    def __contains__(self, key: Hashable) -> bool:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class LRUCache(Cache):
+    def __init__(self, max_size: int = 100) -> None:
+        super().__init__(max_size=max_size)
+        # Least recently used first.
+        self.cache = collections.OrderedDict()  # type: collections.OrderedDict
+
+    def lookup(self, key: Hashable) -> Any:
+        value = self.cache[key]
+        self.cache.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        self.shrink()
+
+    def prefetch(self, key: Hashable, value: Any) -> None:
+        if key in self.cache:
+            return
+        if len(self.cache) >= self.max_size:
+            self.cache.popitem(last=False)
+            self.evictions += 1
+        self.cache[key] = value
+        self.cache.move_to_end(key, last=False)
+
+    def shrink(self) -> None:
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.cache
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+
+class ARCCache(Cache):
+    def __init__(self, max_size: int = 100) -> None:
+        super().__init__(max_size=max_size)
+        self.clear()
+
+    def clear(self) -> None:
+        # The resident entries `t1` (seen once) and `t2` (seen more than
+        # once), and the ghosts `b1` and `b2` of the keys recently evicted
+        # from them. Each is in order of least recently used first.
+        self.t1 = collections.OrderedDict()  # type: collections.OrderedDict
+        self.t2 = collections.OrderedDict()  # type: collections.OrderedDict
+        self.b1 = collections.OrderedDict()  # type: collections.OrderedDict
+        self.b2 = collections.OrderedDict()  # type: collections.OrderedDict
+        # The target size of `t1`.
+        self.p = 0.0
+
+    def lookup(self, key: Hashable) -> Any:
+        if key in self.t1:
+            value = self.t1.pop(key)
+            self.t2[key] = value
+            return value
+        value = self.t2[key]
+        self.t2.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        if key in self.t1:
+            del self.t1[key]
+            self.t2[key] = value
+        elif key in self.t2:
+            self.t2[key] = value
+            self.t2.move_to_end(key)
+        elif key in self.b1:
+            self.p = min(
+                self.max_size,
+                self.p + max(len(self.b2) / len(self.b1), 1),
+            )
+            self.replace(key)
+            del self.b1[key]
+            self.t2[key] = value
+        elif key in self.b2:
+            self.p = max(0, self.p - max(len(self.b1) / len(self.b2), 1))
+            self.replace(key)
+            del self.b2[key]
+            self.t2[key] = value
+        else:
+            self.make_room(key)
+            self.t1[key] = value
+
+    def prefetch(self, key: Hashable, value: Any) -> None:
+        if key in self:
+            return
+        # A prefetched key is not a real request, so it does not get to move
+        # the target `p` even when it is a ghost.
+        self.b1.pop(key, None)
+        self.b2.pop(key, None)
+        self.make_room(key)
+        self.t1[key] = value
+        self.t1.move_to_end(key, last=False)
+
+    def make_room(self, key: Hashable) -> None:
+        size = self.max_size
+        l1 = len(self.t1) + len(self.b1)
+        l2 = len(self.t2) + len(self.b2)
+        if l1 >= size:
+            if len(self.t1) < size:
+                self.b1.popitem(last=False)
+                self.replace(key)
+            else:
+                self.t1.popitem(last=False)
+                self.evictions += 1
+        elif l1 + l2 >= size:
+            if l1 + l2 >= 2 * size:
+                self.b2.popitem(last=False)
+            self.replace(key)
+
+    def replace(self, key: Hashable) -> None:
+        if len(self.t1) + len(self.t2) < self.max_size:
+            return
+        if self.t1 and (
+            len(self.t1) > self.p or
+            (key in self.b2 and len(self.t1) == self.p)
+        ):
+            old, _ = self.t1.popitem(last=False)
+            self.b1[old] = None
+        else:
+            old, _ = self.t2.popitem(last=False)
+            self.b2[old] = None
+        self.evictions += 1
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.t1 or key in self.t2
+
+    def __len__(self) -> int:
+        return len(self.t1) + len(self.t2)
+
+
+class TwoQueueCache(Cache):
+    def __init__(
+        self,
+        max_size: int = 100,
+        in_ratio: float = 0.25,
+        out_ratio: float = 0.5,
+    ) -> None:
+        super().__init__(max_size=max_size)
+        self.in_size = max(1, int(max_size * in_ratio))
+        self.out_size = max(1, int(max_size * out_ratio))
+        self.clear()
+
+    def clear(self) -> None:
+        # The FIFO queue `a1_in` of new entries, the ghosts `a1_out` of the
+        # keys pushed out of it, and the main LRU queue `am`. Each is in
+        # order of oldest first.
+        self.a1_in = collections.OrderedDict()  # type: collections.OrderedDict
+        self.a1_out = \
+            collections.OrderedDict()  # type: collections.OrderedDict
+        self.am = collections.OrderedDict()  # type: collections.OrderedDict
+
+    def lookup(self, key: Hashable) -> Any:
+        if key in self.am:
+            self.am.move_to_end(key)
+            return self.am[key]
+        return self.a1_in[key]
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        if key in self.am:
+            self.am[key] = value
+            self.am.move_to_end(key)
+        elif key in self.a1_in:
+            self.a1_in[key] = value
+        elif key in self.a1_out:
+            del self.a1_out[key]
+            self.make_room()
+            self.am[key] = value
+        else:
+            self.make_room()
+            self.a1_in[key] = value
+
+    def prefetch(self, key: Hashable, value: Any) -> None:
+        if key in self:
+            return
+        self.a1_out.pop(key, None)
+        self.make_room()
+        self.a1_in[key] = value
+        self.a1_in.move_to_end(key, last=False)
+
+    def make_room(self) -> None:
+        if len(self.a1_in) + len(self.am) < self.max_size:
+            return
+        if len(self.a1_in) > self.in_size or not self.am:
+            old, _ = self.a1_in.popitem(last=False)
+            self.a1_out[old] = None
+            if len(self.a1_out) > self.out_size:
+                self.a1_out.popitem(last=False)
+        else:
+            self.am.popitem(last=False)
+        self.evictions += 1
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.am or key in self.a1_in
+
+    def __len__(self) -> int:
+        return len(self.a1_in) + len(self.am)
+
+
+POLICIES = {
+    "lru": LRUCache,
+    "arc": ARCCache,
+    "2q": TwoQueueCache,
+}
+
+
+def new_cache(policy: str = "lru", max_size: int = 100) -> Cache:
+    try:
+        class_ = POLICIES[policy.lower()]
+    except KeyError:
+        raise ValueError('unknown cache policy "{}"'.format(policy))
+    return class_(max_size=max_size)
@@ -0,0 +1,58 @@
+"""
+The index of the generated interface files. The commands are split over many
+chunk files, each one named after the last command it holds and holding every
+command after the previous chunk's last one. The index (in `_commands.json`)
+records the list of commands, together with the chunk boundaries as a sorted
+list of `[last command, file name]` pairs, so that we can find the chunk for
+a command by bisecting on the boundaries.
+
+Older interface files have a plain list of commands in `_commands.json`, and
+no boundaries. In that case we recover them from the chunk file names.
+"""
+
+
+import bisect
+import json
+import os
+
+from typing import Any, Dict, List, Optional, Tuple
+
+
+Chunks = List[List[str]]
+
+
+def chunk_file(last: str) -> str:
+    return "{}.json".format(last)
+
+
+def is_chunk_file(file_: str) -> bool:
+    return file_.endswith(".json") and not file_.startswith("_")
+
+
+def chunks_from_files(dir_: str) -> Chunks:
+    return sorted(
+        [f[:-len(".json")], f] for f in os.listdir(dir_) if is_chunk_file(f)
+    )
+
+
+def encode_index(commands: List[str], chunks: Chunks) -> Dict[str, Any]:
+    return {"commands": commands, "chunks": chunks}
+
+
+def load_index(dir_: str, name: str) -> Tuple[List[str], Chunks]:
+    with open(os.path.join(dir_, name), encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return data, chunks_from_files(dir_)
+    return data["commands"], data["chunks"]
+
+
+def locate(lasts: List[str], name: str) -> Optional[int]:
+    """
+    Given the sorted list `lasts` of the last command in each chunk, return
+    the position of the chunk that `name` belongs in, or `None` if `name`
+    sorts after the last chunk.
+    """
+
+    i = bisect.bisect_left(lasts, name)
+    return i if i < len(lasts) else None
@@ -1,15 +1,30 @@
 import ast
 import errno
+import json
 import os
 import re
 import string
 import subprocess
 import xml.etree.ElementTree as ET
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, List, Optional, Union
 
+from . import bibtex
 from . import deep_dict
 from . import files
+from . import lua_worker
+
+
+# The output format that we ask of the Lua scripts.
+JSON_LINES = "json-lines"
+
+# The scripts that the worker (see `lua_worker`) can run for us, with the
+# command for each.
+WORKER_COMMANDS = {
+    "parse_btx.lua": "btx",
+    "parse_log.lua": "log",
+    "parse_lua.lua": "lua",
+}
 
 
 class DefaultFormatter(string.Formatter):
@@ -43,19 +58,54 @@ def parse_lua(
 def parse_btx(
     file_name: str, script: str, opts: Dict[str, Any],
 ) -> Optional[dict]:
-    result = parse_common_luatex(file_name, script, opts)
+    """
+    Try the parser in `bibtex` first, and only if that fails run `script`
+    through LuaTeX.
+    """
+
+    result = bibtex.try_parse_file(file_name)
+    if result is None:
+        result = parse_common_luatex(file_name, script, opts)
     if result is None:
         return None
     return normalize_dict(result)
 
 
 def parse_common_luatex(
-    input_: str,
+    input_: Union[str, bytes],
     script: str,
     opts: Dict[str, Any],
     input_as_stdin: bool = False,
     timeout: float = 5,
-) -> Optional[dict]:
+) -> Optional[Any]:
+    """
+    Run one of our Lua scripts on `input_` (a file name, or if
+    `input_as_stdin` then the text itself). We hand the job to the worker
+    process if we can, and otherwise (or if the worker fails us) start a
+    LuaTeX of its own for it.
+    """
+
+    command = WORKER_COMMANDS.get(os.path.basename(script))
+    if command:
+        try:
+            worker = lua_worker.get(os.path.dirname(script), opts)
+            return decode_output(
+                worker.request(command, input_, timeout=timeout)
+            )
+        except lua_worker.WorkerError:
+            pass
+    return parse_common_luatex_once(
+        input_, script, opts, input_as_stdin=input_as_stdin, timeout=timeout,
+    )
+
+
+def parse_common_luatex_once(
+    input_: Union[str, bytes],
+    script: str,
+    opts: Dict[str, Any],
+    input_as_stdin: bool = False,
+    timeout: float = 5,
+) -> Optional[Any]:
     kwargs = {
         "stdin": subprocess.PIPE,
         "stdout": subprocess.PIPE,
@@ -63,16 +113,21 @@ def parse_common_luatex(
         "env": {"LUA_PATH": os.path.join(os.path.dirname(script), "?.lua")},
     }
     deep_dict.update(kwargs, opts)
+    flag = "--format={}".format(JSON_LINES)
     if input_as_stdin:
-        call = ["luatex", "--luaonly", script]
+        call = ["luatex", "--luaonly", script, flag]
+        if isinstance(input_, str):
+            input_ = input_.encode("utf-8")
         comm = {"timeout": timeout, "input": input_}
     else:
-        call = ["luatex", "--luaonly", script, input_]
+        call = ["luatex", "--luaonly", script, input_, flag]
         comm = {"timeout": timeout}
     proc = subprocess.Popen(call, **kwargs)
     try:
         out, _ = proc.communicate(**comm)
     except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
         out = None
     except IOError as e:
         if e.errno == errno.EPIPE:
@@ -81,14 +136,49 @@ def parse_common_luatex(
             raise e
     code = proc.returncode
     if not code and out:
-        text = files.decode_bytes(out).strip()
-        if text == "nil":
-            return None
+        return decode_output(files.decode_bytes(out))
+    return None
+
+
+def decode_output(text: str) -> Optional[Any]:
+    """
+    Decode the output of one of our Lua scripts. We ask for JSON lines (see
+    `table_to_dict.lua` for the format), but also accept the older Python
+    literal format, in case the scripts that are unpacked on disk predate
+    the JSON lines output.
+    """
+
+    lines = text.split("\n")
+    try:
+        header = json.loads(lines[0])
+    except ValueError:
+        header = None
+    if isinstance(header, dict) and "type" in header:
         try:
-            return ast.literal_eval(text)
-        except ValueError:
+            return decode_json_lines(header, lines[1:])
+        except (ValueError, TypeError):
             return None
-    return None
+    if text == "nil":
+        return None
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return None
+
+
+def decode_json_lines(
+    header: Dict[str, Any], lines: Iterable[str],
+) -> Union[Dict[str, Any], List[Any]]:
+    if header["type"] == "dict":
+        result = {}  # type: Dict[str, Any]
+        for line in lines:
+            if line:
+                key, value = json.loads(line)
+                result[key] = value
+        return result
+    elif header["type"] == "list":
+        return [json.loads(line) for line in lines if line]
+    raise ValueError("unknown type: {}".format(header["type"]))
 
 
 def parse_xml(file_name: str) -> Optional[dict]:
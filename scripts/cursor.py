@@ -0,0 +1,145 @@
+"""
+What the handlers of modifications want to know about the text around the
+cursor. Several listeners react to every modification, and they mostly ask
+the same questions. So rather than each one listening for modifications
+itself, they register here, and on each modification `dispatch` works out a
+single `CursorContext` (which answers each question at most once) and hands
+it to all of them in turn. Likewise it reloads their settings together, at
+most once every `SETTINGS_INTERVAL` seconds.
+"""
+
+
+import threading
+import time
+import weakref
+
+from typing import Any, Dict, Optional, Tuple
+
+import sublime
+
+from . import caching
+from . import scopes
+
+
+class CursorContext:
+    def __init__(self, view: sublime.View) -> None:
+        self.view = view
+        self.size = view.size()
+        sel = view.sel()
+        self.region = sel[0] if sel else None  # type: Optional[sublime.Region]
+        self.memo = {}  # type: Dict[Tuple[Any, ...], Any]
+        # The point that the pop-ups look back from: the last character
+        # before the cursor, unless the cursor is at the very end. (The
+        # citations and references look back from the start of the selection
+        # instead.)
+        self.point = None  # type: Optional[int]
+        if self.region is not None:
+            end = self.region.end()
+            self.point = end - 1 if end < self.size else end
+
+    def remember(self, key: Tuple[Any, ...], compute) -> Any:
+        if key not in self.memo:
+            self.memo[key] = compute()
+        return self.memo[key]
+
+    def last_char(self) -> str:
+        """The character just before the end of the selection."""
+
+        return self.remember(
+            ("last_char",),
+            lambda: self.view.substr(max(0, self.region.end() - 1)),
+        )
+
+    def last_command(self) -> list:
+        return self.remember(
+            ("last_command",),
+            lambda: self.view.command_history(0, modifying_only=True),
+        )
+
+    def last_control(self, end: int) -> Optional[Tuple[int, int]]:
+        """
+        The control sequence that the arguments (if any) up to `end` belong
+        to.
+        """
+
+        # This is the expensive one, so we share it between all contexts of
+        # the view with the same text, whatever the selection.
+        key = (self.view.id(), self.view.change_count(), end)
+        try:
+            return CONTROLS[key]
+        except KeyError:
+            result = CONTROLS[key] = scopes.last_block_in_region(
+                self.view,
+                0,
+                scopes.CONTROL_SEQ,
+                end=end,
+                skip=scopes.SKIP_ARGS_AND_SPACES,
+            )
+            return result
+
+    def left_control(self, point: int) -> Optional[Tuple[int, int]]:
+        """The control sequence that ends at `point`."""
+
+        return self.remember(
+            ("left_control", point),
+            lambda: scopes.left_enclosing_block(
+                self.view, point, scopes.CONTROL_SEQ, end=self.size,
+            ),
+        )
+
+    def matches(self, point: int, selector: str) -> bool:
+        return self.remember(
+            ("matches", point, selector),
+            lambda: self.view.match_selector(point, selector),
+        )
+
+
+# Keyed on (view ID, change count, point).
+CONTROLS = caching.LRUCache(max_size=64)
+
+# Minimum number of seconds between two reloads of the settings of the
+# handlers of a view.
+SETTINGS_INTERVAL = 1.0
+
+# The handlers of each view, by view ID. A handler is anything with the
+# methods `reload_settings` and `on_cursor_modified` (which takes the
+# `CursorContext`). We do not keep them alive: that is up to Sublime Text.
+HANDLERS = {}  # type: Dict[int, weakref.WeakSet]
+
+# When we last reloaded the settings of the handlers of each view, by view ID.
+SETTINGS_TIMES = {}  # type: Dict[int, float]
+
+LOCK = threading.Lock()
+
+
+def register(view: sublime.View, handler: Any) -> None:
+    with LOCK:
+        HANDLERS.setdefault(view.id(), weakref.WeakSet()).add(handler)
+        # So that the new handler gets its settings on the next modification.
+        SETTINGS_TIMES.pop(view.id(), None)
+
+
+def forget(view: sublime.View) -> None:
+    with LOCK:
+        HANDLERS.pop(view.id(), None)
+        SETTINGS_TIMES.pop(view.id(), None)
+
+
+def dispatch(view: sublime.View) -> None:
+    """Tell the handlers of `view` about a modification."""
+
+    now = time.monotonic()
+    with LOCK:
+        handlers = list(HANDLERS.get(view.id(), ()))
+        last = SETTINGS_TIMES.get(view.id())
+        reload = last is None or now - last >= SETTINGS_INTERVAL
+        if reload:
+            SETTINGS_TIMES[view.id()] = now
+    if not handlers:
+        return
+
+    context = CursorContext(view)
+    for handler in handlers:
+        if reload:
+            handler.reload_settings()
+        handler.on_cursor_modified(context)
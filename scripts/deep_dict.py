@@ -8,9 +8,12 @@
 """
 
 
-from typing import Any, Dict, Iterable, List, Tuple, TypeVar
+from typing import (  # noqa
+    Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, TypeVar
+)
 
 
+T = TypeVar("T")
 K = TypeVar("K")
 V = TypeVar("V")
 
@@ -94,3 +97,72 @@ def del_safe(dict_: Dict[K, Any], keys: List[K]) -> None:
     else:
         dict_.setdefault(keys[0], {})
         del_safe(dict_[keys[0]], keys[1:])
+
+
+class HashableDict(dict):
+    """
+    The hash is computed once, on first use: we only build these through
+    `make_hashable`, and never change them afterwards.
+    """
+
+    def __hash__(self) -> int:
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash(frozenset(self.items()))
+            return self._hash
+
+
+def make_hashable(obj):
+    if isinstance(obj, dict):
+        result = HashableDict()
+        for k, v in obj.items():
+            result[k] = make_hashable(v)
+        return result
+    elif isinstance(obj, list):
+        return tuple(make_hashable(x) for x in obj)
+    return obj
+
+
+def fingerprint(obj) -> Optional[Any]:
+    """
+    A hashable stand-in for `obj`, such that two objects have equal
+    fingerprints exactly when they compare equal (except that a list and a
+    tuple with the same items are treated alike). This is meant for the
+    nested dictionaries and lists that describe commands (the `con`, `inh`,
+    `opt`, `ren` structures) and errors. Returns `None` if `obj` contains
+    something we cannot hash.
+    """
+
+    result = make_hashable(obj)
+    try:
+        hash(result)
+    except TypeError:
+        return None
+    return result
+
+
+def hash_first_arg(func: Callable) -> Callable:
+    return lambda x, *args, **kwargs: func(make_hashable(x), *args, **kwargs)
+
+
+def deduplicate_list(list_: List[T]) -> List[T]:
+    """
+    Remove duplicates from `list_`, keeping the first occurrence of each. We
+    look up fingerprints in a set, so this is linear time; any object we
+    cannot fingerprint is compared one by one, as before.
+    """
+
+    accum = []  # type: List[T]
+    seen = set()  # type: Set[Any]
+    unhashable = []  # type: List[T]
+    for obj in list_:
+        key = fingerprint(obj)
+        if key is None:
+            if obj not in unhashable:
+                unhashable.append(obj)
+                accum.append(obj)
+        elif key not in seen:
+            seen.add(key)
+            accum.append(obj)
+    return accum
@@ -83,7 +83,16 @@ def locate(
 
 
 def decode_bytes(by: bytes) -> str:
-    text = by.decode(encoding="utf-8", errors="replace")
+    """
+    Decode the output of TeX and friends. That is UTF-8 as a rule, but a log
+    can well be in Latin-1 (say if the document is), so we fall back to that
+    rather than lose characters.
+    """
+
+    try:
+        text = by.decode(encoding="utf-8")
+    except UnicodeDecodeError:
+        text = by.decode(encoding="latin-1")
     return text.replace("\r\n", "\n").replace("\r", "\n").strip()
 
 
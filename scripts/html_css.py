@@ -1,6 +1,7 @@
+import functools
 import re
 
-from typing import TypeVar
+from typing import List, TypeVar
 
 
 T = TypeVar("T")
@@ -12,13 +13,22 @@
 
 CONTROL_MODULE = r"use(?:lua|tex)?module"
 
+TAG = re.compile(r"<[^<]+>")
+
+CSS_COMMENT = re.compile(r"/\*.*?\*/", flags=re.DOTALL)
+
+
+@functools.lru_cache(maxsize=None)
+def exact_pattern(regex: str):
+    return re.compile(r"(?:{})\Z".format(regex))
+
 
 def match_exact(regex: str, text: str) -> bool:
-    return bool(re.match(r"(?:{})\Z".format(regex), text))
+    return bool(exact_pattern(regex).match(text))
 
 
 # This approach is a bit odd, works reasonably well though.
-CASES = {
+CASES = [
     (
         # `keyword.control`
         ("flo", "sfl"),
@@ -50,7 +60,7 @@ def match_exact(regex: str, text: str) -> bool:
         ("con", "sco"),
         lambda _: True,
     ),
-}
+]
 
 
 def control_sequence(text: str) -> str:
@@ -73,7 +83,7 @@ def unescape(text: str) -> str:
 
 def strip_tags(data: T) -> T:
     if isinstance(data, str):
-        return re.sub("<[^<]+>", "", data)
+        return TAG.sub("", data)
     elif isinstance(data, list):
         return [strip_tags(x) for x in data]
     elif isinstance(data, tuple):
@@ -83,21 +93,37 @@ def strip_tags(data: T) -> T:
     return data
 
 
+def visible_length(text: str, entities: bool = False) -> int:
+    """
+    Return `len(strip_tags(text))`, or `len(unescape(strip_tags(text)))` if
+    `entities` is set.
+    """
+
+    text = TAG.sub("", text)
+    return len(unescape(text) if entities else text)
+
+
 def protect_space(text: str) -> str:
-    result = ""
-    in_tag = False
-    for c in text:
-        if c == "<":
-            result += c
-            in_tag = True
-        elif c == ">":
-            result += c
-            in_tag = False
-        elif in_tag:
-            result += c
-        else:
-            result += c.replace(" ", "&nbsp;")
-    return result.replace("\n", "<br>")
+    """
+    Replace the spaces outside of tags by `&nbsp;`, and newlines by `<br>`.
+    A tag runs from a `<` to the first `>` after it.
+    """
+
+    parts = []  # type: List[str]
+    i = 0
+    while True:
+        start = text.find("<", i)
+        if start < 0:
+            parts.append(text[i:].replace(" ", "&nbsp;"))
+            break
+        parts.append(text[i:start].replace(" ", "&nbsp;"))
+        end = text.find(">", start + 1)
+        if end < 0:
+            parts.append(text[start:])
+            break
+        parts.append(text[start:end + 1])
+        i = end + 1
+    return "".join(parts).replace("\n", "<br>")
 
 
 def pretty_print(text: str) -> str:
@@ -105,9 +131,8 @@ def pretty_print(text: str) -> str:
 
 
 def raw_print(text: str) -> str:
-    text = strip_tags(text.replace("<br>", "\n")).replace("&nbsp;", " ")
-    return unescape(text)
+    return unescape(TAG.sub("", text.replace("<br>", "\n")))
 
 
 def strip_css_comments(text: str) -> str:
-    return re.sub(r"/\*.*?\*/", "", text, flags=re.DOTALL)
+    return CSS_COMMENT.sub("", text)
@@ -7,6 +7,40 @@
 
 BLANK_FILE_FORMAT = "<file><a>TeX primitive</a></file>"
 
+# The settings (under `pop_ups/`) that go into rendering a pop-up, with their
+# default values. They are passed on to `InterfaceLoader.load` keyed on the
+# last part of the setting name.
+POP_UP_OPTIONS = {
+    "line_break": 65,
+    "match_indentation": True,
+    "hang_indentation": True,
+    "methods/on_hover": True,
+    "methods/on_modified": True,
+    "show_copy_pop_up": False,
+    "show_source_files": True,
+}
+
+# Those of the options above that change the markup of a pop-up. The others
+# (like when to show pop-ups) play no part in how it is rendered.
+RENDER_OPTIONS = {
+    "line_break",
+    "match_indentation",
+    "hang_indentation",
+    "show_copy_pop_up",
+    "show_source_files",
+}
+
+
+def options_key(options: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    """
+    A key for the rendering `options`: two sets of options with the same key
+    render every pop-up the same.
+    """
+
+    return tuple(sorted(
+        (k, v) for k, v in options.items() if k in RENDER_OPTIONS
+    ))
+
 
 def format_template(
     n: int,
@@ -52,6 +86,40 @@ def tagged_format(
     return template.format(tag=tag)
 
 
+class Measured:
+    """
+    A piece of markup along with its visible length, i.e. its length after
+    `html_css.strip_tags`. This lets us measure a line as we build it up,
+    rather than measure all of it again for every word we add to it.
+    """
+
+    def __init__(self, text: str = "") -> None:
+        self.text = text
+        self.length = html_css.visible_length(text)
+        self.has_tag = "<" in text
+        lt, gt = text.find("<"), text.find(">")
+        self.leading_gt = gt >= 0 and (lt < 0 or gt < lt)
+
+    def length_with(self, other: "Measured") -> int:
+        """Return the visible length of `self.text + other.text`."""
+
+        # The lengths just add up, unless a tag opened here could now find
+        # its closing `>` there.
+        if self.has_tag and other.leading_gt:
+            return html_css.visible_length(self.text + other.text)
+        return self.length + other.length
+
+    def add(self, other: "Measured") -> None:
+        self.length = self.length_with(other)
+        self.text += other.text
+        if not self.has_tag:
+            self.leading_gt = self.leading_gt or other.leading_gt
+        self.has_tag = self.has_tag or other.has_tag
+
+
+SPACE = Measured(" ")
+
+
 def nice_sorted(list_: List[T], reverse: bool = False) -> List[T]:
     main = []  # type: List[str]
     others = []  # type: List[T]
@@ -62,10 +130,10 @@ def nice_sorted(list_: List[T], reverse: bool = False) -> List[T]:
             main.append(x)
         else:
             others.append(x)
-    main = sorted(main, key=html_css.strip_tags)
     inherits, upper, mixed, lower = [], [], [], []
-    for x in main:
-        raw = html_css.strip_tags(x)
+    for raw, x in sorted(
+        ((html_css.strip_tags(x), x) for x in main), key=lambda p: p[0],
+    ):
         if raw.startswith("inherits"):
             inherits.append(x)
         elif raw.isupper():
@@ -168,9 +236,9 @@ def render_aux(self, list_: list) -> Tuple[str, str]:
                 self._inherits = arg.get("inh")
                 self._optional = arg.get("opt")
                 self._rendering = arg.get("ren")
-                self._len = len(html_css.unescape(
-                    html_css.strip_tags(self._rendering)
-                ))
+                self._len = html_css.visible_length(
+                    self._rendering, entities=True,
+                )
 
                 if self._content is None and self._inherits is None:
                     self.blank()
@@ -242,35 +310,39 @@ def docstring_list(self) -> str:
         return self.docstring_list_nobreak()
 
     def docstring_list_break(self, line_break: int) -> str:
-        content = nice_sorted(self._content.copy(), reverse=True)
-        lines = []
+        content = [
+            Measured(s)
+            for s in nice_sorted(self._content.copy(), reverse=True)
+        ]
+        lines = []  # type: List[Measured]
         init = True
 
         while content:
-            lines.append(self.guide(num=init))
+            lines.append(Measured(self.guide(num=init)))
             init, begin, space = False, True, True
 
             while content and space:
                 s = content.pop()
                 if begin:
-                    lines[-1] += s
+                    lines[-1].add(s)
                     begin = False
                 else:
-                    len_ = len(html_css.strip_tags(lines[-1] + s)) + 1
+                    len_ = lines[-1].length_with(s) + 1
                     if len_ > line_break:
                         space = False
                         content.append(s)
                     else:
-                        lines[-1] += " " + s
+                        lines[-1].add(SPACE)
+                        lines[-1].add(s)
 
-        return "\n".join(lines)
+        return "\n".join(line.text for line in lines)
 
     def docstring_list_nobreak(self) -> str:
         return self.guide() + " ".join(self._content)
 
     def docstring_dict(self) -> str:
         line_break = self.kwargs.get("line_break", 65)
-        len_ = max(len(html_css.strip_tags(k)) for k in self._content)
+        len_ = max(html_css.visible_length(k) for k in self._content)
 
         if isinstance(line_break, int) and not isinstance(line_break, bool):
             return self.docstring_dict_break(len_, line_break)
@@ -278,7 +350,7 @@ def docstring_dict(self) -> str:
 
     def docstring_dict_break(self, len_: int, line_break: int) -> str:
         keys = nice_sorted(self._content, reverse=True)
-        lines = []
+        lines = []  # type: List[Measured]
         init = True
 
         while keys:
@@ -286,33 +358,44 @@ def docstring_dict_break(self, len_: int, line_break: int) -> str:
             k_len = len(k)
             v = self._content[k]
             lines.append(
-                self.assignments_guide(
-                    len_ if self.match_indentation else k_len, key=k, num=init,
+                Measured(
+                    self.assignments_guide(
+                        len_ if self.match_indentation else k_len,
+                        key=k,
+                        num=init,
+                    )
                 )
             )
             init = False
 
             if isinstance(v, str):
-                lines[-1] += " " + v
+                lines[-1].add(Measured(" " + v))
             elif isinstance(v, list):
-                for s in nice_sorted(v):
-                    next_len = len(html_css.strip_tags(lines[-1] + s)) + 1
+                for s in map(Measured, nice_sorted(v)):
+                    next_len = lines[-1].length_with(s) + 1
                     if next_len > line_break:
                         if self.hang_indentation:
                             lines.append(
-                                self.assignments_guide(
-                                    len_ if self.match_indentation else k_len,
-                                    num=init,
+                                Measured(
+                                    self.assignments_guide(
+                                        len_ if self.match_indentation
+                                        else k_len,
+                                        num=init,
+                                    )
                                 )
                             )
-                            lines[-1] += " " + s
+                            lines[-1].add(SPACE)
+                            lines[-1].add(s)
                         else:
-                            lines.append(self.assignments_guide(0, num=init))
-                            lines[-1] += s
+                            lines.append(
+                                Measured(self.assignments_guide(0, num=init))
+                            )
+                            lines[-1].add(s)
                     else:
-                        lines[-1] += " " + s
+                        lines[-1].add(SPACE)
+                        lines[-1].add(s)
 
-        return "\n".join(lines)
+        return "\n".join(line.text for line in lines)
 
     def docstring_dict_nobreak(self, len_: int) -> str:
         lines = []
@@ -335,7 +418,7 @@ def assignments_guide(
     ) -> str:
         start = self.guide(num=num)
         if key:
-            len_ += len(key) - len(html_css.strip_tags(key))
+            len_ += len(key) - html_css.visible_length(key)
             text = \
                 tagged_format(key, "key", len_, line_up=self.match_indentation)
             return start + text + " <equ>=</equ>"
@@ -1,7 +1,7 @@
 from typing import Any, Dict, List, Optional
 
 from . import cite
-from . import utilities
+from . import deep_dict
 
 
 def parse(
@@ -26,7 +26,7 @@ def do_format(data: Optional[dict]) -> Dict[str, List[str]]:
             errors.append(entry)
         else:
             result["main"].append(entry)
-    result["errors"] = utilities.deduplicate_list(errors)
+    result["errors"] = deep_dict.deduplicate_list(errors)
     return result
 
 
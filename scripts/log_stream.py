@@ -0,0 +1,155 @@
+"""
+Spot errors in a ConTeXt log while it is still being written, one line at a
+time, so that we can report them before the run is over. This is a rough
+line-based version of the grammar in `parse_log.lua`: it finds the same TeX,
+Lua and MetaPost errors, in the same `[line, class, message]` form, but it
+is only meant for early feedback. Once the run is over the full log still
+goes through `log.parse`, which has the final say.
+
+We also pick out the lines that say that a new pass has begun, to show
+progress.
+"""
+
+
+import re
+
+from typing import Any, List, Optional, Tuple
+
+
+ERROR_START = re.compile(
+    r"^\s*(?:tex error\s*>\s*(?P<tex>tex error)|"
+    r"lua error\s*>\s*(?P<lua>lua error)|"
+    r"\S+ error\s*>\s*(?P<mp>mp error))"
+    r"\s+on\s+line\s+(?P<line>\d+)\s+in\s+file\s.*?:"
+    r"(?:\s*!\s*(?P<message>.*?)\s*|.*)$"
+)
+
+UNDEFINED_CS = "Undefined control sequence"
+
+LINE_CONTEXT = re.compile(r"^\s*l\.\s*\d+\s")
+
+CONTROL_SEQUENCE = re.compile(r"\\[A-Za-z_@!?]+")
+
+LUA_MESSAGE = re.compile(r"^\s*\[ctxlua\]\s*:\s*\d+\s*:\s*(.+?)\s*$")
+
+MP_MESSAGE = re.compile(r"^\s*!\s*(.+?)\s*$")
+
+PASS = re.compile(r"^\s*mtx-context\s*\|\s*run\s+(\d+)\s*:")
+
+# How many lines we wait for the rest of an error before we give up on it.
+PATIENCE = 20
+
+
+def lower_first_char(text: str) -> str:
+    return text[:1].lower() + text[1:]
+
+
+def error_key(error: List[Any]) -> Tuple[str, str, str]:
+    """
+    What we go by to tell whether an error from `log.parse` is one that we
+    already reported early: the line, the class and the message. The line
+    can be a number or a string, and the spacing in the message can differ
+    between the two, so we normalize those.
+    """
+
+    line = str(error[0]).strip() if error else ""
+    class_ = str(error[1]).strip() if len(error) > 1 else ""
+    message = " ".join(str(error[2]).split()) if len(error) > 2 else ""
+    return line, class_, message
+
+
+def unreported(
+    errors: List[List[Any]], reported: List[List[Any]],
+) -> List[List[Any]]:
+    """The ones among `errors` that are not among those `reported` early."""
+
+    keys = {error_key(err) for err in reported}
+    return [err for err in errors if error_key(err) not in keys]
+
+
+class ErrorDetector:
+    def __init__(self) -> None:
+        self.errors = []  # type: List[List[str]]
+        self.passes = 0
+        # The error whose message we are waiting for, if any, as
+        # `[line, class, message]`, together with the kind of line that
+        # completes it and how many lines we have waited.
+        self.pending = None  # type: Optional[List[str]]
+        self.waiting_for = None  # type: Optional[str]
+        self.waited = 0
+
+    def feed(self, line: str) -> List[List[str]]:
+        """
+        Take in the next line of the log, and return any errors that it
+        completes.
+        """
+
+        result = []  # type: List[List[str]]
+        match = PASS.match(line)
+        if match:
+            self.passes = int(match.group(1))
+
+        match = ERROR_START.match(line)
+        if match:
+            self.flush(result)
+            self.start(match, result)
+        elif self.pending is not None:
+            self.waited += 1
+            self.continue_(line, result)
+            if self.pending is not None and self.waited >= PATIENCE:
+                self.flush(result)
+        self.errors.extend(result)
+        return result
+
+    def finish(self) -> List[List[str]]:
+        """Call at the end of the log for any error still in the works."""
+
+        result = []  # type: List[List[str]]
+        self.flush(result)
+        self.errors.extend(result)
+        return result
+
+    def start(self, match, result: List[List[str]]) -> None:
+        line = match.group("line")
+        message = match.group("message")
+        if match.group("tex"):
+            if message and message.strip() == UNDEFINED_CS:
+                self.wait(
+                    [line, "TeX error", "undefined control sequence"],
+                    "context",
+                )
+            elif message:
+                result.append([line, "TeX error", lower_first_char(message)])
+        elif match.group("lua"):
+            self.wait([line, "Lua error", ""], "lua")
+        else:
+            self.wait([line, "MetaPost error", ""], "mp")
+
+    def wait(self, error: List[str], waiting_for: str) -> None:
+        self.pending = error
+        self.waiting_for = waiting_for
+        self.waited = 0
+
+    def continue_(self, line: str, result: List[List[str]]) -> None:
+        if self.waiting_for == "context":
+            if LINE_CONTEXT.match(line):
+                names = CONTROL_SEQUENCE.findall(line)
+                if names:
+                    self.pending[2] += " " + names[-1]
+                self.flush(result)
+        elif self.waiting_for == "lua":
+            match = LUA_MESSAGE.match(line)
+            if match:
+                self.pending[2] = lower_first_char(match.group(1))
+                self.flush(result)
+        elif self.waiting_for == "mp":
+            match = MP_MESSAGE.match(line)
+            if match:
+                self.pending[2] = lower_first_char(match.group(1))
+                self.flush(result)
+
+    def flush(self, result: List[List[str]]) -> None:
+        if self.pending is not None:
+            result.append(self.pending)
+        self.pending = None
+        self.waiting_for = None
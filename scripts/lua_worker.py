@@ -0,0 +1,186 @@
+"""
+The Python side of `worker.lua`: a long-lived LuaTeX process that parses
+bibliographies and logs for us, so that we do not start a new LuaTeX for
+each one. See `worker.lua` for the protocol.
+
+The worker is started on first use, and started again if it crashes. If a
+request takes too long, or the worker reports an error, then we start a
+fresh worker, and the request fails with a `WorkerError` so that the caller
+can fall back to a LuaTeX of its own for it.
+"""
+
+
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from . import deep_dict
+from . import files
+
+
+WORKER = "worker.lua"
+
+RESPONSE = re.compile(r"\A(ok|error) (\d+)\s*\Z")
+
+
+class WorkerError(OSError):
+    """We could not get an answer out of the worker."""
+
+
+class LuaWorker:
+    def __init__(self, script_dir: str, opts: Dict[str, Any]) -> None:
+        self.script_dir = script_dir
+        self.opts = opts
+        self.proc = None  # type: Optional[subprocess.Popen]
+        self.lines = None  # type: Optional[queue.Queue]
+        self.lock = threading.Lock()
+
+    def is_running(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self) -> None:
+        kwargs = {
+            "stdin": subprocess.PIPE,
+            "stdout": subprocess.PIPE,
+            "stderr": subprocess.DEVNULL,
+            "env": {"LUA_PATH": os.path.join(self.script_dir, "?.lua")},
+        }
+        deep_dict.update(kwargs, self.opts)
+        self.proc = subprocess.Popen(
+            ["luatex", "--luaonly", os.path.join(self.script_dir, WORKER)],
+            **kwargs
+        )
+        # Reading from a pipe blocks, and there is no portable way to read
+        # with a timeout, so a thread does the reading and hands us the
+        # lines through a queue. It puts `None` when the worker exits.
+        self.lines = queue.Queue()
+        threading.Thread(
+            target=read_lines, args=(self.proc, self.lines), daemon=True,
+        ).start()
+
+    def stop(self, graceful: bool = True) -> None:
+        """
+        Ask the worker to quit, or if not `graceful` (say because it is stuck)
+        just kill it.
+        """
+
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            if graceful and proc.poll() is None:
+                proc.stdin.write(b"quit 0\n")
+                proc.stdin.close()
+                proc.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        if proc.poll() is None:
+            proc.kill()
+
+    def request(
+        self, command: str, input_: Union[str, bytes], timeout: float = 5,
+    ) -> str:
+        """
+        Send a request, and return the text of the response. Raises
+        `WorkerError` if the worker could not be started, exited before
+        answering, took longer than `timeout` seconds or reported an error.
+        In all of those cases we start over with a fresh worker.
+        """
+
+        if isinstance(input_, bytes):
+            input_ = files.decode_bytes(input_)
+        lines = input_.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        header = "{} {}\n".format(command, len(lines))
+        data = (header + "\n".join(lines) + "\n").encode("utf-8")
+        with self.lock:
+            try:
+                if not self.is_running():
+                    self.start()
+                self.proc.stdin.write(data)
+                self.proc.stdin.flush()
+                status, body = self.read_response(timeout)
+                if status != "ok":
+                    raise WorkerError("\n".join(body))
+            except queue.Empty:
+                self.restart()
+                raise WorkerError("the worker took too long")
+            except (OSError, WorkerError) as e:
+                self.restart()
+                raise WorkerError(str(e))
+        return "\n".join(body)
+
+    def restart(self) -> None:
+        """
+        Kill the worker and start a new one, so that it is ready for the
+        next request.
+        """
+
+        self.stop(graceful=False)
+        try:
+            self.start()
+        except OSError:
+            self.proc = None
+
+    def read_response(self, timeout: float) -> Tuple[str, List[str]]:
+        deadline = time.monotonic() + timeout
+        # Anything before the header (LuaTeX might have something to say
+        # when it starts) we skip.
+        while True:
+            line = self.next_line(deadline)
+            match = RESPONSE.match(line)
+            if match:
+                break
+        status, count = match.group(1), int(match.group(2))
+        return status, [self.next_line(deadline) for _ in range(count)]
+
+    def next_line(self, deadline: float) -> str:
+        """Raises `queue.Empty` if we run past the `deadline`."""
+
+        line = self.lines.get(timeout=max(0, deadline - time.monotonic()))
+        if line is None:
+            raise WorkerError("the worker exited")
+        return line
+
+
+def read_lines(proc: subprocess.Popen, lines: queue.Queue) -> None:
+    try:
+        for line in proc.stdout:
+            lines.put(line.decode("utf-8", errors="replace").rstrip("\r\n"))
+    except (OSError, ValueError):
+        pass
+    lines.put(None)
+
+
+# The workers, by script folder and options (as the environment that LuaTeX
+# runs in depends on the options).
+WORKERS = {}  # type: Dict[Tuple[str, str], LuaWorker]
+
+WORKERS_LOCK = threading.Lock()
+
+
+def get(script_dir: str, opts: Dict[str, Any]) -> LuaWorker:
+    key = (script_dir, repr(sorted_items(opts)))
+    with WORKERS_LOCK:
+        if key not in WORKERS:
+            WORKERS[key] = LuaWorker(script_dir, opts)
+        return WORKERS[key]
+
+
+def sorted_items(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return sorted((k, sorted_items(v)) for k, v in obj.items())
+    return obj
+
+
+def shutdown() -> None:
+    with WORKERS_LOCK:
+        workers = list(WORKERS.values())
+        WORKERS.clear()
+    for worker in workers:
+        with worker.lock:
+            worker.stop()
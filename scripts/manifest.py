@@ -0,0 +1,99 @@
+"""
+Bookkeeping for generated files that are derived from some source files. We
+record the size, modification time and content hash of each source file, so
+that later on we can tell which of them have changed.
+
+The size and modification time are cheap to check, so we only fall back on
+hashing the content when one of those differs. That way touching a file
+without changing it does not count as a change.
+"""
+
+
+import hashlib
+import json
+import os
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+Signature = Dict[str, Any]
+
+
+def content_hash(path: str, block_size: int = 1 << 16) -> str:
+    hash_ = hashlib.sha1()
+    with open(path, mode="rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            hash_.update(block)
+    return hash_.hexdigest()
+
+
+def signature(path: str, old: Optional[Signature] = None) -> Signature:
+    """
+    Return the signature of the file at `path`. If `old` matches on size and
+    modification time then we trust its hash rather than re-hash the file.
+    """
+
+    stat = os.stat(path)
+    new = {"size": stat.st_size, "mtime": stat.st_mtime}
+    if (
+        old and
+        old.get("size") == new["size"] and
+        old.get("mtime") == new["mtime"] and
+        old.get("hash")
+    ):
+        new["hash"] = old["hash"]
+    else:
+        new["hash"] = content_hash(path)
+    return new
+
+
+def is_changed(path: str, old: Optional[Signature]) -> bool:
+    if not old:
+        return True
+    try:
+        return signature(path, old=old)["hash"] != old.get("hash")
+    except OSError:
+        return True
+
+
+def diff(
+    old: Dict[str, Signature], paths: Iterable[str],
+) -> Tuple[Dict[str, Signature], List[str], List[str]]:
+    """
+    Compare the recorded signatures `old` against the files `paths` as they
+    are now. Return the current signatures, the files that are new or
+    changed, and the files that have gone away (both sorted).
+    """
+
+    paths = set(paths)
+    new = {p: signature(p, old=old.get(p)) for p in paths}
+    changed = sorted(
+        p for p, sig in new.items()
+        if sig["hash"] != old.get(p, {}).get("hash")
+    )
+    removed = sorted(p for p in old if p not in paths)
+    return new, changed, removed
+
+
+def load(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def save(data: Dict[str, Any], path: str) -> None:
+    """
+    Write to a temporary file first, so that an interrupted write never
+    leaves behind a half-written manifest.
+    """
+
+    temp = path + ".tmp"
+    with open(temp, encoding="utf-8", mode="w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(temp, path)
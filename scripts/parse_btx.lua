@@ -1,4 +1,5 @@
 local to_dict = require("table_to_dict")
+local opts = to_dict.options(arg)
 
 
 local P, R, S, V = lpeg.P, lpeg.R, lpeg.S, lpeg.V
@@ -198,8 +199,7 @@ local function reformat(tab)
 end
 
 
-local function get_file()
-    local file_name = arg[1]
+local function get_file(file_name)
     if not file_name then
         return nil
     end
@@ -215,22 +215,26 @@ local function get_file()
 end
 
 
-local function main()
-    local text = get_file()
+-- Parse the bibliography in the file `file_name`.
+local function parse(file_name)
+    local text = get_file(file_name)
     if not text then
         return nil
     end
 
     local init = decode(text)
     if init then
-        local result = reformat(init)
-        if result then
-            return to_dict.encode(result)
-        end
+        return reformat(init)
     end
 
     return nil
 end
 
 
-print(main())
+-- The worker (see `worker.lua`) loads us as a module.
+if not SIMPLE_CONTEXT_WORKER then
+    to_dict.output(parse(opts.rest[1]), opts.format)
+end
+
+
+return {parse = parse}
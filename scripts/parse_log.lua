@@ -1,4 +1,5 @@
 local to_dict = require("table_to_dict")
+local opts = to_dict.options(arg)
 
 
 local P, R, S = lpeg.P, lpeg.R, lpeg.S
@@ -183,22 +184,25 @@ local function read_text_from_stdin()
 end
 
 
-local function main()
-    local text = read_text_from_stdin()
+-- Parse the log `text`.
+local function parse(text)
     if not text then
         return nil
     end
 
     local init = parse_log(text)
     if init then
-        local result = with_formatting(init)
-        if result then
-            return to_dict.encode(result)
-        end
+        return with_formatting(init)
     end
 
     return nil
 end
 
 
-print(main())
+-- The worker (see `worker.lua`) loads us as a module.
+if not SIMPLE_CONTEXT_WORKER then
+    to_dict.output(parse(read_text_from_stdin()), opts.format)
+end
+
+
+return {parse = parse}
@@ -1,8 +1,9 @@
 local to_dict = require("table_to_dict")
+local opts = to_dict.options(arg)
 
 
-local function get_file()
-    local file_name = arg[1]
+-- Load the bibliography in the file `file_name`, which should return a table.
+local function parse(file_name)
     if not file_name then
         return nil
     end
@@ -12,19 +13,14 @@ local function get_file()
         return nil
     end
 
-    local result = func()
-    return result
+    return func()
 end
 
 
-local function main()
-    local result = get_file()
-    if not result then
-        return nil
-    end
-
-    return to_dict.encode(result)
+-- The worker (see `worker.lua`) loads us as a module.
+if not SIMPLE_CONTEXT_WORKER then
+    to_dict.output(parse(opts.rest[1]), opts.format)
 end
 
 
-print(main())
+return {parse = parse}
@@ -0,0 +1,104 @@
+"""
+An index over command names, for completions. The names are kept in a sorted
+array of their lower-cased forms, so that all the names with a given prefix
+are a contiguous range that we can find with two bisections.
+
+Matching is case-insensitive throughout, like it is in Sublime Text.
+"""
+
+
+import bisect
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Sorts after any character that can appear in a name.
+END = chr(0x10FFFF)
+
+
+class PrefixIndex:
+    def __init__(self, items: Iterable[Tuple[str, int]]) -> None:
+        """The argument `items` consists of (name, arity) pairs."""
+
+        self.arities = dict(items)  # type: Dict[str, int]
+        self.names = sorted(self.arities, key=lambda s: (s.lower(), s))
+        self.keys = [name.lower() for name in self.names]
+        self.by_arity = {}  # type: Dict[int, List[str]]
+        for name in self.names:
+            self.by_arity.setdefault(self.arities[name], []).append(name)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.arities
+
+    def arity(self, name: str) -> Optional[int]:
+        return self.arities.get(name)
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        prefix = prefix.lower()
+        return (
+            bisect.bisect_left(self.keys, prefix),
+            bisect.bisect_right(self.keys, prefix + END),
+        )
+
+    def starting_with(self, prefix: str) -> List[str]:
+        lo, hi = self.prefix_range(prefix)
+        return self.names[lo:hi]
+
+    def with_arity(self, arity: int) -> List[str]:
+        return list(self.by_arity.get(arity, []))
+
+    def fuzzy(
+        self, pattern: str, limit: Optional[int] = None,
+    ) -> List[str]:
+        """
+        Return the names that contain the letters of `pattern` in order,
+        best matches first. As in Sublime Text, the first letter has to match
+        the start of the name, so we only ever look at that one range.
+
+        The ranking favours names that start with the whole of `pattern`,
+        then those where the letters match in fewer separate runs, then
+        shorter names.
+        """
+
+        if not pattern:
+            return self.names[:limit]
+        pattern = pattern.lower()
+        lo, hi = self.prefix_range(pattern[0])
+        scored = []
+        for i in range(lo, hi):
+            runs = match_runs(pattern, self.keys[i])
+            if runs is not None:
+                key = self.keys[i]
+                scored.append(
+                    (
+                        not key.startswith(pattern),
+                        runs,
+                        len(key),
+                        key,
+                        self.names[i],
+                    )
+                )
+        scored.sort()
+        return [entry[-1] for entry in scored[:limit]]
+
+
+def match_runs(pattern: str, text: str) -> Optional[int]:
+    """
+    If `pattern` is a subsequence of `text`, return the number of contiguous
+    runs in the leftmost match, and otherwise `None`.
+    """
+
+    runs, prev = 0, -2
+    pos = 0
+    for char in pattern:
+        pos = text.find(char, pos)
+        if pos < 0:
+            return None
+        if pos != prev + 1:
+            runs += 1
+        prev = pos
+        pos += 1
+    return runs
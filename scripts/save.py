@@ -1,21 +1,28 @@
+import concurrent.futures
 import copy
 import html
 import os
+import pickle
+import sys
 import xml.etree.ElementTree as ET
 
 from typing import (  # noqa
     Any, Dict, Iterable, List, Optional, Set, TextIO, Tuple, TypeVar, Union
 )
 
+from . import deep_dict
 from . import files
 from . import html_css
-from . import utilities
 
 
 T = TypeVar("T")
 
 NAMESPACE = {"cd": "http://www.pragma-ade.com/commands"}
 
+VISITING = 1
+
+VISITED = 2
+
 UGLY_DEF_LOOKUP = {
     "instance-mathovertextextensible": "instance-mathoverextensible",
     "instance-mathundertextextensible": "instance-mathunderextensible",
@@ -26,6 +33,10 @@ class DefinitionNotFoundError(Exception):
     pass
 
 
+class DefinitionCycleError(Exception):
+    pass
+
+
 class UnexpectedTagError(Exception):
     pass
 
@@ -34,6 +45,77 @@ class UnexpectedModeError(Exception):
     pass
 
 
+def dependency_order(
+    graph: Dict[str, Set[str]],
+) -> Tuple[List[str], List[List[str]], Set[str]]:
+    """
+    Given a mapping from each name to the names it depends on, return the
+    names in an order such that dependencies come first. Along the way we
+    collect any cycles (each one as a path that starts and ends on the same
+    name), and any dependencies that are missing from `graph`. A cycle is
+    broken at the point where we find it, so every name in `graph` still
+    appears exactly once in the order.
+    """
+
+    order = []  # type: List[str]
+    cycles = []  # type: List[List[str]]
+    missing = set()  # type: Set[str]
+    state = {}  # type: Dict[str, int]
+
+    for root in sorted(graph):
+        if root in state:
+            continue
+        state[root] = VISITING
+        stack = [(root, iter(sorted(graph[root])))]
+        while stack:
+            name, deps = stack[-1]
+            for dep in deps:
+                if dep not in graph:
+                    missing.add(dep)
+                elif dep not in state:
+                    state[dep] = VISITING
+                    stack.append((dep, iter(sorted(graph[dep]))))
+                    break
+                elif state[dep] == VISITING:
+                    path = [n for n, _ in stack]
+                    cycles.append(path[path.index(dep):] + [dep])
+            else:
+                stack.pop()
+                state[name] = VISITED
+                order.append(name)
+
+    return order, cycles, missing
+
+
+def in_plugin_host() -> bool:
+    """
+    Whether we are running inside Sublime Text. There `sys.executable` is the
+    plugin host rather than Python, so a process pool (which on Windows and
+    macOS starts its workers from `sys.executable`) would not just fail but
+    could hang, and so we do not try.
+    """
+
+    return "sublime" in sys.modules
+
+
+# What we make of each command file: its commands, the source of each of its
+# definitions (as XML), the definitions it looked up (with what it found), and
+# whether it got to the end.
+FileResult = Dict[str, Any]
+
+
+def load_batch(
+    saver: "InterfaceSaver", batch: List[str],
+) -> Dict[str, FileResult]:
+    """
+    The work done by each worker process in `load_commands_parallel`. Every
+    file is parsed on its own, so that the parent can merge the results in a
+    fixed order.
+    """
+
+    return {file_: saver.parse_command_file(file_) for file_ in batch}
+
+
 class InterfaceSaver:
     delimiters = {
         "braces": "{}",
@@ -41,13 +123,30 @@ class InterfaceSaver:
         "default": "[]",
         "none": None,
     }
-    defs = {}  # type: Dict[str, Any]
-    cmds = {}  # type: Dict[str, Any]
-    to_load = set()  # type: Set[str]
 
     def __init__(self, flags: int = 0, shell: bool = False) -> None:
         self.flags = flags
         self.shell = shell
+        # These used to be class-level, which meant that generating the
+        # interface for a second ConTeXt installation in the same session
+        # mixed in the commands of the first.
+        self.defs = {}  # type: Dict[str, Any]
+        self.cmds = {}  # type: Dict[str, Any]
+        # The definitions from the definition files alone; the definitions
+        # made in each command file, by file and then by name, as XML; and
+        # the values those come to.
+        self.base_defs = {}  # type: Dict[str, Any]
+        self.file_defines = {}  # type: Dict[str, Dict[str, str]]
+        self.command_defs = {}  # type: Dict[str, Any]
+        self.results = {}  # type: Dict[str, FileResult]
+        # While parsing a command file, the definitions it looks up.
+        self.used = None  # type: Optional[Dict[str, Tuple[bool, Any]]]
+        self.consistent = True
+        self.to_load = set()  # type: Set[str]
+        self.dirs = []  # type: List[str]
+        self.def_files = []  # type: List[str]
+        self.file_cmds = {}  # type: Dict[str, Set[str]]
+        self.current_file = None  # type: Optional[str]
         self.method = {
             "range": ":",
             "factor": "*",
@@ -58,6 +157,31 @@ def __init__(self, flags: int = 0, shell: bool = False) -> None:
     def parse(self, file_: Union[str, TextIO]) -> ET.Element:
         return ET.parse(file_).getroot()
 
+    def iterparse(
+        self, file_: Union[str, TextIO], clear: bool = True,
+    ) -> Iterable[ET.Element]:
+        """
+        Like `parse`, but rather than build the whole tree up front we yield
+        each top-level element as soon as it is complete. Afterwards we detach
+        it from the root (and, if `clear`, empty it), so that memory use is
+        bounded by the largest single element rather than by the whole file.
+        """
+
+        root = None
+        depth = 0
+        for event, node in ET.iterparse(file_, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = node
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 1:
+                    yield node
+                    root.remove(node)
+                    if clear:
+                        node.clear()
+
     def save(
         self,
         path: str,
@@ -68,8 +192,17 @@ def save(
         timeout: int = 10,
         namespace: Optional[Dict[str, str]] = None,
         start_stop: bool = False,
+        workers: int = 1,
+        only: Optional[Iterable[str]] = None,
     ):
+        """
+        Load the definitions, and then the commands. Normally we go looking
+        for all the command files, but if `only` is given then we load just
+        those.
+        """
+
         self.path = path
+        self.workers = workers
         self.quiet = quiet
         self.prefix = prefix
         self.start_stop = start_stop
@@ -77,17 +210,23 @@ def save(
         self.tolerant = tolerant
         self.timeout = timeout
         self.load_definitions()
-        self.load_commands(modules=modules)
+        self.base_defs = dict(self.defs)
+        if only is None:
+            self.load_commands(modules=modules)
+        else:
+            self.load_files(only)
 
     def load_definitions(self) -> None:
         """
-        To handle resolves pointing to objects not yet defined, we simply do
-        two passes. Of course, it would be better to handle the dependency
-        graph in one pass, but this is simpler and seems to be fast enough.
+        We gather up every definition node first, and then handle them in
+        dependency order. That way every `cd:resolve` points to an object that
+        is already defined, and we only need to parse each file once.
         """
 
+        self.def_nodes = {}  # type: Dict[str, ET.Element]
         self.load_definitions_aux()
-        self.load_definitions_aux()
+        self.resolve_definitions()
+        self.def_nodes = {}
 
     def load_definitions_aux(self) -> None:
         file_ = files.locate(
@@ -99,18 +238,11 @@ def load_definitions_aux(self) -> None:
         )
         if not file_:
             raise OSError('unable to locate "i-common-definitions.xml"')
+        self.def_files.append(file_)
         try:
             with open(file_, encoding="utf-8") as x:
-                root = self.parse(x)
-            for child in root:
-                if self.tag_is(child, "interfacefile"):
-                    filename = child.attrib.get("filename")
-                    if filename is not None:
-                        self.load_definitions_aux_i(filename)
-                else:
-                    raise UnexpectedTagError(
-                        'unexpected tag "{}"'.format(child.tag)
-                    )
+                for child in self.iterparse(x):
+                    self.load_definitions_aux_ii(child)
         except (OSError, ET.ParseError, UnicodeDecodeError) as e:
             msg = 'in file "{}", {} error: "{}"'.format(file_, type(e), e)
             if not self.tolerant:
@@ -118,6 +250,14 @@ def load_definitions_aux(self) -> None:
             elif not self.quiet:
                 print(self.prefix + msg)
 
+    def load_definitions_aux_ii(self, node: ET.Element) -> None:
+        if self.tag_is(node, "interfacefile"):
+            filename = node.attrib.get("filename")
+            if filename is not None:
+                self.load_definitions_aux_i(filename)
+        else:
+            raise UnexpectedTagError('unexpected tag "{}"'.format(node.tag))
+
     def load_definitions_aux_i(self, filename: str) -> None:
         file_ = files.locate(
             self.path,
@@ -128,11 +268,13 @@ def load_definitions_aux_i(self, filename: str) -> None:
         )
         if not file_:
             raise OSError('unable to locate "{}"'.format(filename))
+        self.def_files.append(file_)
         try:
+            # We hold on to these nodes until `resolve_definitions`, so we
+            # must not clear them.
             with open(file_, encoding="utf-8") as x:
-                root = self.parse(x)
-            for child in root:
-                self.do_define(child)
+                for child in self.iterparse(x, clear=False):
+                    self.def_nodes[child.attrib["name"]] = child
         except (OSError, ET.ParseError, UnicodeDecodeError) as e:
             msg = 'in file "{}", {} error: "{}"'.format(file_, type(e), e)
             if not self.tolerant:
@@ -140,8 +282,41 @@ def load_definitions_aux_i(self, filename: str) -> None:
             elif not self.quiet:
                 print(self.prefix + msg)
 
+    def resolve_definitions(self, report: bool = True) -> None:
+        graph = {
+            name: self.def_dependencies(node)
+            for name, node in self.def_nodes.items()
+        }
+        order, cycles, missing = dependency_order(graph)
+        for name in order:
+            self.do_define(self.def_nodes[name])
+        if not report:
+            return
+
+        unresolved = sorted(name for name in missing if name not in self.defs)
+        if unresolved:
+            msg = "unresolved definitions: {}".format(", ".join(unresolved))
+            if not self.tolerant:
+                raise DefinitionNotFoundError(msg)
+            elif not self.quiet:
+                print(self.prefix + msg)
+        for cycle in cycles:
+            msg = "cyclic definitions: {}".format(" -> ".join(cycle))
+            if not self.tolerant:
+                raise DefinitionCycleError(msg)
+            elif not self.quiet:
+                print(self.prefix + msg)
+
+    def def_dependencies(self, node: ET.Element) -> Set[str]:
+        return {
+            child.attrib["name"]
+            for child in node.iter(self.get_tag("resolve"))
+            if "name" in child.attrib
+        }
+
     def load_commands(self, modules: bool = True) -> None:
         self.to_load = set()
+        self.dirs = []
 
         main = files.locate(
             self.path,
@@ -152,9 +327,8 @@ def load_commands(self, modules: bool = True) -> None:
         )
         if main:
             dir_ = os.path.split(main)[0]
-            for file_ in os.listdir(dir_):
-                if self.load_commands_aux(file_):
-                    self.to_load.add(os.path.join(dir_, file_))
+            self.dirs.append(dir_)
+            self.to_load.update(self.command_files(dir_))
 
         if modules:
             # Let's use `t-rst.xml` as a smoking gun.
@@ -167,12 +341,102 @@ def load_commands(self, modules: bool = True) -> None:
             )
             if alt:
                 dir_ = os.path.split(alt)[0]
-                for file_ in os.listdir(dir_):
-                    if self.load_commands_aux(file_):
-                        self.to_load.add(os.path.join(dir_, file_))
+                self.dirs.append(dir_)
+                self.to_load.update(self.command_files(dir_))
+
+        self.load_commands_aux_i()
 
+    def load_files(self, files_: Iterable[str]) -> None:
+        self.to_load = set(files_)
         self.load_commands_aux_i()
 
+    def load_more(self, files_: Iterable[str]) -> None:
+        """
+        Load some more command files, whose definitions are already in
+        `file_defines`.
+        """
+
+        for file_ in files_:
+            self.results[file_] = self.parse_command_file(file_, final=True)
+            self.to_load.add(file_)
+        self.collect_commands()
+
+    def update(
+        self,
+        path: str,
+        old: Dict[str, Dict[str, Any]],
+        current: List[str],
+        changed: List[str],
+        removed: List[str],
+        old_defs: Dict[str, Any],
+        **kwargs
+    ) -> Set[str]:
+        """
+        Bring an interface up to date after the command files `changed` (new
+        or edited) and `removed`, given the `old` record of each file (see
+        `file_record`) and the old settled definitions of the command files
+        `old_defs`. The definitions of the unchanged files come from their
+        records, so we parse each changed file just the once. Then, for as
+        long as there are any, we also parse the unchanged files that
+        contribute to an affected command, or that look up a definition
+        whose value moved.
+
+        Returns the names of the affected commands: `encode` then has the
+        up-to-date description of each one that is still around.
+        """
+
+        self.file_defines = {
+            f: old[f].get("defines", {})
+            for f in current if f in old and f not in changed
+        }
+        self.save(path, only=changed, **kwargs)
+
+        affected = set()  # type: Set[str]
+        for f in changed + removed:
+            affected.update(old.get(f, {}).get("commands", []))
+        for f in changed:
+            affected.update(self.file_cmds.get(f, ()))
+        moved = {
+            name for name in set(old_defs) | set(self.command_defs)
+            if old_defs.get(name) != self.command_defs.get(name)
+        }
+        done = set(changed)
+        while True:
+            extra = [
+                f for f in current
+                if f not in done and (
+                    affected.intersection(old[f].get("commands", [])) or
+                    moved.intersection(old[f].get("resolves", []))
+                )
+            ]
+            if not extra:
+                return affected
+            self.load_more(extra)
+            done.update(extra)
+            for f in extra:
+                affected.update(old[f].get("commands", []))
+                affected.update(self.file_cmds.get(f, ()))
+
+    def file_record(self, file_: str) -> Dict[str, Any]:
+        """
+        What `update` needs to know about a command file that we loaded: the
+        commands it contributes to, the definitions it makes, and the ones
+        it looks up.
+        """
+
+        result = self.results.get(file_, {})
+        return {
+            "commands": sorted(self.file_cmds.get(file_, ())),
+            "defines": self.file_defines.get(file_, {}),
+            "resolves": sorted(result.get("used", ())),
+        }
+
+    def command_files(self, dir_: str) -> List[str]:
+        return [
+            os.path.join(dir_, f)
+            for f in os.listdir(dir_) if self.load_commands_aux(f)
+        ]
+
     def load_commands_aux(self, file_: str) -> bool:
         return (
             file_.endswith(".xml") and
@@ -182,27 +446,168 @@ def load_commands_aux(self, file_: str) -> bool:
         )
 
     def load_commands_aux_i(self) -> None:
-        for file_ in self.to_load:
+        """
+        A command file can make definitions of its own, and a command in one
+        file can look up a definition made in another. So we parse each file
+        (on its own, with just the definitions that we know of beforehand),
+        then settle all the definitions together, and finally parse again
+        the few files that looked up a definition which came out different.
+        That way the result does not depend on the order of the files, nor on
+        whether they were parsed in parallel.
+        """
+
+        to_load = sorted(self.to_load)
+        results = None
+        if (
+            self.workers > 1 and
+            len(to_load) > 1 and
+            not in_plugin_host()
+        ):
             try:
-                with open(file_, encoding="utf-8") as x:
-                    root = self.parse(x)
-                for child in root:
+                results = self.load_commands_parallel(to_load)
+            except (OSError, RuntimeError, pickle.PicklingError) as e:
+                # For example a broken process pool, or a platform where the
+                # worker processes cannot import us. Fall back on doing the
+                # work here.
+                if not self.quiet:
+                    msg = "parallel parsing failed, falling back: {}"
+                    print(self.prefix + msg.format(e))
+        if results is None:
+            results = {f: self.parse_command_file(f) for f in to_load}
+
+        for file_, result in results.items():
+            self.file_defines[file_] = result["defines"]
+        self.resolve_command_definitions()
+        for file_ in to_load:
+            result = results[file_]
+            if not result["complete"] or self.is_stale(result["used"]):
+                result = self.parse_command_file(file_, final=True)
+            self.results[file_] = result
+        self.collect_commands()
+
+    def load_commands_parallel(
+        self, to_load: List[str],
+    ) -> Dict[str, FileResult]:
+        """
+        Each worker is handed a share of the files together with the
+        definitions, and parses them into per-file results.
+        """
+
+        workers = min(self.workers, len(to_load))
+        batches = [to_load[i::workers] for i in range(workers)]
+        results = {}  # type: Dict[str, FileResult]
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            futures = [
+                executor.submit(load_batch, self, batch)
+                for batch in batches
+            ]
+            for future in futures:
+                results.update(future.result())
+        return results
+
+    def resolve_command_definitions(self) -> None:
+        """
+        Settle the definitions made in the command files, in dependency order
+        as for the definition files. Where two files define the same name,
+        the later one (in sorted order) wins.
+        """
+
+        self.def_nodes = {}
+        for file_ in sorted(self.file_defines):
+            for name, text in self.file_defines[file_].items():
+                self.def_nodes[name] = ET.fromstring(text)
+        self.defs = dict(self.base_defs)
+        self.resolve_definitions(report=False)
+        self.command_defs = {name: self.defs[name] for name in self.def_nodes}
+        self.def_nodes = {}
+
+    def is_stale(self, used: Dict[str, Tuple[bool, Any]]) -> bool:
+        return any(
+            (name in self.defs, self.defs.get(name)) != tuple(found)
+            for name, found in used.items()
+        )
+
+    def collect_commands(self) -> None:
+        """Merge the commands of every file so far, in sorted file order."""
+
+        self.cmds = {}
+        for file_ in sorted(self.results):
+            self.current_file = file_
+            self.file_cmds[file_] = set()
+            for name, objs in self.results[file_]["cmds"].items():
+                for obj in objs:
+                    self.add_cmd(name, obj)
+
+    def parse_command_file(
+        self, file_: str, final: bool = False,
+    ) -> FileResult:
+        """
+        Parse the command file `file_` on its own. Unless `final` (meaning
+        that the definitions are settled already), the definitions it makes
+        are applied as we go, and a definition that cannot be found does not
+        stop us, as some other file might make it.
+        """
+
+        defs, self.defs = self.defs, dict(self.defs)
+        self.cmds = {}
+        self.used = {}
+        self.consistent = True
+        self.current_file = file_
+        defines = {}  # type: Dict[str, str]
+        complete = True
+        try:
+            with open(file_, encoding="utf-8") as x:
+                for child in self.iterparse(x):
                     if self.tag_is(child, "command"):
                         self.do_command(child)
                     elif self.tag_is(child, "define"):
-                        self.do_define(child)
+                        defines[child.attrib["name"]] = \
+                            ET.tostring(child, encoding="unicode")
+                        if not final:
+                            self.do_define(child)
                     else:
                         raise UnexpectedTagError(
                             'in file "{}", unexpected tag "{}"'.format(
                                 file_, child.tag,
                             )
                         )
-            except (OSError, ET.ParseError, UnicodeDecodeError) as e:
-                msg = 'in file "{}", {} error: "{}"'.format(file_, type(e), e)
-                if not self.tolerant:
-                    raise Exception(msg)
-                elif not self.quiet:
-                    print(self.prefix + msg)
+        except (OSError, ET.ParseError, UnicodeDecodeError) as e:
+            msg = 'in file "{}", {} error: "{}"'.format(file_, type(e), e)
+            if not self.tolerant:
+                raise Exception(msg)
+            elif not self.quiet:
+                print(self.prefix + msg)
+        except DefinitionNotFoundError:
+            if final:
+                raise
+            complete = False
+        finally:
+            self.defs = defs
+        result = {
+            "cmds": self.cmds,
+            "defines": defines,
+            "used": self.used,
+            "complete": complete and self.consistent,
+        }
+        self.cmds = {}
+        self.used = None
+        return result
+
+    def note_use(self, name: str) -> None:
+        """
+        Record what a command file found when it looked up `name`. If it
+        finds different things at different times (because it redefines
+        `name` part way through), then we cannot tell from the one record
+        whether it saw the settled definition, so we say so.
+        """
+
+        if self.used is None:
+            return
+        found = (name in self.defs, self.defs.get(name))
+        if name not in self.used:
+            self.used[name] = found
+        elif self.used[name] != found:
+            self.consistent = False
 
     def do_define(self, node: ET.Element) -> None:
         name = node.attrib["name"]
@@ -469,6 +874,7 @@ def do_generic(
 
     def do_resolve(self, node: ET.Element):
         name = node.attrib["name"]
+        self.note_use(name)
         return self.defs.get(name)
 
     def do_inherit(self, node: ET.Element) -> str:
@@ -644,6 +1050,7 @@ def add_def(self, name: str, obj) -> None:
         self.defs[name] = obj
 
     def get_def(self, name: str):
+        self.note_use(name)
         if name in self.defs:
             return self.defs[name]
         for key, val in UGLY_DEF_LOOKUP.items():
@@ -653,6 +1060,7 @@ def get_def(self, name: str):
         raise DefinitionNotFoundError(message.format(name))
 
     def add_cmd(self, name: str, obj) -> None:
+        self.file_cmds.setdefault(self.current_file, set()).add(name)
         if name in self.cmds:
             self.cmds[name].append(obj)
         else:
@@ -665,7 +1073,7 @@ def simplify(self) -> None:
 
     def simplify_aux(self, vars_: T) -> T:
         if isinstance(vars_, list):
-            return utilities.deduplicate_list(vars_)
+            return deep_dict.deduplicate_list(vars_)
         return vars_
 
     def encode(self):
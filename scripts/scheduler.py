@@ -0,0 +1,106 @@
+"""
+Hold back jobs for a little while, so that a burst of requests for the same
+thing (like saving a file a few times in quick succession) comes down to a
+single job: the last one. Likewise, decide what becomes of a build that comes
+along whilst another one is still running.
+
+We do not keep time ourselves, instead we take a function like
+`sublime.set_timeout_async` to call us back after a delay.
+"""
+
+
+import threading
+
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+
+Job = Callable[[], None]
+
+SetTimeout = Callable[[Job, int], None]
+
+
+class Debouncer:
+    def __init__(self, set_timeout: SetTimeout) -> None:
+        self.set_timeout = set_timeout
+        self.lock = threading.Lock()
+        # The job waiting under each key, and which submission it came from.
+        self.waiting = {}  # type: Dict[Hashable, Tuple[int, Job]]
+        self.count = 0
+
+    def submit(self, key: Hashable, job: Job, delay: int) -> None:
+        """
+        Run `job` once `delay` milliseconds have passed without another job
+        being submitted under the same `key`. A job that is still waiting
+        when another one comes in under its key is dropped.
+        """
+
+        with self.lock:
+            self.count += 1
+            id_ = self.count
+            self.waiting[key] = (id_, job)
+        if delay > 0:
+            self.set_timeout(lambda: self.fire(key, id_), delay)
+        else:
+            self.fire(key, id_)
+
+    def fire(self, key: Hashable, id_: int) -> None:
+        with self.lock:
+            waiting = self.waiting.get(key)
+            if waiting is None or waiting[0] != id_:
+                return
+            del self.waiting[key]
+        waiting[1]()
+
+    def is_waiting(self, key: Hashable) -> bool:
+        with self.lock:
+            return key in self.waiting
+
+
+def when_busy_action(when_busy: str, replay: bool) -> str:
+    """
+    What to do with a build that comes along whilst another one is running:
+    one of `"restart"` (cancel that one and start this one), `"queue"` (start
+    this one once that one is over) and `"ignore"`.
+
+    A replay (showing the outcome of the last build again) never cancels a
+    build: once that build is over the outcome on record no longer holds for
+    the PDF, so the build is queued in full instead.
+    """
+
+    if replay:
+        return "queue"
+    if when_busy in {"restart", "queue"}:
+        return when_busy
+    return "ignore"
+
+
+class Pending:
+    """
+    The job waiting for the one in progress to finish. Only the last one is
+    kept, as it supersedes any before it.
+    """
+
+    def __init__(self, set_timeout: SetTimeout) -> None:
+        self.set_timeout = set_timeout
+        self.lock = threading.Lock()
+        self.job = None  # type: Optional[Job]
+
+    def put(self, job: Job) -> None:
+        with self.lock:
+            self.job = job
+
+    def clear(self) -> None:
+        with self.lock:
+            self.job = None
+
+    def release(self) -> None:
+        """
+        Start the waiting job, if any. We may well be called from the thread
+        of the job that just finished, so we hand it over to `set_timeout`
+        rather than run it there and then.
+        """
+
+        with self.lock:
+            job, self.job = self.job, None
+        if job is not None:
+            self.set_timeout(job, 0)
@@ -0,0 +1,340 @@
+"""
+Find the runs of a view's text that match a selector, without calling
+`view.match_selector` on every character of the way.
+
+For each view and selector we keep a `ScopeIndex` of the runs, as sorted
+begin/end lists. An index need not know about the whole view: it knows
+about the points before `known`, and learns about more when asked (one
+character at a time, or all at once by way of `view.find_by_selector` when
+that would be a long walk).
+
+When the view is modified, we do not throw the index away: Sublime Text
+highlights a line in the light of the lines before it only, so an edit can
+change the scopes from the start of its line on, but not before. If we hear
+about every edit (see `note_edit`), then we forget just about the points
+from there on, and look at them again only if we are asked about them. If
+we might have missed an edit, then we start over.
+
+The view can be anything with the methods of `sublime.View` that we use,
+which lets us test this without Sublime Text.
+"""
+
+
+import bisect
+import collections
+import threading
+
+from typing import Any, Callable, List, Optional, Tuple
+
+from . import caching
+
+
+View = Any
+
+Run = Tuple[int, int]
+
+# How many characters we look at one at a time, at most, before we rather
+# ask for all the runs at once.
+MAX_WALK = 1000
+
+# How many characters we look at at a time when following a run forward.
+STEP = 64
+
+SKIP_ANYTHING = 0
+
+SKIP_NOTHING = 1
+
+SKIP_ARGS_AND_SPACES = 2
+
+
+class ScopeIndex:
+    """
+    The runs of text that match a selector, as a sorted list of disjoint,
+    non-adjacent `(begin, end)` pairs, as far as we know about them: only
+    the points before `known` have been looked at, so a run that ends at
+    `known` might well go on.
+    """
+
+    def __init__(self, regions: List[Run], known: int) -> None:
+        self.begins = []  # type: List[int]
+        self.ends = []  # type: List[int]
+        self.known = known
+        for a, b in sorted(regions):
+            b = min(b, known)
+            if a >= b:
+                continue
+            if self.ends and a <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], b)
+            else:
+                self.begins.append(a)
+                self.ends.append(b)
+
+    def forget(self, point: int) -> None:
+        """Forget about the points from `point` on."""
+
+        if point >= self.known:
+            return
+        point = max(point, 0)
+        i = bisect.bisect_left(self.begins, point)
+        del self.begins[i:]
+        del self.ends[i:]
+        if self.ends and self.ends[-1] > point:
+            self.ends[-1] = point
+        self.known = point
+
+    def extend(self, point: int, matches: Callable[[int], bool]) -> None:
+        """Look at the points from `known` up to `point`, one at a time."""
+
+        for pt in range(self.known, point):
+            if not matches(pt):
+                continue
+            if self.ends and self.ends[-1] == pt:
+                self.ends[-1] = pt + 1
+            else:
+                self.begins.append(pt)
+                self.ends.append(pt + 1)
+        self.known = max(self.known, point)
+
+    def run_at(self, point: int) -> Optional[Run]:
+        i = bisect.bisect_right(self.begins, point) - 1
+        if i >= 0 and point < self.ends[i]:
+            return self.begins[i], self.ends[i]
+        return None
+
+    def matches(self, point: int) -> bool:
+        return self.run_at(point) is not None
+
+    def last_match(self, point: int) -> Optional[int]:
+        """Return the last point at or before `point` that matches."""
+
+        i = bisect.bisect_right(self.begins, point) - 1
+        if i < 0:
+            return None
+        return min(point, self.ends[i] - 1)
+
+
+class EditLog:
+    """
+    The edits of a buffer that we have heard about, as triples of the change
+    count before and after the edit and the point from which on the edit
+    might have changed the scopes.
+    """
+
+    def __init__(self, count: Optional[int], max_size: int = 64) -> None:
+        self.entries = collections.deque(maxlen=max_size)  # type: Any
+        # The change count after the last edit, if we know it.
+        self.count = count
+
+    def note(self, count: int, dirty: int) -> None:
+        self.entries.append((self.count, count, dirty))
+        self.count = count
+
+    def dirty_since(self, since: int, now: int) -> Optional[int]:
+        """
+        The first point that the edits from change count `since` to `now`
+        might have changed the scopes at, or `None` if we can not be sure
+        that we know about all of them.
+        """
+
+        if self.count != now:
+            return None
+        result = None  # type: Optional[int]
+        for before, after, dirty in reversed(self.entries):
+            result = dirty if result is None else min(result, dirty)
+            if before is None:
+                return None
+            if before == since:
+                return result
+        return None
+
+
+# Keyed on (buffer ID, selector), with values [change count, index].
+INDEXES = caching.LRUCache(max_size=64)
+
+# Keyed on buffer ID. We only keep track of the buffers we have indexed.
+LOGS = caching.LRUCache(max_size=64)
+
+LOCK = threading.RLock()
+
+
+def note_edit(buffer_id: int, count: int, dirty: int) -> None:
+    """
+    Let us know that the buffer has been edited, and is now at change count
+    `count`. The edit might have changed the scopes from `dirty` on.
+    """
+
+    with LOCK:
+        if buffer_id in LOGS:
+            LOGS[buffer_id].note(count, dirty)
+
+
+def full_index(view: View, selector: str) -> ScopeIndex:
+    return ScopeIndex(
+        [(r.begin(), r.end()) for r in view.find_by_selector(selector)],
+        view.size(),
+    )
+
+
+class ScopeRuns:
+    """
+    Answers questions about the runs matching `selector` in the current
+    state of `view`, looking at more of the view as needed.
+    """
+
+    def __init__(self, view: View, selector: str) -> None:
+        self.view = view
+        self.selector = selector
+        self.size = view.size()
+        self.key = (view.buffer_id(), selector)
+        with LOCK:
+            self.entry = self.current_entry()
+
+    def current_entry(self) -> List[Any]:
+        count = self.view.change_count()
+        entry = INDEXES.get(self.key)
+        if self.key[0] not in LOGS:
+            # We hold the lock, so any edit that we have not heard about yet
+            # comes after `count`.
+            LOGS[self.key[0]] = EditLog(count)
+        if entry is not None and entry[0] != count:
+            dirty = LOGS[self.key[0]].dirty_since(entry[0], count)
+            if dirty is None:
+                entry = None
+            else:
+                entry[1].forget(dirty)
+                entry[0] = count
+        if entry is None:
+            entry = [count, ScopeIndex([], 0)]
+            INDEXES[self.key] = entry
+        return entry
+
+    @property
+    def index(self) -> ScopeIndex:
+        return self.entry[1]
+
+    def know(self, point: int) -> None:
+        """Make sure that we know about the points before `point`."""
+
+        point = min(point, self.size)
+        known = self.index.known
+        if point <= known:
+            return
+        if point - known > MAX_WALK:
+            self.entry[1] = full_index(self.view, self.selector)
+        else:
+            self.index.extend(
+                point,
+                lambda pt: self.view.match_selector(pt, self.selector),
+            )
+
+    def matches(self, point: int) -> bool:
+        if not 0 <= point < self.size:
+            return False
+        with LOCK:
+            self.know(point + 1)
+            return self.index.matches(point)
+
+    def last_match(self, point: int) -> Optional[int]:
+        """Return the last point at or before `point` that matches."""
+
+        if point < 0:
+            return None
+        with LOCK:
+            self.know(point + 1)
+            return self.index.last_match(point)
+
+    def run_at(self, point: int, end: Optional[int] = None) -> Optional[Run]:
+        """
+        Return the run around `point`. If it goes on past `end`, then it is
+        only sure to be right up to there.
+        """
+
+        if not 0 <= point < self.size:
+            return None
+        end = self.size if end is None else min(end, self.size)
+        with LOCK:
+            self.know(point + 1)
+            run = self.index.run_at(point)
+            while (
+                run is not None and
+                run[1] == self.index.known and
+                self.index.known < end
+            ):
+                self.know(self.index.known + STEP)
+                run = self.index.run_at(point)
+            return run
+
+
+def enclosing_block(
+    view: View, point: int, scope: str, end: Optional[int] = None,
+) -> Optional[Run]:
+    end_ = view.size() if end is None else end
+    run = ScopeRuns(view, scope).run_at(point, end=end_)
+    if run is None:
+        return None
+    # Note that (as it always has) a block at the very start of the view
+    # loses its first character.
+    start = max(run[0] - 1, 0)
+    stop = min(run[1], end_) if point < end_ else point
+    if start < stop:
+        return start + 1, stop
+    return None
+
+
+def left_enclosing_block(
+    view: View, point: int, scope: str, end: Optional[int] = None,
+) -> Optional[Run]:
+    """
+    Like `enclosing_block`, but checks that `point` is the right-boundary of
+    the eventual block. If not, signal an error with `None`.
+    """
+
+    if end is None:
+        end = view.size()
+    block = enclosing_block(view, point, scope, end=end)
+    if block and not ScopeRuns(view, scope).matches(point + 1):
+        return block
+    return None
+
+
+def last_block_in_region(
+    view: View,
+    begin: int,
+    scope: str,
+    argument: str,
+    end: Optional[int] = None,
+    skip: int = SKIP_ANYTHING,
+) -> Optional[Run]:
+    """
+    Find the last block matching `scope` that ends at or before `end`, but
+    only skipping back over what `skip` allows on the way (where arguments
+    are what match `argument`).
+    """
+
+    runs = ScopeRuns(view, scope)
+    stop = view.size() if end is None else end
+
+    if skip == SKIP_NOTHING:
+        pass
+    elif skip == SKIP_ARGS_AND_SPACES:
+        arguments = ScopeRuns(view, argument)
+        while stop > begin and not runs.matches(stop):
+            run = arguments.run_at(stop, end=stop + 1)
+            if run is not None:
+                last = runs.last_match(stop)
+                if last is not None and last >= run[0]:
+                    stop = max(last, begin)
+                else:
+                    stop = max(run[0] - 1, begin)
+            elif view.substr(stop).isspace():
+                stop -= 1
+            else:
+                break
+    else:
+        last = runs.last_match(stop)
+        stop = begin if last is None else max(last, begin)
+
+    run = runs.run_at(stop, end=stop + 1)
+    if stop <= begin or run is None:
+        return None
+    return max(run[0] - 1, begin) + 1, stop + 1
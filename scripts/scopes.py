@@ -2,6 +2,8 @@
 
 import sublime
 
+from . import scope_runs
+
 
 def is_scope(view: sublime.View, scope: str) -> bool:
     sel = view.sel()
@@ -210,16 +212,7 @@ def NOT(a: str) -> str:
 def enclosing_block(
     view: sublime.View, point: int, scope: str, end: Optional[int] = None,
 ) -> Optional[Tuple[int, int]]:
-    start = stop = point
-    while start > 0 and view.match_selector(start, scope):
-        start -= 1
-    end_ = view.size() if end is None else end
-    while stop < end_ and view.match_selector(stop, scope):
-        stop += 1
-
-    if start < stop:
-        return start + 1, stop
-    return None
+    return scope_runs.enclosing_block(view, point, scope, end=end)
 
 
 def left_enclosing_block(
@@ -230,39 +223,14 @@ def left_enclosing_block(
     the eventual block. If not, signal an error with `None`.
     """
 
-    if end is None:
-        end = view.size()
-    block = enclosing_block(view, point, scope, end=end)
-    if block and not view.match_selector(point + 1, scope):
-        return block
-    return None
-
-
-def do_skip_anything(view: sublime.View, point: int) -> bool:
-    return True
-
-
-def do_skip_nothing(view: sublime.View, point: int) -> bool:
-    return False
+    return scope_runs.left_enclosing_block(view, point, scope, end=end)
 
 
-def do_skip_args_and_spaces(view: sublime.View, point: int) -> bool:
-    if view.substr(point).isspace() or view.match_selector(point, ARGUMENT):
-        return True
-    return False
+SKIP_ANYTHING = scope_runs.SKIP_ANYTHING
 
+SKIP_NOTHING = scope_runs.SKIP_NOTHING
 
-SKIP_ANYTHING = 0
-
-SKIP_NOTHING = 1
-
-SKIP_ARGS_AND_SPACES = 2
-
-SKIPPERS = {
-    SKIP_ANYTHING: do_skip_anything,
-    SKIP_NOTHING: do_skip_nothing,
-    SKIP_ARGS_AND_SPACES: do_skip_args_and_spaces,
-}
+SKIP_ARGS_AND_SPACES = scope_runs.SKIP_ARGS_AND_SPACES
 
 
 def last_block_in_region(
@@ -272,22 +240,11 @@ def last_block_in_region(
     end: Optional[int] = None,
     skip: int = SKIP_ANYTHING,
 ) -> Optional[Tuple[int, int]]:
-    skipper = SKIPPERS.get(skip, do_skip_anything)
-    stop = view.size() if end is None else end
-    empty = True
-
-    while (
-        stop > begin and
-        not view.match_selector(stop, scope) and
-        skipper(view, stop)
-    ):
-        stop -= 1
-
-    start = stop
-    while start > begin and view.match_selector(start, scope):
-        start -= 1
-        empty = False
-
-    if empty:
-        return None
-    return start + 1, stop + 1
+    """
+    Find the last block matching `scope` that ends at or before `end`, but
+    only skipping back over what `skip` allows on the way.
+    """
+
+    return scope_runs.last_block_in_region(
+        view, begin, scope, ARGUMENT, end=end, skip=skip,
+    )
@@ -0,0 +1,117 @@
+import os
+import re
+
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from . import caching
+from . import files
+
+
+T = TypeVar("T")
+
+# The name under which a `SettingsSnapshot` listens for changes.
+SETTINGS_KEY = "simple_context_settings_snapshot"
+
+# How many derived values we keep.
+MAX_MEMO = 32
+
+
+class SettingsSnapshot:
+    """
+    The package settings, together with the values we derive from them (the
+    current ConTeXt path, the prefixed `PATH`, the variables we add to those
+    of the window). Sublime Text tells us when the settings change, so we
+    keep one of these for the whole process, and only throw away the derived
+    values when we hear of a change, rather than rebuilding them in every
+    event handler. Some of the values depend on the `PATH` as well, so we
+    only keep the most recently used ones.
+
+    We get the settings (a `sublime.Settings`) from `load_settings`.
+    """
+
+    def __init__(
+        self, load_settings: Callable[[], Any], max_size: int = MAX_MEMO,
+    ) -> None:
+        self.load_settings = load_settings
+        self.settings = None  # type: Any
+        self.memo = caching.LRUCache(max_size=max_size)
+
+    def load(self) -> Any:
+        if self.settings is None:
+            self.settings = self.load_settings()
+            self.settings.add_on_change(SETTINGS_KEY, self.on_change)
+        return self.settings
+
+    def on_change(self) -> None:
+        self.memo.clear()
+
+    def clear(self) -> None:
+        """
+        Stop listening for changes, and forget everything. Called when the
+        plugin is unloaded: otherwise each reload would leave behind another
+        callback, holding on to the memo of the old module.
+        """
+
+        if self.settings is not None:
+            self.settings.clear_on_change(SETTINGS_KEY)
+            self.settings = None
+        self.memo.clear()
+
+    def remember(self, key: Any, compute: Callable[[], T]) -> T:
+        try:
+            return self.memo[key]
+        except KeyError:
+            result = self.memo[key] = compute()
+            return result
+
+    def get(self, opt: str, default=None):
+        return self.load().get("current.{}".format(opt), default)
+
+    def get_location(self, opt: str, default=None):
+        return self.load().get("program_locations.{}".format(opt), default)
+
+    def context_path(self, default=None) -> Optional[str]:
+        path = self.remember(
+            "context_path",
+            lambda: self.get_location("ConTeXt_paths", default={}).get(
+                self.get("path", "")
+            ),
+        )
+        return default if path is None else path
+
+    def prefixed_path(self, context_path: Optional[str]) -> str:
+        """
+        The `PATH` environment variable, with `context_path` in front if it
+        exists. We look at the current `PATH` each time, in case someone has
+        changed it behind our back.
+        """
+
+        path = os.environ.get("PATH", "")
+        return self.remember(
+            ("prefixed_path", context_path, path),
+            lambda: (
+                files.add_path(path, context_path)
+                if context_path and os.path.exists(context_path) else path
+            ),
+        )
+
+    def variables(self, context_path: Optional[str]) -> Dict[str, str]:
+        """
+        The variables we add to those of the window. The result is a fresh
+        dictionary each time, as callers like to modify it.
+        """
+
+        def compute() -> Dict[str, str]:
+            name = self.get("PDF/viewer")
+            viewer = self.get_location("PDF_viewers", default={}).get(name, "")
+            return {
+                "simple_context_path_sep": re.escape(os.path.sep),
+                "simple_context_pdf_viewer": viewer,
+                "simple_context_open_pdf_after_build":
+                    str(bool(self.get("PDF/open_after_build"))),
+            }
+
+        variables = dict(self.remember("variables", compute))
+        variables["simple_context_prefixed_path"] = \
+            self.prefixed_path(context_path)
+        return variables
@@ -0,0 +1,173 @@
+"""
+A simple single-file key-value store, for the generated interface files.
+
+The layout is as follows. First a fixed-size header, holding the location and
+length of the index. Then the records, each one a 4-byte big-endian length
+followed by that many bytes of compact UTF-8 encoded JSON. Lastly the index,
+which is itself a JSON object mapping each key to the offset of its record,
+together with some free-form metadata.
+
+So reading a single value costs a seek and the decoding of just that one
+record, no matter how large the store is.
+
+A store is never changed in place, but it can be replaced by a new one (when
+the interface is regenerated). So a `Store` checks which file it is reading
+from each time, and reads the index again if the file has been replaced.
+"""
+
+
+import json
+import os
+import struct
+
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Optional, Tuple
+
+
+MAGIC = b"SCTXSTR1"
+
+HEADER = struct.Struct(">8sQQ")
+
+LENGTH = struct.Struct(">I")
+
+
+class StoreError(OSError):
+    pass
+
+
+def identity(stat: os.stat_result) -> Tuple[int, int, int]:
+    """Tells apart the different versions of a file, given its `stat`."""
+
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def encode(obj: Any) -> bytes:
+    return json.dumps(
+        obj, ensure_ascii=False, separators=(",", ":"), sort_keys=True,
+    ).encode("utf-8")
+
+
+def decode(data: bytes) -> Any:
+    return json.loads(data.decode("utf-8"))
+
+
+def write(
+    path: str,
+    items: Iterable[Tuple[str, Any]],
+    meta: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    Write out the (key, value) pairs in `items` to a new store at `path`. We
+    write to a temporary file and then move it into place, so that readers
+    never see a half-written store.
+    """
+
+    temp = path + ".tmp"
+    offsets = {}  # type: Dict[str, int]
+    with open(temp, mode="wb") as f:
+        f.write(HEADER.pack(MAGIC, 0, 0))
+        for key, value in items:
+            offsets[key] = f.tell()
+            data = encode(value)
+            f.write(LENGTH.pack(len(data)))
+            f.write(data)
+        index_offset = f.tell()
+        index = encode({"offsets": offsets, "meta": meta or {}})
+        f.write(index)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, index_offset, len(index)))
+    os.replace(temp, path)
+
+
+class Store:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.identity = None  # type: Optional[Tuple[int, int, int]]
+        self.offsets = {}  # type: Dict[str, int]
+        self.index_meta = {}  # type: Dict[str, Any]
+        with self.open():
+            pass
+
+    def open(self) -> BinaryIO:
+        """
+        Open the store for reading, first reading the index again if the file
+        is not the one we read it from. We go by the file that we actually
+        opened, so the offsets always match the file we read from.
+        """
+
+        f = open(self.path, mode="rb")
+        try:
+            new = identity(os.fstat(f.fileno()))
+            if new != self.identity:
+                self.load_index(f)
+                self.identity = new
+        except Exception:
+            f.close()
+            raise
+        return f
+
+    def load_index(self, f: BinaryIO) -> None:
+        header = f.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise StoreError('truncated store "{}"'.format(self.path))
+        magic, offset, length = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise StoreError('not a store "{}"'.format(self.path))
+        f.seek(offset)
+        try:
+            index = decode(f.read(length))
+        except ValueError:
+            raise StoreError('corrupt store "{}"'.format(self.path))
+        self.offsets = index["offsets"]
+        self.index_meta = index["meta"]
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        self.refresh()
+        return self.index_meta
+
+    def refresh(self) -> None:
+        """Read the index again if the store has been replaced."""
+
+        try:
+            if identity(os.stat(self.path)) == self.identity:
+                return
+        except OSError:
+            return
+        with self.open():
+            pass
+
+    def __getitem__(self, key: str) -> Any:
+        with self.open() as f:
+            return self.read(f, self.offsets[key])
+
+    def read(self, f, offset: int) -> Any:
+        f.seek(offset)
+        length, = LENGTH.unpack(f.read(LENGTH.size))
+        return decode(f.read(length))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Iterate over all the records, in the order they were written."""
+
+        with self.open() as f:
+            for key, offset in sorted(
+                self.offsets.items(), key=lambda item: item[1],
+            ):
+                yield key, self.read(f, offset)
+
+    def __contains__(self, key: str) -> bool:
+        self.refresh()
+        return key in self.offsets
+
+    def __iter__(self) -> Iterator[str]:
+        self.refresh()
+        return iter(list(self.offsets))
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self.offsets)
@@ -1,5 +1,26 @@
+-- Serialise a Lua table for the Python side, in one of two formats.
+--
+-- The default is a Python literal, for `ast.literal_eval`.
+--
+-- With `--format=json-lines` (see `options` below) the output is instead a
+-- sequence of lines, each one a JSON value:
+--
+--   - the first line is a header, either `{"type": "dict"}` or
+--     `{"type": "list"}`, according to the top-level table;
+--   - then for a dict, one `[key, value]` pair per line, and for a list, one
+--     item per line (in order).
+--
+-- That way the Python side can decode one line at a time. It is also the
+-- format of the responses of the worker (see `worker.lua`).
+--
+-- Either way we collect the pieces in a buffer and join them at the end,
+-- rather than build the result with `..`, which is quadratic.
+
 -- Watch out for mutual recursion.
-local encode
+local encode, encode_json
+
+
+local JSON_LINES = "json-lines"
 
 
 local function is_indexed_table(tab)
@@ -12,32 +33,32 @@ local function is_indexed_table(tab)
 end
 
 
-local function encode_indexed_tab(tab)
-    local result = "["
+local function encode_indexed_tab(tab, buffer)
+    buffer[#buffer + 1] = "["
     for i, v in ipairs(tab) do
         if i > 1 then
-            result = result .. ", "
+            buffer[#buffer + 1] = ", "
         end
-        result = result .. encode(v)
+        encode(v, buffer)
     end
-    result = result .. "]"
-    return result
+    buffer[#buffer + 1] = "]"
 end
 
 
-local function encode_hashed_tab(tab)
-    local result = "{"
+local function encode_hashed_tab(tab, buffer)
+    buffer[#buffer + 1] = "{"
     local first = true
     for k, v in pairs(tab) do
         if first then
             first = false
         else
-            result = result .. ", "
+            buffer[#buffer + 1] = ", "
         end
-        result = result .. string.format("%s: %s", encode(k), encode(v))
+        encode(k, buffer)
+        buffer[#buffer + 1] = ": "
+        encode(v, buffer)
     end
-    result = result .. "}"
-    return result
+    buffer[#buffer + 1] = "}"
 end
 
 
@@ -49,26 +70,173 @@ end
 
 
 local function encode_number(num)
-    return num
+    return tostring(num)
 end
 
 
 -- Now we give the previouly declared local a proper definition.
-function encode(data)
+function encode(data, buffer)
     if type(data) == "string" then
-        return encode_string(data)
+        buffer[#buffer + 1] = encode_string(data)
     elseif type(data) == "number" then
-        return encode_number(data)
+        buffer[#buffer + 1] = encode_number(data)
     elseif type(data) == "table" then
         if is_indexed_table(data) then
-            return encode_indexed_tab(data)
+            encode_indexed_tab(data, buffer)
+        else
+            encode_hashed_tab(data, buffer)
+        end
+    end
+end
+
+
+local JSON_ESCAPES = {
+    ['"'] = '\\"',
+    ["\\"] = "\\\\",
+    ["\b"] = "\\b",
+    ["\f"] = "\\f",
+    ["\n"] = "\\n",
+    ["\r"] = "\\r",
+    ["\t"] = "\\t",
+}
+
+
+local function escape_json_char(c)
+    return JSON_ESCAPES[c] or string.format("\\u%04x", string.byte(c))
+end
+
+
+local function encode_json_string(text, buffer)
+    buffer[#buffer + 1] = '"'
+    buffer[#buffer + 1] = (string.gsub(text, '[%c"\\]', escape_json_char))
+    buffer[#buffer + 1] = '"'
+end
+
+
+local function encode_json_number(num, buffer)
+    -- JSON has no room for infinities or NaN, so those become strings.
+    if num ~= num or num == math.huge or num == -math.huge then
+        encode_json_string(tostring(num), buffer)
+    else
+        buffer[#buffer + 1] = tostring(num)
+    end
+end
+
+
+local function encode_json_tab(tab, buffer)
+    if is_indexed_table(tab) then
+        buffer[#buffer + 1] = "["
+        for i, v in ipairs(tab) do
+            if i > 1 then
+                buffer[#buffer + 1] = ","
+            end
+            encode_json(v, buffer)
+        end
+        buffer[#buffer + 1] = "]"
+    else
+        buffer[#buffer + 1] = "{"
+        local first = true
+        for k, v in pairs(tab) do
+            if first then
+                first = false
+            else
+                buffer[#buffer + 1] = ","
+            end
+            -- Keys in JSON have to be strings.
+            encode_json_string(tostring(k), buffer)
+            buffer[#buffer + 1] = ":"
+            encode_json(v, buffer)
+        end
+        buffer[#buffer + 1] = "}"
+    end
+end
+
+
+function encode_json(data, buffer)
+    local t = type(data)
+    if t == "string" then
+        encode_json_string(data, buffer)
+    elseif t == "number" then
+        encode_json_number(data, buffer)
+    elseif t == "boolean" then
+        buffer[#buffer + 1] = data and "true" or "false"
+    elseif t == "table" then
+        encode_json_tab(data, buffer)
+    else
+        buffer[#buffer + 1] = "null"
+    end
+end
+
+
+local function json(data)
+    local buffer = {}
+    encode_json(data, buffer)
+    return table.concat(buffer)
+end
+
+
+-- Encode `data` as JSON lines, one top-level item at a time. (If `data` is
+-- not a table then the result is `nil`, as it is in the default format.)
+local function json_lines(data)
+    if type(data) ~= "table" then
+        return "nil\n"
+    end
+    local lines = {}
+    if is_indexed_table(data) then
+        lines[1] = '{"type": "list"}'
+        for _, v in ipairs(data) do
+            lines[#lines + 1] = json(v)
+        end
+    else
+        lines[1] = '{"type": "dict"}'
+        for k, v in pairs(data) do
+            lines[#lines + 1] = json({tostring(k), v})
+        end
+    end
+    lines[#lines + 1] = ""
+    return table.concat(lines, "\n")
+end
+
+
+-- Pick out our options from the command-line arguments `args`. Returns a
+-- table with the output `format` (either `nil` or `"json-lines"`) and the
+-- remaining arguments, in order, as `rest`.
+local function options(args)
+    local result = {rest = {}}
+    for _, a in ipairs(args or {}) do
+        local format = string.match(a, "^%-%-format=(.*)$")
+        if format then
+            result.format = format
         else
-            return encode_hashed_tab(data)
+            result.rest[#result.rest + 1] = a
         end
+    end
+    return result
+end
+
+
+-- Print `data` in the given `format`.
+local function output(data, format)
+    if format == JSON_LINES then
+        io.write(json_lines(data))
+    elseif data == nil then
+        print(nil)
     else
-        return nil
+        local buffer = {}
+        encode(data, buffer)
+        print(table.concat(buffer))
     end
 end
 
 
-return {encode = encode}
+return {
+    encode = function(data)
+        local buffer = {}
+        encode(data, buffer)
+        return table.concat(buffer)
+    end,
+    json = json,
+    json_lines = json_lines,
+    options = options,
+    output = output,
+}
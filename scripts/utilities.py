@@ -1,7 +1,6 @@
 import collections
 import itertools
 import os
-import re
 
 from typing import (  # noqa
     Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, TypeVar, Union
@@ -10,8 +9,9 @@
 import sublime
 
 from . import files
-from . import randomize
+from . import load
 from . import scopes
+from . import settings_snapshot
 
 
 T = TypeVar("T")
@@ -21,40 +21,9 @@
 V = TypeVar("V")
 
 
-class HashableDict(dict):
-    def __hash__(self) -> int:
-        return hash(frozenset(self.items()))
-
-
-def make_hashable(obj):
-    if isinstance(obj, dict):
-        result = HashableDict()
-        for k, v in obj.items():
-            result[k] = make_hashable(v)
-        return result
-    elif isinstance(obj, list):
-        return tuple(make_hashable(x) for x in obj)
-    return obj
-
-
-def hash_first_arg(func: Callable) -> Callable:
-    return lambda x, *args, **kwargs: func(make_hashable(x), *args, **kwargs)
-
-
-def deduplicate_list(list_: List[T]) -> List[T]:
-    accum = []  # type: List[T]
-    for obj in list_:
-        if obj not in accum:
-            accum.append(obj)
-    return accum
-
-
 def get_path_var(self) -> Dict[str, Any]:
     copy_ = os.environ.copy()
-    if self.context_path and os.path.exists(self.context_path):
-        environ = copy_
-        environ["PATH"] = files.add_path(environ["PATH"], self.context_path)
-        return environ
+    copy_["PATH"] = SETTINGS.prefixed_path(self.context_path)
     return copy_
 
 
@@ -82,27 +51,29 @@ def iter_power_set(iter_: Iterable[T]) -> Iterable[Iterable[T]]:
 
 
 def get_path_setting(self, default=None):
-    path = self.sublime_settings.get("current.path", "")
-    paths = get_setting_location(self, "ConTeXt_paths", default={})
-    return paths.get(path, default)
+    return SETTINGS.context_path(default=default)
 
 
 def get_setting(self, opt: str, default=None):
     return self.sublime_settings.get("current.{}".format(opt), default)
 
 
+def get_pop_up_options(self) -> Dict[str, Any]:
+    return {
+        k.split("/")[-1]: get_setting(self, "pop_ups/{}".format(k), default=v)
+        for k, v in load.POP_UP_OPTIONS.items()
+    }
+
+
 def get_setting_location(self, opt: str, default=None):
     return \
         self.sublime_settings.get("program_locations.{}".format(opt), default)
 
 
 def reload_settings(self) -> None:
-    self.sublime_settings = \
-        sublime.load_settings("simple_ConTeXt.sublime-settings")
+    self.sublime_settings = SETTINGS.load()
     self.context_path = get_path_setting(self)
-    self.prefixed_context_path = expand_variables(
-        self, "${simple_context_prefixed_path}", get_variables(self),
-    )
+    self.prefixed_context_path = SETTINGS.prefixed_path(self.context_path)
 
 
 def get_variables(self) -> Dict[str, Any]:
@@ -116,23 +87,7 @@ def get_variables(self) -> Dict[str, Any]:
             variables = {}
     else:
         variables = {}
-
-    variables["simple_context_path_sep"] = re.escape(os.path.sep)
-
-    env = os.environ.copy()
-    if self.context_path and os.path.exists(self.context_path):
-        variables["simple_context_prefixed_path"] = \
-            files.add_path(env["PATH"], self.context_path)
-    else:
-        variables["simple_context_prefixed_path"] = env["PATH"]
-
-    name = get_setting(self, "PDF/viewer")
-    viewer = \
-        get_setting_location(self, "PDF_viewers", default={}).get(name, "")
-    variables["simple_context_pdf_viewer"] = viewer
-    variables["simple_context_open_pdf_after_build"] = \
-        str(bool(get_setting(self, "PDF/open_after_build")))
-
+    variables.update(SETTINGS.variables(self.context_path))
     return variables
 
 
@@ -263,79 +218,26 @@ def clear(self) -> None:
         self.cache.clear()
 
 
-class FuzzyOrderedDict:
-    def __init__(
-        self,
-        iterable: Optional[Iterable] = None,
-        max_size: int = 100,
-    ) -> None:
-        iterable = [] if iterable is None else iterable
-        self.max_size = max_size
-        self.cache = collections.deque(iterable, max_size)
-
-    def add_left(self, *args) -> None:
-        if len(args) == 1:
-            self._add_left(*args)
-        elif len(args) == 2:
-            self._add_left((args,))
-
-    def _add_left(self, args) -> None:
-        for k, v in reversed(args):
-            self.cache.appendleft((k, v))
-
-    def fuzzy_add_right(self, *args) -> None:
-        if len(args) == 1:
-            self._fuzzy_add_right(*args)
-        elif len(args) == 2:
-            self._fuzzy_add_right((args,))
-
-    def _fuzzy_add_right(self, args) -> None:
-        max_len = self.cache.maxlen
-        cur_len = len(self.cache)
-        add_len = len(args)
-        add_amt = min(add_len, max_len - cur_len)
-
-        for k, v in args[:add_amt]:
-            self.cache.append((k, v))
-
-        indices = set()  # type: Set[int]
-        for k, v in reversed(args[add_amt:]):
-            i = max_len - 1 - randomize.poly_biased_randint(
-                0, max_len - 1, ignore=indices, power=3,
-            )
-            self.cache[i] = (k, v)
-            indices.add(i)
-
-    def __iter__(self):
-        return iter(self.cache)
-
-    def __contains__(self, key) -> bool:
-        return key in self.cache
-
-    def __getitem__(self, key):
-        for k, v in self:
-            if key == k:
-                return v
-        raise KeyError
+SETTINGS_FILE = "simple_ConTeXt.sublime-settings"
 
-    def __len__(self) -> int:
-        return len(self.cache)
-
-    def __str__(self) -> str:
-        return str(self.cache)
+SETTINGS = settings_snapshot.SettingsSnapshot(
+    lambda: sublime.load_settings(SETTINGS_FILE)
+)
 
 
 class BaseSettings:
     platform = sublime.platform()
     flags = files.CREATE_NO_WINDOW if platform == "windows" else 0
     shell = True if platform == "windows" else False
-
     def reload_settings(self) -> None:
         reload_settings(self)
 
     def get_setting(self, opt, default=None):
         return get_setting(self, opt, default=default)
 
+    def get_pop_up_options(self) -> Dict[str, Any]:
+        return get_pop_up_options(self)
+
     def is_visible_alt(self) -> bool:
         if hasattr(self, "window"):
             view = self.window.active_view()
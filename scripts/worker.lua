@@ -0,0 +1,86 @@
+-- A long-lived process that serves parse requests, so that we only pay for
+-- starting LuaTeX (and building the LPeg grammars) once, rather than once per
+-- parse. It is driven over standard input and output by
+-- `scripts/lua_worker.py`, as follows.
+--
+-- A request is a header line `<command> <n>`, followed by `n` lines of input.
+-- The commands are:
+--
+--   - `btx`: parse the `.bib` file named by the input (see `parse_btx.lua`);
+--   - `lua`: load the `.lua` bibliography named by the input
+--     (`parse_lua.lua`);
+--   - `log`: parse the input as a ConTeXt log (`parse_log.lua`);
+--   - `quit`: exit.
+--
+-- The response is a header line `<status> <n>`, followed by `n` lines. If the
+-- status is `ok` then these are the result in the JSON lines format of
+-- `table_to_dict.lua`, and if it is `error` then they are an error message.
+--
+-- Everything is framed by lines rather than bytes, so that it makes no
+-- difference if the pipes translate line endings (as they do on Windows).
+
+SIMPLE_CONTEXT_WORKER = true
+
+local to_dict = require("table_to_dict")
+
+local parsers = {
+    btx = require("parse_btx").parse,
+    log = require("parse_log").parse,
+    lua = require("parse_lua").parse,
+}
+
+
+local function read_request()
+    local header = io.read("*l")
+    if not header then
+        return nil
+    end
+    local command, count = string.match(header, "^(%S+) (%d+)%s*$")
+    if not command then
+        return nil
+    end
+    local lines = {}
+    for i = 1, tonumber(count) do
+        local line = io.read("*l")
+        if not line then
+            return nil
+        end
+        lines[i] = line
+    end
+    return command, table.concat(lines, "\n")
+end
+
+
+local function respond(status, text)
+    local lines = {}
+    for line in string.gmatch(text, "[^\n]+") do
+        lines[#lines + 1] = line
+    end
+    lines[#lines + 1] = ""
+    io.write(status, " ", #lines - 1, "\n", table.concat(lines, "\n"))
+    io.flush()
+end
+
+
+local function main()
+    while true do
+        local command, input = read_request()
+        if not command or command == "quit" then
+            return
+        end
+        local parse = parsers[command]
+        if parse then
+            local ok, result = pcall(parse, input)
+            if ok then
+                respond("ok", to_dict.json_lines(result))
+            else
+                respond("error", tostring(result))
+            end
+        else
+            respond("error", "unknown command: " .. command)
+        end
+    end
+end
+
+
+main()
@@ -11,6 +11,7 @@
 # can't see how to iterate over a ST settings object.
 CURRENT_SETTINGS = {
     "buffer/on",
+    "builder/auto/debounce",
     "builder/auto/extra_opts_for_ConTeXt",
     "builder/auto/on",
     "builder/auto/open_PDF_after_build",
@@ -19,7 +20,9 @@
     "builder/auto/output/show_errors",
     "builder/auto/output/show_errors_inline",
     "builder/auto/output/show_full_command",
+    "builder/auto/restart",
     "builder/auto/return_focus_after_open_PDF",
+    "builder/auto/skip_unchanged",
     "builder/normal/open_PDF_after_build",
     "builder/normal/opts_for_ConTeXt",
     "builder/normal/output/show",
@@ -49,6 +52,10 @@
 }
 
 
+def plugin_unloaded() -> None:
+    utilities.SETTINGS.clear()
+
+
 def simplify(obj) -> str:
     if isinstance(obj, str):
         return obj
@@ -0,0 +1,112 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, "..")
+from scripts import bib_store  # noqa
+
+
+class TestBibStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = os.path.join(self.dir.name, "cache", "bibliographies")
+        self.bib = os.path.join(self.dir.name, "refs.bib")
+        self.write("@book{knuth, title={TeX}}")
+        self.calls = []
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def write(self, text: str) -> None:
+        with open(self.bib, encoding="utf-8", mode="w") as f:
+            f.write(text)
+
+    def parse(self, path: str) -> dict:
+        self.calls.append(path)
+        with open(path, encoding="utf-8") as f:
+            return {"knuth": {"title": f.read()}}
+
+    def test__parses_once(self) -> None:
+        store = bib_store.BibStore(self.cache)
+        first = store.get(self.bib, self.parse)
+        self.assertEqual(store.get(self.bib, self.parse), first)
+        self.assertEqual(len(self.calls), 1)
+
+    def test__persists(self) -> None:
+        bib_store.BibStore(self.cache).get(self.bib, self.parse)
+        store = bib_store.BibStore(self.cache)
+        self.assertEqual(
+            store.get(self.bib, self.parse)["knuth"]["title"],
+            "@book{knuth, title={TeX}}",
+        )
+        self.assertEqual(len(self.calls), 1)
+
+    def test__revalidates(self) -> None:
+        store = bib_store.BibStore(self.cache)
+        store.get(self.bib, self.parse)
+        self.write("@book{knuth, title={The TeXbook}}")
+        os.utime(self.bib, (0, 0))
+        self.assertEqual(
+            store.get(self.bib, self.parse)["knuth"]["title"],
+            "@book{knuth, title={The TeXbook}}",
+        )
+        self.assertEqual(len(self.calls), 2)
+
+    def entry_file(self) -> str:
+        return os.path.join(
+            self.cache, bib_store.entry_name(os.path.abspath(self.bib)),
+        )
+
+    def test__failures_kept(self) -> None:
+        store = bib_store.BibStore(self.cache)
+        self.assertIsNone(store.get(self.bib, lambda path: None))
+        # Until the file changes, we know better than to try again.
+        self.assertIsNone(store.get(self.bib, self.parse))
+        self.assertEqual(self.calls, [])
+        self.assertFalse(os.path.exists(self.entry_file()))
+        self.write("@book{knuth, title={The TeXbook}}")
+        self.assertIsNotNone(store.get(self.bib, self.parse))
+        self.assertEqual(len(self.calls), 1)
+        self.assertIsNone(store.get(self.bib + "x", self.parse))
+
+    def test__touched(self) -> None:
+        store = bib_store.BibStore(self.cache)
+        store.get(self.bib, self.parse)
+        written = os.stat(self.entry_file()).st_mtime_ns
+        stat = os.stat(self.bib)
+        os.utime(self.bib, (stat.st_atime, stat.st_mtime + 10))
+        self.assertIsNotNone(store.get(self.bib, self.parse))
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(os.stat(self.entry_file()).st_mtime_ns, written)
+
+    def test__one_file_each(self) -> None:
+        other = os.path.join(self.dir.name, "other.bib")
+        with open(other, encoding="utf-8", mode="w") as f:
+            f.write("@book{lamport, title={LaTeX}}")
+        store = bib_store.BibStore(self.cache)
+        store.get(self.bib, self.parse)
+        store.get(other, self.parse)
+        self.assertEqual(len(os.listdir(self.cache)), 2)
+        store.discard(other)
+        self.assertEqual(
+            os.listdir(self.cache), [os.path.basename(self.entry_file())],
+        )
+
+    def test__corrupt(self) -> None:
+        os.makedirs(self.cache)
+        with open(self.entry_file(), mode="wb") as f:
+            f.write(bib_store.MAGIC + b"garbage")
+        path = os.path.abspath(self.bib)
+        self.assertIsNone(bib_store.read(self.entry_file(), path))
+        store = bib_store.BibStore(self.cache)
+        self.assertIsNotNone(store.get(self.bib, self.parse))
+        self.assertIsNotNone(bib_store.read(self.entry_file(), path))
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import ast
+import os
+import sys
+import unittest
+
+sys.path.insert(0, "..")
+from scripts import bibtex  # noqa
+from scripts import cite  # noqa
+
+from hypothesis import given, strategies as st
+
+
+LINES = st.lists(
+    st.sampled_from(
+        [
+            "@book{a, title = {A} # X}\n",
+            "@book{b,\n  title = X,\n  year = 2000}\n",
+            "@misc{a, note = {again}}\n",
+            "@string{X = {x} # Y}\n",
+            "@string{Y = \"y\"}\n",
+            "@comment{\n  @book{c, title = {C}}\n}\n",
+            "@article{d,\n",
+            "  title = {D},\n",
+            "}\n",
+            "{\n",
+            "some text\n",
+            "\n",
+        ]
+    ),
+    max_size=12,
+)
+
+
+BIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bib")
+
+
+def expected(name: str) -> dict:
+    with open(os.path.join(BIB, name + ".py"), encoding="utf-8") as f:
+        return ast.literal_eval(f.read())
+
+
+def parsed(name: str) -> dict:
+    return cite.normalize_dict(
+        bibtex.parse_file(os.path.join(BIB, name + ".bib"))
+    )
+
+
+class TestBibtex(unittest.TestCase):
+    def test__fixtures(self) -> None:
+        names = sorted(
+            os.path.splitext(f)[0] for f in os.listdir(BIB)
+            if f.endswith(".bib")
+        )
+        self.assertTrue(names)
+        for name in names:
+            with self.subTest(name=name):
+                self.assertEqual(parsed(name), expected(name))
+                self.assertEqual(
+                    parsed(name),
+                    cite.parse_xml(os.path.join(BIB, name + ".xml")),
+                )
+
+    def test__strings(self) -> None:
+        text = (
+            "@STRING{ first = {A.} }\n"
+            "@string{ full = First # { U. Thor} }\n"
+            "@misc{x, author = FULL, note = later, year = 1999}\n"
+            "@string{ later = \"after\" }\n"
+        )
+        self.assertEqual(
+            bibtex.parse(text),
+            {
+                "x": {
+                    "category": "misc",
+                    "author": "A. U. Thor",
+                    "note": "after",
+                    "year": "1999",
+                },
+            },
+        )
+
+    def test__ignored(self) -> None:
+        text = (
+            "free text, with an @ in it\n"
+            "  @comment{ anything {at} all }\n"
+            "@preamble{ \\newcommand{\\x}{y} }\n"
+            "@book{y, title = {Nested {Braces} here}}  \n"
+        )
+        self.assertEqual(
+            bibtex.parse(text),
+            {"y": {"category": "book", "title": "Nested {Braces} here"}},
+        )
+
+    def test__errors(self) -> None:
+        for text in (
+            "@book{x, title = {unbalanced}\n",
+            "@book{x title = {no comma}}\n",
+            "@book{x, title = {a}} trailing\n",
+            "@book{x, title = \"unterminated}\n",
+        ):
+            with self.subTest(text=text):
+                with self.assertRaises(bibtex.BibtexError):
+                    bibtex.parse(text)
+
+
+class TestBibliography(unittest.TestCase):
+    def full(self, text: str):
+        try:
+            return bibtex.parse(text)
+        except bibtex.BibtexError:
+            return None
+
+    @given(LINES, LINES)
+    def test__update_matches_parse(self, old, new) -> None:
+        old, new = "".join(old), "".join(new)
+        try:
+            bib = bibtex.Bibliography(old)
+        except bibtex.BibtexError:
+            return
+        expected = self.full(new)
+        if expected is None:
+            with self.assertRaises(bibtex.BibtexError):
+                bib.update(new)
+            self.assertEqual(bib.entries, bibtex.parse(old))
+        else:
+            bib.update(new)
+            self.assertEqual(bib.entries, expected)
+
+    def test__local_edit(self) -> None:
+        entries = "".join(
+            "@book{{k{0},\n  title = {{T{0}}},\n  journal = J,\n}}\n\n"
+            .format(i) for i in range(100)
+        )
+        text = "@string{J = {Journal}}\n\n" + entries
+        bib = bibtex.Bibliography(text)
+        edited = text.replace("{T50}", "{Fifty}")
+        self.assertEqual(bib.update(edited), (1, 1))
+        self.assertEqual(bib.entries["k50"]["title"], "Fifty")
+        self.assertEqual(bib.update(edited + "@misc{new, a = J}\n"), (1, 1))
+        self.assertEqual(bib.entries["new"]["a"], "Journal")
+        renamed = bib.text.replace("{Journal}", "{Annals}")
+        self.assertEqual(bib.update(renamed), (1, 101))
+        self.assertEqual(bib.entries, bibtex.parse(renamed))
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, "..")
+from scripts import build_cache  # noqa
+
+
+class TestIncludes(unittest.TestCase):
+    def test__forms(self) -> None:
+        text = (
+            "\\environment env\n"
+            "\\input{chapter.tex} \\input intro\n"
+            "% \\input commented\n"
+            "\\component [part]\n"
+            "\\usemodule[t][tikz,chart] \\usemodule[mod][option=value]\n"
+            "\\inputfile \\startcomponent x\n"
+        )
+        self.assertEqual(
+            build_cache.includes(text),
+            [
+                ("environment", ["env"]),
+                ("input", ["chapter.tex"]),
+                ("input", ["intro"]),
+                ("component", ["part"]),
+                ("usemodule", ["t", "tikz", "chart"]),
+                ("usemodule", ["mod"]),
+            ],
+        )
+
+
+class TestKey(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.main = self.path("main.tex")
+        self.write("main.tex", "\\environment env\n\\starttext\\stoptext\n")
+        self.write("env.mkiv", "\\input common\n")
+        self.write("common.tex", "\\setupbodyfont[10pt]\n")
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir.name, name)
+
+    def write(self, name: str, text: str) -> None:
+        with open(self.path(name), mode="wb") as f:
+            f.write(text.encode("utf-8"))
+
+    def test__follows_inputs(self) -> None:
+        hashes, missing = build_cache.inputs(self.main)
+        self.assertEqual(
+            sorted(os.path.basename(p) for p in hashes),
+            ["common.tex", "env.mkiv", "main.tex"],
+        )
+        self.assertEqual(missing, [])
+
+    def test__whitespace(self) -> None:
+        key = build_cache.key(self.main, ["context"])
+        self.write(
+            "main.tex", "\\environment env  \r\n\\starttext\\stoptext\r\n\r\n",
+        )
+        self.assertEqual(build_cache.key(self.main, ["context"]), key)
+        self.write("main.tex", "\\environment env\n\\starttext x\\stoptext\n")
+        self.assertNotEqual(build_cache.key(self.main, ["context"]), key)
+
+    def test__changes(self) -> None:
+        key = build_cache.key(self.main, ["context"])
+        self.assertNotEqual(
+            build_cache.key(self.main, ["context", "--mode=draft"]), key,
+        )
+        self.write("common.tex", "\\setupbodyfont[12pt]\n")
+        self.assertNotEqual(build_cache.key(self.main, ["context"]), key)
+
+    def test__missing(self) -> None:
+        self.write("common.tex", "\\input later\n")
+        key = build_cache.key(self.main, ["context"])
+        self.assertEqual(
+            build_cache.inputs(self.main)[1], ["input:later"],
+        )
+        self.write("later.tex", "")
+        self.assertNotEqual(build_cache.key(self.main, ["context"]), key)
+
+    def test__output_path(self) -> None:
+        self.assertEqual(
+            build_cache.output_path(self.main, ["context", self.main]),
+            self.path("main.pdf"),
+        )
+        self.assertEqual(
+            build_cache.output_path(self.main, ["--result=out", self.main]),
+            self.path("out.pdf"),
+        )
+
+
+class TestBuildCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = os.path.join(self.dir.name, "cache", "builds.json")
+        self.pdf = os.path.join(self.dir.name, "main.pdf")
+        with open(self.pdf, mode="wb") as f:
+            f.write(b"%PDF")
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test__round_trip(self) -> None:
+        errors = [["3", "TeX error", "undefined control sequence \\foo"]]
+        build_cache.BuildCache(self.cache).put(
+            "main.tex", "abc", self.pdf, 1, errors,
+        )
+        cache = build_cache.BuildCache(self.cache)
+        self.assertEqual(
+            cache.get("main.tex", "abc", self.pdf)["errors"], errors,
+        )
+        self.assertIsNone(cache.get("main.tex", "def", self.pdf))
+
+    def test__output_touched(self) -> None:
+        cache = build_cache.BuildCache(self.cache)
+        cache.put("main.tex", "abc", self.pdf, 0, [])
+        stat = os.stat(self.pdf)
+        os.utime(self.pdf, (stat.st_atime, stat.st_mtime + 10))
+        self.assertIsNone(cache.get("main.tex", "abc", self.pdf))
+        os.remove(self.pdf)
+        self.assertIsNone(cache.get("main.tex", "abc", self.pdf))
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
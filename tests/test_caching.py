@@ -0,0 +1,88 @@
+import sys
+import unittest
+
+from hypothesis import given, strategies as st
+
+sys.path.insert(0, "../scripts")
+import caching  # noqa
+
+
+OPERATION = st.tuples(
+    st.sampled_from(["get", "set", "prefetch"]),
+    st.integers(min_value=0, max_value=30),
+)
+
+
+class TestCaching(unittest.TestCase):
+    @given(
+        st.sampled_from(sorted(caching.POLICIES)),
+        st.integers(min_value=1, max_value=10),
+        st.lists(OPERATION, max_size=200),
+    )
+    def test__behaves_like_a_dict(self, policy, size, operations) -> None:
+        cache = caching.new_cache(policy, max_size=size)
+        ref = {}
+        for op, key in operations:
+            if op == "get":
+                if key in cache:
+                    self.assertEqual(cache[key], ref[key])
+                else:
+                    with self.assertRaises(KeyError):
+                        cache[key]
+            elif op == "set":
+                cache[key] = ref[key] = -key
+                self.assertIn(key, cache)
+            else:
+                cache.prefetch(key, -key)
+                ref.setdefault(key, -key)
+                self.assertIn(key, cache)
+            self.assertLessEqual(len(cache), size)
+        stats = cache.stats()
+        self.assertEqual(
+            stats["hits"] + stats["misses"],
+            sum(op == "get" for op, _ in operations),
+        )
+
+    def test__lru_order(self) -> None:
+        cache = caching.LRUCache(max_size=2)
+        cache["a"] = 1
+        cache["b"] = 2
+        cache["a"]
+        cache["c"] = 3
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test__prefetch_is_cold(self) -> None:
+        for policy in caching.POLICIES:
+            cache = caching.new_cache(policy, max_size=4)
+            for key in "abcd":
+                cache[key] = key
+                cache[key]
+            cache.prefetch("x", "x")
+            cache.prefetch("y", "y")
+            self.assertNotIn("x", cache, policy)
+            self.assertIn("y", cache, policy)
+
+    def test__arc_resists_scans(self) -> None:
+        cache = caching.ARCCache(max_size=4)
+        for _ in range(2):
+            for key in "ab":
+                cache[key] = key
+                cache[key]
+        for key in range(20):
+            cache[key] = key
+        self.assertIn("a", cache)
+        self.assertIn("b", cache)
+
+    def test__unknown_policy(self) -> None:
+        with self.assertRaises(ValueError):
+            caching.new_cache("random")
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
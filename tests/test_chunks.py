@@ -0,0 +1,65 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, "../scripts")
+import chunks  # noqa
+
+
+class TestChunks(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.index = [
+            ["setupfoo", "setupfoo.json"],
+            ["start", "start.json"],
+            ["stopbar", "stopbar.json"],
+        ]
+        for _, file_ in self.index:
+            self.write(file_, {})
+        self.write("_manifest.json", {})
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def write(self, name: str, data) -> None:
+        path = os.path.join(self.dir.name, name)
+        with open(path, encoding="utf-8", mode="w") as f:
+            json.dump(data, f)
+
+    def test__locate(self) -> None:
+        lasts = [last for last, _ in self.index]
+        self.assertEqual(chunks.locate(lasts, "about"), 0)
+        self.assertEqual(chunks.locate(lasts, "setupfoo"), 0)
+        self.assertEqual(chunks.locate(lasts, "setupfooa"), 1)
+        self.assertEqual(chunks.locate(lasts, "starttext"), 2)
+        self.assertEqual(chunks.locate(lasts, "stopbar"), 2)
+        self.assertIsNone(chunks.locate(lasts, "stopbara"))
+        self.assertIsNone(chunks.locate([], "starttext"))
+
+    def test__load_index(self) -> None:
+        commands = ["2:setupfoo", "0:start"]
+        self.write(
+            "_commands.json", chunks.encode_index(commands, self.index),
+        )
+        self.assertEqual(
+            chunks.load_index(self.dir.name, "_commands.json"),
+            (commands, self.index),
+        )
+
+    def test__load_old_index(self) -> None:
+        commands = ["2:setupfoo", "0:start"]
+        self.write("_commands.json", commands)
+        self.assertEqual(
+            chunks.load_index(self.dir.name, "_commands.json"),
+            (commands, self.index),
+        )
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import sys
+import unittest
+
+sys.path.insert(0, "..")
+from scripts import cite  # noqa
+
+
+class TestDecodeOutput(unittest.TestCase):
+    def test__json_lines_dict(self) -> None:
+        text = "\n".join(
+            [
+                '{"type": "dict"}',
+                '["knuth", {"category": "book", '
+                '"title": "The \\"TeX\\"book"}]',
+                '["lamport", {"year": 1986}]',
+            ]
+        )
+        self.assertEqual(
+            cite.decode_output(text),
+            {
+                "knuth": {"category": "book", "title": 'The "TeX"book'},
+                "lamport": {"year": 1986},
+            },
+        )
+
+    def test__json_lines_list(self) -> None:
+        text = '{"type": "list"}\n["12", "TeX error", "undefined"]\n[]'
+        self.assertEqual(
+            cite.decode_output(text), [["12", "TeX error", "undefined"], []],
+        )
+        self.assertEqual(cite.decode_output('{"type": "list"}'), [])
+
+    def test__python_literal(self) -> None:
+        self.assertEqual(
+            cite.decode_output('{"""a""": {"""b""": """c\\"d"""}}'),
+            {"a": {"b": 'c"d'}},
+        )
+        self.assertEqual(cite.decode_output("[1, 2]"), [1, 2])
+
+    def test__failures(self) -> None:
+        for text in (
+            "nil",
+            "",
+            "not a literal",
+            '{"type": "dict"}\n["unterminated',
+            '{"type": "other"}\n1',
+            '{"type": "dict"}\n1',
+        ):
+            with self.subTest(text=text):
+                self.assertIsNone(cite.decode_output(text))
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
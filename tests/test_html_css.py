@@ -0,0 +1,112 @@
+import sys
+import unittest
+
+from hypothesis import given, strategies as st
+
+sys.path.insert(0, "../scripts")
+import html_css  # noqa
+
+
+MARKUP = st.text(alphabet="<>/ab \n&;ltgnbspr", max_size=40)
+
+
+def slow_unescape(text: str) -> str:
+    text = text.replace("&gt;", ">").replace("&lt;", "<")
+    return text.replace("&nbsp;", " ").replace("<br>", "\n")
+
+
+def signature(keys: int, values: int) -> str:
+    """A pop-up signature, as long as those of the bigger setup commands."""
+
+    lines = []
+    for i in range(keys):
+        lines.append(
+            "    <key>key{}</key> <equ>=</equ> ".format(i) + " ".join(
+                "<val>value{}</val> &lt;x&gt;".format(j)
+                for j in range(values)
+            )
+        )
+    return (
+        "<syntax>      <num>1</num>\n<sco>\\</sco><con>setupfoo</con> "
+        "<pun>[</pun>..<com>,</com><key>..</key><equ>=</equ>..<pun>]</pun>"
+        "</syntax>\n\n<docstring>" + "\n".join(lines) + "</docstring>"
+    )
+
+
+def slow_protect_space(text: str) -> str:
+    result = ""
+    in_tag = False
+    for c in text:
+        if c == "<":
+            in_tag = True
+        elif c == ">":
+            in_tag = False
+        result += c if in_tag or c != " " else "&nbsp;"
+    return result.replace("\n", "<br>")
+
+
+class TestHtmlCss(unittest.TestCase):
+    @given(MARKUP)
+    def test__visible_length(self, text) -> None:
+        self.assertEqual(
+            html_css.visible_length(text), len(html_css.strip_tags(text)),
+        )
+        self.assertEqual(
+            html_css.visible_length(text, entities=True),
+            len(html_css.unescape(html_css.strip_tags(text))),
+        )
+
+    @given(MARKUP)
+    def test__unescape(self, text) -> None:
+        self.assertEqual(html_css.unescape(text), slow_unescape(text))
+
+    @given(MARKUP)
+    def test__protect_space(self, text) -> None:
+        self.assertEqual(
+            html_css.protect_space(text), slow_protect_space(text),
+        )
+
+    @given(MARKUP)
+    def test__raw_print(self, text) -> None:
+        self.assertEqual(
+            html_css.raw_print(text),
+            slow_unescape(
+                html_css.strip_tags(text.replace("<br>", "\n"))
+                .replace("&nbsp;", " ")
+            ),
+        )
+
+    def test__long_signature(self) -> None:
+        text = signature(150, 30)
+        protected = html_css.protect_space(text)
+        self.assertEqual(protected, slow_protect_space(text))
+        self.assertEqual(
+            html_css.raw_print(protected),
+            slow_unescape(
+                html_css.strip_tags(protected.replace("<br>", "\n"))
+                .replace("&nbsp;", " ")
+            ),
+        )
+        self.assertEqual(
+            html_css.visible_length(text, entities=True),
+            len(slow_unescape(html_css.strip_tags(text))),
+        )
+
+    def test__examples(self) -> None:
+        self.assertEqual(html_css.visible_length("<val>yes</val>"), 3)
+        self.assertEqual(html_css.visible_length("a <b"), 4)
+        self.assertEqual(html_css.visible_length("<>x>"), 0)
+        self.assertEqual(html_css.visible_length("&lt;x&gt;", True), 3)
+        self.assertEqual(html_css.unescape("a&lt;br&gt;b"), "a\nb")
+        self.assertEqual(
+            html_css.protect_space("<a href=x>b c</a>\n"),
+            "<a href=x>b&nbsp;c</a><br>",
+        )
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import sys
+import unittest
+
+sys.path.insert(0, "..")
+from scripts import load  # noqa
+
+
+class TestOptionsKey(unittest.TestCase):
+    def options(self, **kwargs) -> dict:
+        result = {k.split("/")[-1]: v for k, v in load.POP_UP_OPTIONS.items()}
+        result.update(kwargs)
+        return result
+
+    def test__render_options(self) -> None:
+        key = load.options_key(self.options())
+        self.assertEqual(
+            load.options_key(self.options(on_hover=False, on_modified=False)),
+            key,
+        )
+        self.assertNotEqual(
+            load.options_key(self.options(line_break=80)), key,
+        )
+        self.assertNotEqual(
+            load.options_key(self.options(show_source_files=False)), key,
+        )
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
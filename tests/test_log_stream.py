@@ -0,0 +1,137 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, "../scripts")
+import log_stream  # noqa
+
+
+ERRORS_LOG = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "logs", "errors.log",
+)
+
+LOG = """\
+mtx-context     | run 1: luatex --fmt=cont-en test.tex
+system          > ConTeXt  ver: 2019.01.01 12:00 MKIV beta  fmt: 2019.1.1
+tex error > tex error on line 3 in file a.tex: ! Undefined control sequence
+
+l.3 \\foo
+         \\bar
+1     \\starttext
+2
+3 >>  \\foo\\bar
+lua error       > lua error on line 5 in file /tmp/test.tex:
+
+[ctxlua]:1: Attempt to call a nil value
+stack traceback:
+mtx-context     | run 2: luatex --fmt=cont-en test.tex
+tex error > tex error on line 7 in file a.tex: ! Missing $ inserted
+metapost error > mp error on line 9 in file a.tex: error in loop
+
+! Isolated expression.
+"""
+
+
+class TestErrorDetector(unittest.TestCase):
+    def test__log(self) -> None:
+        detector = log_stream.ErrorDetector()
+        seen = []
+        for line in LOG.split("\n"):
+            seen.append(detector.feed(line))
+        detector.finish()
+        self.assertEqual(
+            detector.errors,
+            [
+                ["3", "TeX error", "undefined control sequence \\foo"],
+                ["5", "Lua error", "attempt to call a nil value"],
+                ["7", "TeX error", "missing $ inserted"],
+                ["9", "MetaPost error", "isolated expression."],
+            ],
+        )
+        self.assertEqual(detector.passes, 2)
+        # Each error is reported on the line that completes it.
+        self.assertEqual(
+            [i for i, errors in enumerate(seen) if errors], [4, 11, 14, 17],
+        )
+
+    def test__incomplete(self) -> None:
+        detector = log_stream.ErrorDetector()
+        detector.feed(
+            "lua error > lua error on line 2 in file a.tex: something"
+        )
+        self.assertEqual(detector.errors, [])
+        self.assertEqual(detector.finish(), [["2", "Lua error", ""]])
+        for _ in range(log_stream.PATIENCE):
+            detector.feed(
+                "tex error > tex error on line 4 in file a.tex: "
+                "! Undefined control sequence"
+            )
+            detector.feed("nothing to see here")
+        self.assertEqual(
+            detector.errors[-1],
+            ["4", "TeX error", "undefined control sequence"],
+        )
+
+    def test__fixture(self) -> None:
+        detector = log_stream.ErrorDetector()
+        with open(ERRORS_LOG, encoding="utf-8") as f:
+            for line in f.read().split("\n"):
+                detector.feed(line)
+        detector.finish()
+        self.assertEqual(
+            sorted({log_stream.error_key(err) for err in detector.errors}),
+            [
+                ("12", "MetaPost error", "isolated expression."),
+                (
+                    "4",
+                    "TeX error",
+                    "undefined control sequence \\undefinedmacro",
+                ),
+                ("6", "TeX error", "missing $ inserted"),
+                ("7", "TeX error", "illegal unit of measure (pt inserted)"),
+                ("7", "TeX error", "missing number, treated as zero"),
+                (
+                    "8",
+                    "Lua error",
+                    "attempt to perform arithmetic on a nil value "
+                    "(global 'x')",
+                ),
+            ],
+        )
+        self.assertEqual(detector.passes, 2)
+
+
+class TestErrorKey(unittest.TestCase):
+    def test__formatting(self) -> None:
+        self.assertEqual(
+            log_stream.error_key(["3", "TeX error", "undefined  \\foo"]),
+            log_stream.error_key([3, "TeX error", "undefined \\foo "]),
+        )
+        self.assertNotEqual(
+            log_stream.error_key(["3", "TeX error", "x"]),
+            log_stream.error_key(["3", "Lua error", "x"]),
+        )
+
+    def test__same_line(self) -> None:
+        # Two errors of the same class on the same line are both reported.
+        early = [["7", "TeX error", "missing number, treated as zero"]]
+        final = [
+            [7, "TeX error", "missing number,  treated as zero "],
+            [7, "TeX error", "illegal unit of measure (pt inserted)"],
+        ]
+        self.assertEqual(log_stream.unreported(final, early), final[1:])
+        # Likewise for errors without a line number.
+        self.assertEqual(
+            log_stream.unreported(
+                [["", "Lua error", "a"]], [["", "Lua error", "b"]],
+            ),
+            [["", "Lua error", "a"]],
+        )
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, "..")
+from scripts import cite  # noqa
+from scripts import log  # noqa
+from scripts import log_stream  # noqa
+from scripts import lua_worker  # noqa
+
+
+SCRIPTS = os.path.abspath(os.path.join("..", "scripts"))
+
+ERRORS_LOG = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "logs", "errors.log",
+)
+
+LUATEX = shutil.which("luatex")
+
+# As the plugin runs LuaTeX, with the environment we have.
+OPTS = {"env": dict(os.environ)}
+
+TRICKY = [
+    "",
+    "plain",
+    'quotes " and \'\'\' and """',
+    "back\\slash \\\\ \\n \\u0041 \\",
+    "new\nline\r\nand\ttab\x08\x0c\x00\x01\x1f\x7f",
+    "non-ASCII: é ß ∑ 😀",
+    "[1, 2]",
+    "{\"type\": \"dict\"}",
+]
+
+LOG = (
+    "This is LuaTeX\r\n"
+    "\r\n"
+    "! Undefined control sequence.\r\n"
+    "l.3 \\foo\r\n"
+    "\r\n"
+    "mtx-context     | run 1: luatex\n"
+)
+
+
+def lua_string(text: str) -> str:
+    """Write `text` as a Lua string literal, byte by byte."""
+
+    return '"{}"'.format(
+        "".join("\\{}".format(b) for b in text.encode("utf-8"))
+    )
+
+
+@unittest.skipIf(LUATEX is None, "LuaTeX is not installed")
+class TestTableToDict(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def run_lua(self, code: str) -> str:
+        script = os.path.join(self.dir.name, "test.lua")
+        with open(script, encoding="utf-8", mode="w") as f:
+            f.write('local to_dict = require("table_to_dict")\n' + code)
+        env = dict(OPTS["env"], LUA_PATH=os.path.join(SCRIPTS, "?.lua"))
+        out = subprocess.check_output(
+            [LUATEX, "--luaonly", script], env=env, timeout=30,
+        )
+        return out.decode("utf-8")
+
+    def test__list(self) -> None:
+        items = ", ".join(lua_string(s) for s in TRICKY)
+        out = self.run_lua(
+            "io.write(to_dict.json_lines({{{}}}))\n".format(items)
+        )
+        self.assertEqual(cite.decode_output(out), TRICKY)
+
+    def test__dict(self) -> None:
+        items = ", ".join(
+            "[{}] = {{{}}}".format(lua_string("k" + s), lua_string(s))
+            for s in TRICKY
+        )
+        out = self.run_lua(
+            "io.write(to_dict.json_lines({{{}}}))\n".format(items)
+        )
+        self.assertEqual(
+            cite.decode_output(out), {"k" + s: [s] for s in TRICKY},
+        )
+
+    def test__nil(self) -> None:
+        self.assertIsNone(
+            cite.decode_output(self.run_lua("io.write(to_dict.json_lines())"))
+        )
+
+
+@unittest.skipIf(LUATEX is None, "LuaTeX is not installed")
+class TestWorker(unittest.TestCase):
+    def setUp(self) -> None:
+        self.worker = lua_worker.LuaWorker(SCRIPTS, OPTS)
+
+    def tearDown(self) -> None:
+        self.worker.stop()
+
+    def request(self, command: str, input_: str) -> object:
+        return cite.decode_output(
+            self.worker.request(command, input_, timeout=30)
+        )
+
+    def test__framing(self) -> None:
+        first = self.request("log", LOG)
+        self.assertIsInstance(first, list)
+        proc = self.worker.proc
+        # Line endings and blank lines in the input do not put the worker
+        # out of step.
+        self.assertEqual(self.request("log", LOG.replace("\r\n", "\n")), first)
+        self.assertIsNone(
+            self.request("btx", os.path.join(SCRIPTS, "missing.bib"))
+        )
+        self.assertEqual(self.request("log", LOG), first)
+        self.assertIs(self.worker.proc, proc)
+        with self.assertRaises(lua_worker.WorkerError):
+            self.worker.request("nonsense", "one\n\ntwo\n", timeout=30)
+
+    def test__same_as_once(self) -> None:
+        once = cite.parse_common_luatex_once(
+            LOG,
+            os.path.join(SCRIPTS, "parse_log.lua"),
+            OPTS,
+            input_as_stdin=True,
+            timeout=30,
+        )
+        self.assertEqual(self.request("log", LOG), once)
+
+
+@unittest.skipIf(LUATEX is None, "LuaTeX is not installed")
+class TestParseLog(unittest.TestCase):
+    def test__same_as_detector(self) -> None:
+        """
+        The errors we report early are those that `parse_log.lua` finds in
+        the end, as far as `log_stream.error_key` is concerned.
+        """
+
+        with open(ERRORS_LOG, encoding="utf-8") as f:
+            text = f.read()
+        detector = log_stream.ErrorDetector()
+        for line in text.split("\n"):
+            detector.feed(line)
+        detector.finish()
+        result = log.parse(
+            text, os.path.join(SCRIPTS, "parse_log.lua"), OPTS, timeout=30,
+        )
+        self.assertEqual(
+            {log_stream.error_key(err) for err in result["errors"]},
+            {log_stream.error_key(err) for err in detector.errors},
+        )
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
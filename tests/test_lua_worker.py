@@ -0,0 +1,111 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, "..")
+from scripts import cite  # noqa
+from scripts import lua_worker  # noqa
+
+
+# Stands in for `luatex`. As the worker it answers each request with the
+# lines it was given, and otherwise with what it read on standard input.
+FAKE_LUATEX = """\
+#!{python}
+import json
+import os
+import sys
+import time
+
+MODE = os.environ.get("FAKE_MODE", "")
+
+
+def answer(status, lines):
+    sys.stdout.write("{{}} {{}}\\n".format(status, len(lines)))
+    for line in lines:
+        sys.stdout.write(line + "\\n")
+    sys.stdout.flush()
+
+
+if os.path.basename(sys.argv[2]) == "worker.lua":
+    while True:
+        header = sys.stdin.readline().split()
+        if not header or header[0] == "quit":
+            break
+        lines = [
+            sys.stdin.readline().rstrip("\\n") for _ in range(int(header[1]))
+        ]
+        if MODE == "hang":
+            time.sleep(60)
+        elif MODE == "error":
+            answer("error", ["something went wrong"])
+        else:
+            answer(
+                "ok", ['{{"type": "list"}}', json.dumps(["worker"] + lines)],
+            )
+else:
+    data = sys.stdin.buffer.read().decode("latin-1")
+    sys.stdout.write('{{"type": "list"}}\\n' + json.dumps(["once", data]))
+"""
+
+
+@unittest.skipIf(os.name == "nt", "the stand-in for LuaTeX is a script")
+class TestLuaWorker(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.dir.name, "luatex")
+        with open(path, encoding="utf-8", mode="w") as f:
+            f.write(FAKE_LUATEX.format(python=sys.executable))
+        os.chmod(path, 0o755)
+        self.script = os.path.join(self.dir.name, "parse_log.lua")
+
+    def tearDown(self) -> None:
+        lua_worker.shutdown()
+        self.dir.cleanup()
+
+    def opts(self, mode: str) -> dict:
+        return {"env": {"PATH": self.dir.name, "FAKE_MODE": mode}}
+
+    def parse(self, mode: str, input_) -> list:
+        return cite.parse_common_luatex(
+            input_, self.script, self.opts(mode),
+            input_as_stdin=True, timeout=1,
+        )
+
+    def test__worker(self) -> None:
+        self.assertEqual(
+            self.parse("", "one\r\ntwo"), [["worker", "one", "two"]],
+        )
+        worker = lua_worker.get(self.dir.name, self.opts(""))
+        proc = worker.proc
+        self.parse("", "three")
+        self.assertIs(worker.proc, proc)
+
+    def test__latin_1(self) -> None:
+        self.assertEqual(
+            self.parse("", "café".encode("latin-1")), [["worker", "café"]],
+        )
+
+    def test__timeout(self) -> None:
+        worker = lua_worker.get(self.dir.name, self.opts("hang"))
+        self.assertEqual(self.parse("hang", b"log"), [["once", "log"]])
+        # The stuck worker is gone, and a fresh one is waiting.
+        self.assertTrue(worker.is_running())
+        with self.assertRaises(lua_worker.WorkerError):
+            worker.request("log", "log", timeout=0.5)
+
+    def test__error(self) -> None:
+        worker = lua_worker.get(self.dir.name, self.opts("error"))
+        self.parse("error", "log")
+        proc = worker.proc
+        self.assertEqual(self.parse("error", "log"), [["once", "log"]])
+        self.assertIsNot(worker.proc, proc)
+        self.assertTrue(worker.is_running())
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
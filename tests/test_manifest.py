@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, "../scripts")
+import manifest  # noqa
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.paths = [
+            os.path.join(self.dir.name, "{}.xml".format(name))
+            for name in ("a", "b", "c")
+        ]
+        for path in self.paths:
+            self.write(path, path)
+        self.old = {p: manifest.signature(p) for p in self.paths}
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def write(self, path: str, text: str) -> None:
+        with open(path, encoding="utf-8", mode="w") as f:
+            f.write(text)
+
+    def test__unchanged(self) -> None:
+        _, changed, removed = manifest.diff(self.old, self.paths)
+        self.assertEqual((changed, removed), ([], []))
+
+    def test__touched_is_unchanged(self) -> None:
+        os.utime(self.paths[0], (0, 0))
+        new, changed, _ = manifest.diff(self.old, self.paths)
+        self.assertEqual(changed, [])
+        self.assertEqual(new[self.paths[0]]["mtime"], 0)
+
+    def test__changed_added_removed(self) -> None:
+        self.write(self.paths[1], "something else")
+        extra = os.path.join(self.dir.name, "d.xml")
+        self.write(extra, "new")
+        _, changed, removed = \
+            manifest.diff(self.old, self.paths[1:] + [extra])
+        self.assertEqual(changed, sorted([self.paths[1], extra]))
+        self.assertEqual(removed, [self.paths[0]])
+
+    def test__save_and_load(self) -> None:
+        path = os.path.join(self.dir.name, "_manifest.json")
+        manifest.save({"files": self.old}, path)
+        self.assertEqual(manifest.load(path), {"files": self.old})
+        self.assertIsNone(manifest.load(path + ".missing"))
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import sys
+import unittest
+
+from hypothesis import given, strategies as st
+
+sys.path.insert(0, "../scripts")
+import prefix_index  # noqa
+
+
+COMMANDS = [
+    ("setupfoo", 2),
+    ("setuphead", 2),
+    ("starttext", 0),
+    ("startTEXpage", 1),
+    ("stoptext", 0),
+    ("section", 2),
+    ("TeX", 0),
+]
+
+NAMES = st.text(alphabet="abcABC", min_size=1, max_size=6)
+
+
+class TestPrefixIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = prefix_index.PrefixIndex(COMMANDS)
+
+    def test__starting_with(self) -> None:
+        self.assertEqual(
+            self.index.starting_with("setup"), ["setupfoo", "setuphead"],
+        )
+        self.assertEqual(
+            self.index.starting_with("STARTt"), ["startTEXpage", "starttext"],
+        )
+        self.assertEqual(self.index.starting_with("x"), [])
+        self.assertEqual(len(self.index.starting_with("")), len(COMMANDS))
+
+    def test__with_arity(self) -> None:
+        self.assertEqual(
+            self.index.with_arity(0), ["starttext", "stoptext", "TeX"],
+        )
+        self.assertEqual(self.index.with_arity(3), [])
+        self.assertEqual(self.index.arity("section"), 2)
+        self.assertIsNone(self.index.arity("chapter"))
+
+    def test__fuzzy(self) -> None:
+        self.assertEqual(
+            self.index.fuzzy("stt"), ["stoptext", "starttext", "startTEXpage"],
+        )
+        self.assertEqual(
+            self.index.fuzzy("startt"), ["starttext", "startTEXpage"],
+        )
+        self.assertEqual(self.index.fuzzy("s", limit=1), ["section"])
+        self.assertEqual(self.index.fuzzy("tst"), [])
+        self.assertEqual(self.index.fuzzy("tx"), ["TeX"])
+
+    @given(st.lists(NAMES), NAMES)
+    def test__fuzzy_is_subsequence_match(self, names, pattern) -> None:
+        index = prefix_index.PrefixIndex((name, 0) for name in names)
+        expected = {
+            name for name in set(names)
+            if name[0].lower() == pattern[0].lower() and
+            prefix_index.match_runs(pattern.lower(), name.lower()) is not None
+        }
+        self.assertEqual(set(index.fuzzy(pattern)), expected)
+        self.assertEqual(
+            set(index.starting_with(pattern)),
+            {n for n in names if n.lower().startswith(pattern.lower())},
+        )
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
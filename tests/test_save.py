@@ -0,0 +1,183 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, "..")
+from scripts import save  # noqa
+
+
+HEAD = '<cd:interface xmlns:cd="http://www.pragma-ade.com/commands">\n'
+
+TAIL = "</cd:interface>\n"
+
+DEFINITIONS = HEAD + """\
+<cd:define name="keyword-base">
+  <cd:constant type="base"/>
+</cd:define>
+""" + TAIL
+
+# Each of these leans on definitions made in the files after it.
+COMMAND_FILES = {
+    "a.xml": """\
+<cd:command name="alpha" file="a.mkiv">
+  <cd:arguments>
+    <cd:keywords><cd:resolve name="keyword-late"/></cd:keywords>
+  </cd:arguments>
+</cd:command>
+<cd:command name="setupinstance" file="a.mkiv">
+  <cd:sequence>
+    <cd:string value="setup"/><cd:instance value="instance"/>
+  </cd:sequence>
+  <cd:instances><cd:resolve name="instance-late"/></cd:instances>
+  <cd:arguments>
+    <cd:keywords><cd:resolve name="keyword-base"/></cd:keywords>
+  </cd:arguments>
+</cd:command>
+""",
+    "b.xml": """\
+<cd:define name="keyword-middle">
+  <cd:constant type="middle"/>
+  <cd:keywords><cd:resolve name="keyword-late"/></cd:keywords>
+</cd:define>
+<cd:command name="beta" file="b.mkiv">
+  <cd:arguments>
+    <cd:keywords><cd:resolve name="keyword-base"/></cd:keywords>
+  </cd:arguments>
+</cd:command>
+""",
+    "c.xml": """\
+<cd:define name="keyword-late">
+  <cd:constant type="late"/>
+</cd:define>
+<cd:define name="instance-late">
+  <cd:constant value="foo"/>
+  <cd:constant value="bar"/>
+</cd:define>
+<cd:command name="gamma" file="c.mkiv">
+  <cd:arguments>
+    <cd:keywords><cd:resolve name="keyword-middle"/></cd:keywords>
+  </cd:arguments>
+</cd:command>
+""",
+}
+
+
+class FixtureSaver(save.InterfaceSaver):
+    """Takes the definitions from `DEFINITIONS`, rather than from ConTeXt."""
+
+    def load_definitions(self) -> None:
+        self.def_nodes = {
+            node.attrib["name"]: node for node in ET.fromstring(DEFINITIONS)
+        }
+        self.resolve_definitions()
+        self.def_nodes = {}
+
+
+class TestSave(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.files = []
+        for name, text in sorted(COMMAND_FILES.items()):
+            self.files.append(self.write(name, text))
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def write(self, name: str, text: str) -> str:
+        path = os.path.join(self.dir.name, name)
+        with open(path, encoding="utf-8", mode="w") as f:
+            f.write(HEAD + text + TAIL)
+        return path
+
+    def generate(self, workers: int) -> dict:
+        saver = FixtureSaver()
+        saver.save(
+            "", tolerant=False, quiet=True, workers=workers, only=self.files,
+        )
+        return saver.encode()
+
+    def test__cross_file_definitions(self) -> None:
+        cmds = self.generate(1)
+        self.assertEqual(
+            sorted(cmds),
+            [
+                "alpha", "beta", "gamma", "setupbar", "setupfoo",
+                "setupinstance",
+            ],
+        )
+        self.assertEqual(cmds["alpha"][0]["con"]["con"], "late")
+        # This one goes by way of a definition in another file, which in turn
+        # looks up one in a third.
+        self.assertEqual(
+            cmds["gamma"][0]["con"]["con"][1]["con"], "late",
+        )
+
+    def test__parallel(self) -> None:
+        self.assertEqual(self.generate(3), self.generate(1))
+
+    def test__serial_in_plugin_host(self) -> None:
+        in_plugin_host = save.in_plugin_host
+        parallel = save.InterfaceSaver.load_commands_parallel
+        calls = []
+
+        def load_commands_parallel(saver, to_load):
+            calls.append(to_load)
+            return parallel(saver, to_load)
+
+        save.in_plugin_host = lambda: True
+        save.InterfaceSaver.load_commands_parallel = load_commands_parallel
+        try:
+            cmds = self.generate(3)
+        finally:
+            save.in_plugin_host = in_plugin_host
+            save.InterfaceSaver.load_commands_parallel = parallel
+        self.assertEqual(calls, [])
+        self.assertEqual(cmds, self.generate(1))
+
+    def test__update(self) -> None:
+        saver = FixtureSaver()
+        saver.save("", tolerant=False, quiet=True, only=self.files)
+        cmds = saver.encode()
+        # As they would come back from the manifest.
+        old = json.loads(
+            json.dumps({f: saver.file_record(f) for f in self.files})
+        )
+        old_defs = json.loads(json.dumps(saver.command_defs))
+
+        # The other two files look up definitions made in this one.
+        changed = self.write(
+            "c.xml",
+            COMMAND_FILES["c.xml"]
+            .replace('type="late"', 'type="later"')
+            .replace('value="bar"', 'value="baz"'),
+        )
+        updater = FixtureSaver()
+        affected = updater.update(
+            "", old, self.files, [changed], [], old_defs,
+            tolerant=False, quiet=True,
+        )
+        self.assertEqual(
+            affected,
+            {
+                "alpha", "gamma", "setupbar", "setupbaz", "setupfoo",
+                "setupinstance",
+            },
+        )
+        updates = updater.encode()
+        for name in affected:
+            if name in updates:
+                cmds[name] = updates[name]
+            else:
+                cmds.pop(name, None)
+        self.assertEqual(cmds, self.generate(1))
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
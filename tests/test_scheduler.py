@@ -0,0 +1,105 @@
+import sys
+import unittest
+
+sys.path.insert(0, "../scripts")
+import scheduler  # noqa
+
+
+class TestDebouncer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.timers = []
+        self.runs = []
+        self.debouncer = scheduler.Debouncer(
+            lambda callback, delay: self.timers.append(callback)
+        )
+
+    def job(self, name: str):
+        return lambda: self.runs.append(name)
+
+    def fire_all(self) -> None:
+        timers, self.timers = self.timers, []
+        for callback in timers:
+            callback()
+
+    def test__coalesce(self) -> None:
+        for name in ["a", "b", "c"]:
+            self.debouncer.submit("main.tex", self.job(name), 500)
+        self.assertTrue(self.debouncer.is_waiting("main.tex"))
+        self.assertEqual(self.runs, [])
+        self.fire_all()
+        self.assertEqual(self.runs, ["c"])
+        self.assertFalse(self.debouncer.is_waiting("main.tex"))
+
+    def test__keys(self) -> None:
+        self.debouncer.submit("a.tex", self.job("a"), 500)
+        self.debouncer.submit("b.tex", self.job("b"), 500)
+        self.fire_all()
+        self.assertEqual(sorted(self.runs), ["a", "b"])
+
+    def test__later_submission(self) -> None:
+        self.debouncer.submit("main.tex", self.job("a"), 500)
+        self.fire_all()
+        self.debouncer.submit("main.tex", self.job("b"), 500)
+        self.fire_all()
+        self.assertEqual(self.runs, ["a", "b"])
+
+    def test__no_delay(self) -> None:
+        self.debouncer.submit("main.tex", self.job("a"), 0)
+        self.assertEqual(self.runs, ["a"])
+        self.assertEqual(self.timers, [])
+
+
+class TestWhenBusy(unittest.TestCase):
+    def test__action(self) -> None:
+        for when_busy in ["restart", "queue", "ignore", "nonsense"]:
+            with self.subTest(when_busy=when_busy):
+                self.assertEqual(
+                    scheduler.when_busy_action(when_busy, True), "queue",
+                )
+        self.assertEqual(
+            scheduler.when_busy_action("restart", False), "restart",
+        )
+        self.assertEqual(scheduler.when_busy_action("queue", False), "queue")
+        self.assertEqual(
+            scheduler.when_busy_action("nonsense", False), "ignore",
+        )
+
+
+class TestPending(unittest.TestCase):
+    def setUp(self) -> None:
+        self.timers = []
+        self.runs = []
+        self.pending = scheduler.Pending(
+            lambda callback, delay: self.timers.append(callback)
+        )
+
+    def job(self, name: str):
+        return lambda: self.runs.append(name)
+
+    def test__last_one(self) -> None:
+        self.pending.put(self.job("a"))
+        self.pending.put(self.job("b"))
+        self.pending.release()
+        # Not there and then, but by way of `set_timeout`.
+        self.assertEqual(self.runs, [])
+        self.assertEqual(len(self.timers), 1)
+        self.timers.pop()()
+        self.assertEqual(self.runs, ["b"])
+        self.pending.release()
+        self.assertEqual(self.timers, [])
+
+    def test__restart(self) -> None:
+        # Restarting a build drops the one that was waiting for it.
+        self.pending.put(self.job("a"))
+        self.pending.clear()
+        self.pending.release()
+        self.assertEqual(self.timers, [])
+        self.assertEqual(self.runs, [])
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
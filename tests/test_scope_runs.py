@@ -0,0 +1,259 @@
+import random
+import sys
+import unittest
+
+sys.path.insert(0, "..")
+from scripts import scope_runs  # noqa
+
+
+SCOPE = "control"
+
+ARGUMENT = "argument"
+
+
+class Region:
+    def __init__(self, a: int, b: int) -> None:
+        self.a, self.b = a, b
+
+    def begin(self) -> int:
+        return self.a
+
+    def end(self) -> int:
+        return self.b
+
+
+class FakeView:
+    """
+    Just enough of a view: each character has a set of scope names, and a
+    selector is one of those names.
+    """
+
+    count = 0
+
+    def __init__(self, rand: random.Random, size: int) -> None:
+        FakeView.count += 1
+        self.id_ = FakeView.count
+        self.rand = rand
+        self.changes = 0
+        self.text = self.random_text(size)
+        self.scopes = self.random_scopes(size)
+
+    def random_text(self, size: int) -> str:
+        return "".join(self.rand.choice("ab  \n") for _ in range(size))
+
+    def random_scopes(self, size: int) -> list:
+        # Runs of a few characters, so that there are runs to find.
+        result = []
+        while len(result) < size:
+            scopes = set()
+            if self.rand.random() < 0.4:
+                scopes.add(SCOPE)
+            if self.rand.random() < 0.4:
+                scopes.add(ARGUMENT)
+            result += [scopes] * self.rand.randint(1, 6)
+        return result[:size]
+
+    def buffer_id(self) -> int:
+        return self.id_
+
+    def change_count(self) -> int:
+        return self.changes
+
+    def size(self) -> int:
+        return len(self.text)
+
+    def substr(self, point: int) -> str:
+        return self.text[point] if 0 <= point < self.size() else ""
+
+    def match_selector(self, point: int, selector: str) -> bool:
+        return 0 <= point < self.size() and selector in self.scopes[point]
+
+    def find_by_selector(self, selector: str) -> list:
+        result = []
+        for point in range(self.size()):
+            if not self.match_selector(point, selector):
+                continue
+            if result and result[-1].b == point:
+                result[-1].b += 1
+            else:
+                result.append(Region(point, point + 1))
+        return result
+
+    def edit(self, notify: bool = True) -> None:
+        """
+        Replace some text. The scopes can change from the start of the line
+        of the edit on, but not before.
+        """
+
+        a = self.rand.randint(0, self.size())
+        b = min(self.size(), a + self.rand.randint(0, 5))
+        new = self.random_text(self.rand.randint(0, 5))
+        line = self.text.rfind("\n", 0, a) + 1
+        self.text = self.text[:a] + new + self.text[b:]
+        rest = self.size() - line
+        if self.rand.random() < 0.5:
+            # As if the edit did not change the scopes of the text after it.
+            old = self.scopes[line:a] + [set()] * len(new) + self.scopes[b:]
+            self.scopes = self.scopes[:line] + old
+        else:
+            self.scopes = self.scopes[:line] + self.random_scopes(rest)
+        self.changes += 1
+        if notify:
+            scope_runs.note_edit(self.id_, self.changes, line)
+
+
+# These look at one character at a time, which is what we compare with.
+def walk_enclosing_block(view, point, scope, end=None):
+    start = stop = point
+    while start > 0 and view.match_selector(start, scope):
+        start -= 1
+    end_ = view.size() if end is None else end
+    while stop < end_ and view.match_selector(stop, scope):
+        stop += 1
+
+    if start < stop:
+        return start + 1, stop
+    return None
+
+
+def walk_left_enclosing_block(view, point, scope, end=None):
+    if end is None:
+        end = view.size()
+    block = walk_enclosing_block(view, point, scope, end=end)
+    if block and not view.match_selector(point + 1, scope):
+        return block
+    return None
+
+
+SKIPPERS = {
+    scope_runs.SKIP_ANYTHING: lambda view, point: True,
+    scope_runs.SKIP_NOTHING: lambda view, point: False,
+    scope_runs.SKIP_ARGS_AND_SPACES: lambda view, point: (
+        view.substr(point).isspace() or view.match_selector(point, ARGUMENT)
+    ),
+}
+
+
+def walk_last_block_in_region(view, begin, scope, end=None, skip=0):
+    skipper = SKIPPERS[skip]
+    stop = view.size() if end is None else end
+    empty = True
+
+    while (
+        stop > begin and
+        not view.match_selector(stop, scope) and
+        skipper(view, stop)
+    ):
+        stop -= 1
+
+    start = stop
+    while start > begin and view.match_selector(start, scope):
+        start -= 1
+        empty = False
+
+    if empty:
+        return None
+    return start + 1, stop + 1
+
+
+class TestScopeIndex(unittest.TestCase):
+    def test__forget_and_extend(self) -> None:
+        index = scope_runs.ScopeIndex([(2, 5), (5, 7), (9, 12)], 20)
+        self.assertEqual(index.begins, [2, 9])
+        self.assertEqual(index.ends, [7, 12])
+        index.forget(4)
+        self.assertEqual(
+            (index.begins, index.ends, index.known), ([2], [4], 4),
+        )
+        index.extend(8, lambda pt: pt in {4, 5, 7})
+        self.assertEqual(index.begins, [2, 7])
+        self.assertEqual(index.ends, [6, 8])
+        self.assertEqual(index.known, 8)
+
+
+class TestEditLog(unittest.TestCase):
+    def test__dirty_since(self) -> None:
+        log = scope_runs.EditLog(None)
+        log.note(3, 40)
+        # We do not know whether there were edits before the first one.
+        self.assertIsNone(log.dirty_since(2, 3))
+        log.note(4, 10)
+        log.note(5, 30)
+        self.assertEqual(log.dirty_since(3, 5), 10)
+        self.assertEqual(log.dirty_since(4, 5), 30)
+        # Not up to date.
+        self.assertIsNone(log.dirty_since(4, 6))
+
+
+class TestScopeRuns(unittest.TestCase):
+    def setUp(self) -> None:
+        scope_runs.INDEXES.clear()
+        scope_runs.LOGS.clear()
+        self.walk = scope_runs.MAX_WALK
+
+    def tearDown(self) -> None:
+        scope_runs.MAX_WALK = self.walk
+
+    def compare(self, view: FakeView, rand: random.Random) -> None:
+        size = view.size()
+        for _ in range(20):
+            point = rand.randint(-1, size + 1)
+            end = rand.choice([None, rand.randint(0, size + 1)])
+            self.assertEqual(
+                scope_runs.enclosing_block(view, point, SCOPE, end=end),
+                walk_enclosing_block(view, point, SCOPE, end=end),
+            )
+            self.assertEqual(
+                scope_runs.left_enclosing_block(view, point, SCOPE, end=end),
+                walk_left_enclosing_block(view, point, SCOPE, end=end),
+            )
+            begin = rand.randint(0, max(point, 0))
+            skip = rand.choice(sorted(SKIPPERS))
+            self.assertEqual(
+                scope_runs.last_block_in_region(
+                    view, begin, SCOPE, ARGUMENT, end=end, skip=skip,
+                ),
+                walk_last_block_in_region(
+                    view, begin, SCOPE, end=end, skip=skip,
+                ),
+            )
+
+    def check(self, notify: bool, walk: int) -> None:
+        scope_runs.MAX_WALK = walk
+        rand = random.Random(walk)
+        for _ in range(10):
+            view = FakeView(rand, rand.randint(0, 300))
+            for _ in range(10):
+                self.compare(view, rand)
+                view.edit(notify=notify)
+
+    def test__edits(self) -> None:
+        for walk in [0, 20, 1000]:
+            with self.subTest(walk=walk):
+                self.check(True, walk)
+
+    def test__missed_edits(self) -> None:
+        for walk in [0, 20, 1000]:
+            with self.subTest(walk=walk):
+                self.check(False, walk)
+
+    def test__keeps_what_comes_before(self) -> None:
+        rand = random.Random(1)
+        view = FakeView(rand, 200)
+        scope_runs.enclosing_block(view, 150, SCOPE)
+        index = scope_runs.INDEXES[(view.buffer_id(), SCOPE)][1]
+        self.assertGreater(index.known, 150)
+        view.edit()
+        view.edit()
+        dirty = min(entry[2] for entry in scope_runs.LOGS[view.id_].entries)
+        scope_runs.enclosing_block(view, 0, SCOPE)
+        self.assertIs(scope_runs.INDEXES[(view.buffer_id(), SCOPE)][1], index)
+        self.assertLessEqual(index.known, max(dirty, 1))
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
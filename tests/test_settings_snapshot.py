@@ -0,0 +1,95 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, "..")
+from scripts import settings_snapshot  # noqa
+
+
+class FakeSettings:
+    def __init__(self, values: dict) -> None:
+        self.values = values
+        self.callbacks = {}
+
+    def get(self, key: str, default=None):
+        return self.values.get(key, default)
+
+    def add_on_change(self, key: str, callback) -> None:
+        self.callbacks[key] = callback
+
+    def clear_on_change(self, key: str) -> None:
+        self.callbacks.pop(key, None)
+
+    def set(self, key: str, value) -> None:
+        self.values[key] = value
+        for callback in self.callbacks.values():
+            callback()
+
+
+class TestSettingsSnapshot(unittest.TestCase):
+    def setUp(self) -> None:
+        self.settings = FakeSettings(
+            {
+                "current.path": "a",
+                "program_locations.ConTeXt_paths": {"a": "/a", "b": "/b"},
+            },
+        )
+        self.loads = 0
+        self.snapshot = settings_snapshot.SettingsSnapshot(
+            self.load, max_size=4,
+        )
+
+    def load(self) -> FakeSettings:
+        self.loads += 1
+        return self.settings
+
+    def test__memo(self) -> None:
+        calls = []
+
+        def compute() -> int:
+            calls.append(None)
+            return len(calls)
+
+        self.assertEqual(self.snapshot.remember("x", compute), 1)
+        self.assertEqual(self.snapshot.remember("x", compute), 1)
+        self.assertEqual(len(calls), 1)
+
+    def test__bounded(self) -> None:
+        for i in range(10):
+            self.snapshot.remember(i, lambda: i)
+        self.assertEqual(len(self.snapshot.memo), 4)
+        # The most recent ones are still there.
+        self.assertEqual(self.snapshot.remember(9, lambda: None), 9)
+        self.assertIsNone(self.snapshot.remember(0, lambda: None))
+
+    def test__invalidation(self) -> None:
+        self.assertEqual(self.snapshot.context_path(), "/a")
+        self.settings.values["current.path"] = "b"
+        # We have not been told of the change yet.
+        self.assertEqual(self.snapshot.context_path(), "/a")
+        self.settings.set("current.path", "b")
+        self.assertEqual(self.snapshot.context_path(), "/b")
+        self.assertEqual(self.loads, 1)
+
+    def test__clear(self) -> None:
+        self.assertEqual(self.snapshot.context_path(), "/a")
+        self.snapshot.clear()
+        self.assertEqual(self.settings.callbacks, {})
+        self.assertEqual(len(self.snapshot.memo), 0)
+        self.settings.values["current.path"] = "b"
+        self.assertEqual(self.snapshot.context_path(), "/b")
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(len(self.settings.callbacks), 1)
+
+    def test__prefixed_path(self) -> None:
+        path = self.snapshot.prefixed_path(None)
+        self.assertEqual(path, os.environ.get("PATH", ""))
+        self.assertEqual(len(self.snapshot.memo), 1)
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
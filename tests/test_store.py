@@ -0,0 +1,72 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, "../scripts")
+import store  # noqa
+
+
+class TestStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "_commands.store")
+        self.items = [
+            ("starttext", [{"con": [], "fil": "cont-new.mkiv"}]),
+            ("setupfoo", [{"con": ["<val>yes</val>"], "fil": None}]),
+            ("été", {"nested": [1, 2.5, None, True]}),
+        ]
+        store.write(self.path, self.items, meta={"version": 1})
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test__round_trip(self) -> None:
+        db = store.Store(self.path)
+        self.assertEqual(len(db), len(self.items))
+        self.assertEqual(db.meta, {"version": 1})
+        for key, value in self.items:
+            self.assertIn(key, db)
+            self.assertEqual(db[key], value)
+        self.assertEqual(list(db.items()), self.items)
+
+    def test__missing_key(self) -> None:
+        db = store.Store(self.path)
+        self.assertNotIn("stoptext", db)
+        self.assertIsNone(db.get("stoptext"))
+        with self.assertRaises(KeyError):
+            db["stoptext"]
+
+    def test__rewrite(self) -> None:
+        store.write(self.path, self.items[:1])
+        db = store.Store(self.path)
+        self.assertEqual(list(db), [self.items[0][0]])
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+    def test__replaced_under_reader(self) -> None:
+        db = store.Store(self.path)
+        self.assertEqual(db["setupfoo"], self.items[1][1])
+        items = [("aa", {"padding": "x" * 100})] + self.items
+        store.write(self.path, items, meta={"version": 2})
+        for key, value in items:
+            self.assertEqual(db[key], value)
+        self.assertIn("aa", db)
+        self.assertEqual(db.meta, {"version": 2})
+        store.write(self.path, self.items[1:])
+        self.assertNotIn("starttext", db)
+        self.assertIsNone(db.get("starttext"))
+        self.assertEqual(list(db.items()), self.items[1:])
+
+    def test__bad_file(self) -> None:
+        with open(self.path, mode="wb") as f:
+            f.write(b"not a store at all, just some bytes")
+        with self.assertRaises(store.StoreError):
+            store.Store(self.path)
+
+
+def main() -> None:
+    unittest.main(verbosity=0)
+
+
+if __name__ == "__main__":
+    main()